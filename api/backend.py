@@ -5,9 +5,13 @@
 
 from __future__ import annotations
 
+import os
 from typing import Callable, Awaitable, Dict, Any
 
-from apps.api.main import app as fastapi_app  # your real FastAPI app
+# Cold starts: skip boot-time warmup; DB schema and retrieval index are set up on first use.
+os.environ.setdefault("AI_LAB_EAGER_INIT", "0")
+
+from apps.api.main import app as fastapi_app  # noqa: E402  (your real FastAPI app)
 
 
 class StripPrefixASGI:
@@ -23,24 +27,29 @@ class StripPrefixASGI:
     def __init__(self, inner_app: Callable, strip_prefix: str):
         self.inner_app = inner_app
         self.strip_prefix = strip_prefix.rstrip("/") if strip_prefix != "/" else strip_prefix
+        # Strip either "/api/backend" (what we proxy to) OR "/backend" (rewrite convenience)
+        self.prefixes = tuple(p for p in (self.strip_prefix, "/backend") if p and p != "/")
 
     async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
-        if scope["type"] != "http":
+        path = scope.get("path") or ""
+        # Fast path: non-HTTP scopes and unprefixed paths go through untouched (no scope copy).
+        if scope["type"] != "http" or not path.startswith(self.prefixes):
             return await self.inner_app(scope, receive, send)
 
-        path = scope.get("path", "") or ""
-        new_scope = dict(scope)
-
-        # Strip either "/api/backend" (what we proxy to) OR "/backend" (rewrite convenience)
-        for prefix in (self.strip_prefix, "/backend"):
-            if prefix and prefix != "/" and path.startswith(prefix):
+        for prefix in self.prefixes:
+            if path.startswith(prefix):
                 stripped = path[len(prefix) :]
-                new_scope["path"] = stripped if stripped.startswith("/") else ("/" + stripped)
-                # Preserve root_path for framework URL generation
-                new_scope["root_path"] = (scope.get("root_path") or "") + prefix
-                break
-
-        return await self.inner_app(new_scope, receive, send)
+                # One shallow copy with the rewritten path; root_path is preserved
+                # for framework URL generation.
+                return await self.inner_app(
+                    {
+                        **scope,
+                        "path": stripped if stripped.startswith("/") else ("/" + stripped),
+                        "root_path": (scope.get("root_path") or "") + prefix,
+                    },
+                    receive,
+                    send,
+                )
 
 
 # Vercel detects `app` as the ASGI entrypoint.
@@ -1,4 +1,9 @@
 # Vercel Python Function entrypoint for FastAPI.
 # Vercel detects the `app` variable and serves it as an ASGI app.
 
-from apps.api.main import app  # noqa: F401
+import os
+
+# Cold starts: skip boot-time warmup; DB schema and retrieval index are set up on first use.
+os.environ.setdefault("AI_LAB_EAGER_INIT", "0")
+
+from apps.api.main import app  # noqa: E402,F401
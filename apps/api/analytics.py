@@ -0,0 +1,385 @@
+"""
+Telemetry aggregates for the dashboard endpoints (summary + timeseries).
+
+Two engines answer the same questions with the same numbers:
+
+    ScanAnalytics    reads the window's rows from SQLite and aggregates them in
+                     Python (the historical path; capped at 5000 / 20000 rows)
+    DuckDbAnalytics  aggregates in an embedded DuckDB table that mirrors
+                     telemetry_events, with the metadata fields the dashboards
+                     use extracted into typed columns
+
+Every aggregate is weighted: a sampled event of weight w counts as w events
+(see ingest.py). Percentiles are nearest-rank over the weighted values, with
+Python's round-half-even on both engines.
+
+The DuckDB copy is fed incrementally: each SQLite file (shard) has a rowid
+watermark, and every query first loads the rows above it. New rows are spilled
+to a temporary CSV and loaded with one `read_csv` scan, which is far faster
+than binding rows one by one. Only the current generation is kept (see db.py):
+after a reset, or when a shard's max rowid drops below its watermark (the file
+was wiped), the shard is reloaded from scratch.
+
+Configure via env:
+  AI_LAB_DUCKDB_PATH   DuckDB file for the copy (default: in memory)
+"""
+from __future__ import annotations
+
+import csv
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+DUCKDB_PATH = os.getenv("AI_LAB_DUCKDB_PATH", ":memory:")
+
+_EXPORT_BATCH = 50000
+
+_CITATION_TYPES = ("rag_run", "response")
+
+
+# ---------------- Python aggregation ----------------
+
+def weighted_percentile(values: List[Tuple[int, float]], p: float) -> Optional[int]:
+    """
+    Nearest-rank percentile over (value, weight) pairs; a sampled event of
+    weight w counts as w events.
+    """
+    if not values:
+        return None
+    v = sorted(values)
+    total = sum(w for _, w in v)
+    target = round((p / 100.0) * max(0.0, total - 1))
+    cum = 0.0
+    for value, w in v:
+        cum += w
+        if cum > target:
+            return int(value)
+    return int(v[-1][0])
+
+
+def summarize(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [(int(e["latency_ms"]), e.get("weight") or 1.0) for e in events if e.get("latency_ms") is not None]
+    total = sum(e.get("weight") or 1.0 for e in events)
+    errors = sum(e.get("weight") or 1.0 for e in events if not e.get("success", True))
+
+    esc = 0.0
+    for e in events:
+        if e.get("event_type") == "escalation":
+            esc += e.get("weight") or 1.0
+        else:
+            md = e.get("metadata") or {}
+            if md.get("escalated") is True:
+                esc += e.get("weight") or 1.0
+
+    cit_total = 0.0
+    cit_covered = 0.0
+    for e in events:
+        if e.get("event_type") in _CITATION_TYPES:
+            md = e.get("metadata") or {}
+            if "citations" in md:
+                cit_total += e.get("weight") or 1.0
+                if int(md.get("citations") or 0) > 0:
+                    cit_covered += e.get("weight") or 1.0
+
+    return _summary_dict(
+        total,
+        errors,
+        esc,
+        cit_total,
+        cit_covered,
+        weighted_percentile(latencies, 50),
+        weighted_percentile(latencies, 95),
+    )
+
+
+def _summary_dict(total, errors, esc, cit_total, cit_covered, p50, p95) -> Dict[str, Any]:
+    return {
+        "latencyP50": p50,
+        "latencyP95": p95,
+        "errorRate": (errors / total) if total else 0.0,
+        "escalationRate": (esc / total) if total else 0.0,
+        "citationCoverage": (cit_covered / cit_total) if cit_total else 0.0,
+        "totalEvents": int(round(total)),
+    }
+
+
+def timeseries(events: List[Dict[str, Any]], metric: str, bucket_sec: int) -> List[Tuple[int, float]]:
+    """(bucket start epoch seconds, value) for every bucket with data, oldest first."""
+    buckets: Dict[int, List[Tuple[float, float]]] = {}  # (value, sample weight)
+    for e in events:
+        try:
+            dt = datetime.fromisoformat(e["created_at"].replace("Z", "+00:00"))
+        except Exception:
+            continue
+        k = int(dt.timestamp() // bucket_sec) * bucket_sec
+        buckets.setdefault(k, [])
+        w = e.get("weight") or 1.0
+
+        md = e.get("metadata") or {}
+        if metric in ("latency_p95", "latency_p50", "latency"):
+            if e.get("latency_ms") is not None:
+                buckets[k].append((float(e["latency_ms"]), w))
+        elif metric == "error_rate":
+            buckets[k].append((0.0 if e.get("success", True) else 1.0, w))
+        elif metric == "escalation_rate":
+            is_esc = e.get("event_type") == "escalation" or bool(md.get("escalated"))
+            buckets[k].append((1.0 if is_esc else 0.0, w))
+        elif metric == "citation_coverage":
+            if e.get("event_type") in _CITATION_TYPES and "citations" in md:
+                buckets[k].append((1.0 if int(md.get("citations") or 0) > 0 else 0.0, w))
+        elif metric == "eval_pass_rate":
+            if e.get("event_type") == "eval_run" and "passRate" in md:
+                buckets[k].append((float(md.get("passRate")), w))
+
+    points: List[Tuple[int, float]] = []
+    for k in sorted(buckets.keys()):
+        vals = buckets[k]
+        if not vals:
+            continue
+        if metric in ("latency_p95", "latency_p50"):
+            ints = [(int(x), w) for x, w in vals]
+            v = float(weighted_percentile(ints, 95 if metric == "latency_p95" else 50) or 0)
+        else:
+            v = sum(x * w for x, w in vals) / sum(w for _, w in vals)
+        points.append((k, v))
+    return points
+
+
+class ScanAnalytics:
+    name = "sqlite"
+
+    def __init__(self, telemetry, summary_limit: int = 5000, timeseries_limit: int = 20000) -> None:
+        self.telemetry = telemetry
+        self.summary_limit = summary_limit
+        self.timeseries_limit = timeseries_limit
+
+    def summary(self, scenario_id: str, since_iso: str) -> Dict[str, Any]:
+        events = self.telemetry.list_events(scenario_id=scenario_id, since_iso=since_iso, limit=self.summary_limit)
+        return summarize(events)
+
+    def timeseries(self, scenario_id: str, since_iso: str, metric: str, bucket_sec: int) -> List[Tuple[int, float]]:
+        events = self.telemetry.list_events(scenario_id=scenario_id, since_iso=since_iso, limit=self.timeseries_limit)
+        return timeseries(events, metric, bucket_sec)
+
+    def sync(self) -> int:
+        return 0
+
+
+# ---------------- DuckDB ----------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry (
+    shard VARCHAR,
+    row_id BIGINT,
+    created_at TIMESTAMP,          -- UTC
+    scenario_id VARCHAR,
+    event_type VARCHAR,
+    latency_ms BIGINT,
+    success BOOLEAN,
+    weight DOUBLE,
+    escalated BOOLEAN,             -- metadata.escalated is true
+    escalated_any BOOLEAN,         -- metadata.escalated is truthy
+    citations BIGINT,              -- NULL when metadata has no "citations"
+    pass_rate DOUBLE,              -- NULL when metadata has no "passRate"
+    generation BIGINT
+);
+CREATE TABLE IF NOT EXISTS watermarks (shard VARCHAR PRIMARY KEY, row_id BIGINT, generation BIGINT);
+"""
+
+_CSV_COLUMNS = (
+    "{'shard': 'VARCHAR', 'row_id': 'BIGINT', 'created_at': 'TIMESTAMP', 'scenario_id': 'VARCHAR', "
+    "'event_type': 'VARCHAR', 'latency_ms': 'BIGINT', 'success': 'BOOLEAN', 'weight': 'DOUBLE', "
+    "'escalated': 'BOOLEAN', 'escalated_any': 'BOOLEAN', 'citations': 'BIGINT', 'pass_rate': 'DOUBLE', "
+    "'generation': 'BIGINT'}"
+)
+
+# Value + filter per timeseries metric.
+_METRICS = {
+    "latency": ("latency_ms", "latency_ms IS NOT NULL"),
+    "latency_p50": ("latency_ms", "latency_ms IS NOT NULL"),
+    "latency_p95": ("latency_ms", "latency_ms IS NOT NULL"),
+    "error_rate": ("CASE WHEN success THEN 0.0 ELSE 1.0 END", "TRUE"),
+    "escalation_rate": ("CASE WHEN event_type = 'escalation' OR escalated_any THEN 1.0 ELSE 0.0 END", "TRUE"),
+    "citation_coverage": (
+        "CASE WHEN citations > 0 THEN 1.0 ELSE 0.0 END",
+        "event_type IN ('rag_run', 'response') AND citations IS NOT NULL",
+    ),
+    "eval_pass_rate": ("pass_rate", "event_type = 'eval_run' AND pass_rate IS NOT NULL"),
+}
+
+
+def _export_row(shard: str, r) -> list:
+    """One SQLite telemetry row as a CSV record (metadata fields extracted)."""
+    md = json.loads(r["metadata_json"] or "{}")
+    if not isinstance(md, dict):
+        md = {}
+    created = datetime.fromisoformat(r["created_at"].replace("Z", "+00:00"))
+    if created.tzinfo is not None:
+        created = created.astimezone(timezone.utc).replace(tzinfo=None)
+
+    citations = None
+    if "citations" in md:
+        try:
+            citations = int(md.get("citations") or 0)
+        except (TypeError, ValueError):
+            citations = 0
+    pass_rate = None
+    if "passRate" in md:
+        try:
+            pass_rate = float(md["passRate"])
+        except (TypeError, ValueError):
+            pass_rate = None
+
+    return [
+        shard,
+        r["rowid"],
+        created.isoformat(sep=" "),
+        r["scenario_id"],
+        r["event_type"],
+        "" if r["latency_ms"] is None else int(r["latency_ms"]),
+        1 if r["success"] else 0,
+        r["weight"] or 1.0,
+        1 if md.get("escalated") is True else 0,
+        1 if md.get("escalated") else 0,
+        "" if citations is None else citations,
+        "" if pass_rate is None else repr(pass_rate),
+        r["generation"],
+    ]
+
+
+def _since(since_iso: str) -> datetime:
+    # SQLite compares datetime(created_at) >= datetime(since), i.e. at whole
+    # seconds; `created_at >= floor(since)` is the same predicate.
+    dt = datetime.fromisoformat(since_iso.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.replace(microsecond=0)
+
+
+class DuckDbAnalytics:
+    name = "duckdb"
+
+    def __init__(self, telemetry, path: str = DUCKDB_PATH) -> None:
+        try:  # optional dependency, imported only when this engine is selected
+            import duckdb
+        except ImportError as e:  # pragma: no cover
+            raise RuntimeError("AI_LAB_ANALYTICS=duckdb requires the duckdb package (pip install duckdb)") from e
+        self.telemetry = telemetry
+        self._con = duckdb.connect(path)
+        self._con.execute(_SCHEMA)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    # ---- feed ----
+
+    def sync(self) -> int:
+        """Load telemetry rows written since the last sync. Returns the number of rows loaded."""
+        loaded = 0
+        with self._lock:
+            cur = self._con.cursor()
+            generation = self.telemetry.generation()
+            marks = {shard: (row_id, gen) for shard, row_id, gen in cur.execute("SELECT * FROM watermarks").fetchall()}
+            for shard in self.telemetry.shards():
+                mark, mark_gen = marks.get(shard, (0, generation))
+                if mark_gen != generation or self.telemetry.max_rowid(shard) < mark:
+                    # Reset (old rows are being deleted, rowids may restart) or
+                    # the file was wiped and recreated: reload the shard.
+                    cur.execute("DELETE FROM telemetry WHERE shard = ?", [shard])
+                    mark = 0
+                while True:
+                    rows = self.telemetry.export_rows(shard, mark, generation, _EXPORT_BATCH)
+                    if rows:
+                        self._load(cur, shard, rows)
+                        mark = rows[-1]["rowid"]
+                        loaded += len(rows)
+                    if len(rows) < _EXPORT_BATCH:
+                        break
+                if (mark, generation) != marks.get(shard):
+                    cur.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)", [shard, mark, generation])
+            self._generation = generation
+        return loaded
+
+    def _load(self, cur, shard: str, rows) -> None:
+        fd, spill = tempfile.mkstemp(prefix="ai_lab_telemetry_", suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                w = csv.writer(f)
+                for r in rows:
+                    w.writerow(_export_row(shard, r))
+            cur.execute(
+                "INSERT INTO telemetry SELECT * FROM read_csv(?, header = false, quote = '\"', escape = '\"', "
+                f"columns = {_CSV_COLUMNS})",
+                [spill],
+            )
+        finally:
+            os.unlink(spill)
+
+    # ---- queries ----
+
+    def _where(self, scenario_id: str, since_iso: str, extra: str = "TRUE") -> Tuple[str, list]:
+        where, params = ["generation = ?", "created_at >= ?", extra], [self._generation, _since(since_iso)]
+        if scenario_id:
+            where.append("scenario_id = ?")
+            params.append(scenario_id)
+        return " AND ".join(where), params
+
+    @staticmethod
+    def _percentiles_sql(bucket: str, value: str, where: str) -> str:
+        # Weighted nearest rank: first value whose cumulative weight exceeds
+        # round(p * (total - 1)); ties in value are ordered by weight, as
+        # Python sorts (value, weight) tuples.
+        return f"""
+            WITH v AS (SELECT {bucket} AS b, {value} AS x, weight AS w FROM telemetry WHERE {where}),
+            c AS (
+                SELECT b, x,
+                       sum(w) OVER (PARTITION BY b ORDER BY x, w ROWS UNBOUNDED PRECEDING) AS cum,
+                       sum(w) OVER (PARTITION BY b) AS tot
+                FROM v
+            )
+            SELECT b,
+                   coalesce(min(x) FILTER (WHERE cum > round_even(? * greatest(0.0, tot - 1), 0)), max(x)),
+                   coalesce(min(x) FILTER (WHERE cum > round_even(? * greatest(0.0, tot - 1), 0)), max(x))
+            FROM c GROUP BY b ORDER BY b
+        """
+
+    def summary(self, scenario_id: str, since_iso: str) -> Dict[str, Any]:
+        self.sync()
+        cur = self._con.cursor()
+        where, params = self._where(scenario_id, since_iso)
+        total, errors, esc, cit_total, cit_covered = cur.execute(
+            f"""
+            SELECT coalesce(sum(weight), 0),
+                   coalesce(sum(weight) FILTER (WHERE NOT success), 0),
+                   coalesce(sum(weight) FILTER (WHERE event_type = 'escalation' OR escalated), 0),
+                   coalesce(sum(weight) FILTER (WHERE event_type IN ('rag_run', 'response') AND citations IS NOT NULL), 0),
+                   coalesce(sum(weight) FILTER (WHERE event_type IN ('rag_run', 'response') AND citations > 0), 0)
+            FROM telemetry WHERE {where}
+            """,
+            params,
+        ).fetchone()
+        where, params = self._where(scenario_id, since_iso, "latency_ms IS NOT NULL")
+        row = cur.execute(self._percentiles_sql("0", "latency_ms", where), params + [0.5, 0.95]).fetchone()
+        p50, p95 = (int(row[1]), int(row[2])) if row else (None, None)
+        return _summary_dict(total, errors, esc, cit_total, cit_covered, p50, p95)
+
+    def timeseries(self, scenario_id: str, since_iso: str, metric: str, bucket_sec: int) -> List[Tuple[int, float]]:
+        if metric not in _METRICS:
+            return []
+        self.sync()
+        cur = self._con.cursor()
+        value, extra = _METRICS[metric]
+        where, params = self._where(scenario_id, since_iso, extra)
+        bucket = f"CAST(floor(epoch(created_at) / {int(bucket_sec)}) AS BIGINT) * {int(bucket_sec)}"
+        if metric in ("latency_p50", "latency_p95"):
+            p = 0.95 if metric == "latency_p95" else 0.5
+            rows = cur.execute(self._percentiles_sql(bucket, value, where), params + [p, p]).fetchall()
+            return [(int(b), float(x)) for b, x, _ in rows]
+        rows = cur.execute(
+            f"SELECT {bucket} AS b, sum(({value}) * weight) / sum(weight) FROM telemetry WHERE {where} "
+            "GROUP BY b ORDER BY b",
+            params,
+        ).fetchall()
+        return [(int(b), float(v)) for b, v in rows]
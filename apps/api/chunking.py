@@ -0,0 +1,160 @@
+"""
+Chunking strategies for the retrieval index.
+
+Every configured chunk size is materialized once, at index build time, into its
+own chunk table (see index.py); requests only pick a table by name.
+
+Built-in sizes (always present, unchanged behaviour):
+
+    small    one paragraph per chunk
+    medium   pairs of paragraphs
+    large    the whole doc
+
+A corpus can add sizes with a `chunking.json` next to its docs:
+
+    {
+      "sizes": {
+        "w64":      {"kind": "window", "tokens": 64, "overlap": 16, "headings": true},
+        "sections": {"kind": "sections"}
+      }
+    }
+
+    kind=paragraphs  groups of `paragraphs` paragraphs (0 = whole doc)
+    kind=window      sliding windows of `tokens` whitespace-separated words,
+                     advancing by tokens - overlap
+    kind=sections    one chunk per markdown heading section
+    headings=true    paragraph groups / windows never cross a heading
+
+All spans are (start, end) character offsets into the normalized doc text
+(non-empty paragraphs re-joined by "\\n\\n"), so a chunk is always a contiguous
+slice of it.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+Span = Tuple[int, int]
+
+_WORD_RE = re.compile(r"\S+")
+
+
+@dataclass(frozen=True)
+class ChunkSpec:
+    name: str
+    kind: str = "paragraphs"
+    paragraphs: int = 1
+    tokens: int = 128
+    overlap: int = 0
+    headings: bool = False
+
+    def __post_init__(self) -> None:
+        if self.kind not in ("paragraphs", "window", "sections"):
+            raise ValueError(f"chunk size {self.name!r}: unknown kind {self.kind!r}")
+        if self.kind == "window" and not (0 <= self.overlap < self.tokens):
+            raise ValueError(f"chunk size {self.name!r}: need 0 <= overlap < tokens")
+        if self.paragraphs < 0:
+            raise ValueError(f"chunk size {self.name!r}: paragraphs must be >= 0")
+
+    @classmethod
+    def from_dict(cls, name: str, raw: Dict[str, Any]) -> "ChunkSpec":
+        known = {k: raw[k] for k in ("kind", "paragraphs", "tokens", "overlap", "headings") if k in raw}
+        return cls(name=name, **known)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+BUILTIN_SPECS: Tuple[ChunkSpec, ...] = (
+    ChunkSpec("small", "paragraphs", paragraphs=1),
+    ChunkSpec("medium", "paragraphs", paragraphs=2),
+    ChunkSpec("large", "paragraphs", paragraphs=0),
+)
+
+
+def load_specs(docs_dir: Path) -> Tuple[ChunkSpec, ...]:
+    """Built-in sizes plus any declared in `<docs_dir>/chunking.json`."""
+    p = docs_dir / "chunking.json"
+    if not p.exists():
+        return BUILTIN_SPECS
+    raw = json.loads(p.read_text()).get("sizes", {})
+    builtin_names = {s.name for s in BUILTIN_SPECS}
+    extra = []
+    for name, spec in raw.items():
+        if name in builtin_names:
+            raise ValueError(f"chunking.json may not redefine built-in size {name!r}")
+        extra.append(ChunkSpec.from_dict(name, spec))
+    return BUILTIN_SPECS + tuple(extra)
+
+
+# ---------------- Splitting ----------------
+
+def normalize_doc(text: str) -> Tuple[str, List[Span]]:
+    """
+    Re-join a doc's non-empty paragraphs with "\\n\\n" and return the text plus
+    each paragraph's (start, end) character span.
+    """
+    paras = [p.strip() for p in text.split("\n\n") if p.strip()]
+    spans = []
+    pos = 0
+    for p in paras:
+        spans.append((pos, pos + len(p)))
+        pos += len(p) + 2
+    return "\n\n".join(paras), spans
+
+
+def sections(text: str, para_spans: Sequence[Span]) -> List[List[Span]]:
+    """Paragraphs grouped by markdown heading: a new section starts at every '#' paragraph."""
+    out: List[List[Span]] = []
+    for span in para_spans:
+        if not out or text.startswith("#", span[0]):
+            out.append([])
+        out[-1].append(span)
+    return out
+
+
+def _group(paras: Sequence[Span], n: int) -> List[Span]:
+    if not paras:
+        return []
+    if n <= 0:
+        return [(paras[0][0], paras[-1][1])]
+    return [(paras[i][0], paras[min(i + n, len(paras)) - 1][1]) for i in range(0, len(paras), n)]
+
+
+def _windows(text: str, region: Span, tokens: int, overlap: int) -> List[Span]:
+    words = [m.span() for m in _WORD_RE.finditer(text, region[0], region[1])]
+    if not words:
+        return []
+    stride = tokens - overlap
+    out = []
+    start = 0
+    while True:
+        last = min(start + tokens, len(words)) - 1
+        out.append((words[start][0], words[last][1]))
+        if last == len(words) - 1:
+            return out
+        start += stride
+
+
+def chunk_doc(text: str, para_spans: Sequence[Span], spec: ChunkSpec) -> List[Span]:
+    if not para_spans:
+        return []
+    if spec.kind == "sections":
+        return [(sec[0][0], sec[-1][1]) for sec in sections(text, para_spans)]
+
+    regions = sections(text, para_spans) if spec.headings else [list(para_spans)]
+    out: List[Span] = []
+    for paras in regions:
+        if spec.kind == "paragraphs":
+            out.extend(_group(paras, spec.paragraphs))
+        else:
+            out.extend(_windows(text, (paras[0][0], paras[-1][1]), spec.tokens, spec.overlap))
+    return out
+
+
+def chunk_id(doc_id: str, size: str, ordinal: int) -> str:
+    """Stable chunk id: same doc + size + position within the doc -> same id across rebuilds."""
+    return f"{doc_id}:{size}:{ordinal}"
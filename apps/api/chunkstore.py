@@ -0,0 +1,289 @@
+"""
+Compact chunk store.
+
+Chunks are not Python objects: a chunk size is a set of parallel columns in the
+index bundle (see index.py), and a chunk is just its row number.
+
+    chunks.<size>.doc / .start / .end   doc index + byte span into the corpus buffer
+    chunks.<size>.ord / .hash           ordinal within the doc + 64-bit text hash
+    chunks.<size>.tok_ptr / .tok_ids    CSR: sorted, unique token ids of each chunk
+    chunks.<size>.post_ptr / .post_ids  CSR: sorted chunk rows containing each token id
+    chunks.<size>.rank                  tie-break rank of each chunk (see below)
+    chunks.<size>.by_rank               chunk rows ordered by descending rank
+    vocab / vocab.off                   interned tokens, sorted, so id order == byte order
+
+Token ids are assigned in sorted order, which lets a worker look a query token
+up with a binary search over the mapped vocabulary instead of holding a
+str -> id dict per process.
+
+Retrieval historically sorted (score, doc_id, title, chunk_text) descending, so
+ties were broken by doc id, then title, then text. `rank` precomputes that
+order at build time: ranking by (score, rank) gives the same results without
+touching any text.
+
+Text is only decoded for the chunks that are actually returned, and snippets
+decode at most a bounded prefix of the chunk.
+
+A chunk's id ("<doc id>:<size>:<ordinal>") depends only on the doc and the
+chunking config, not on where it ranked, so the same chunk is cited with the
+same id across queries and index rebuilds.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .chunking import chunk_id
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .dense import DenseIndex
+    from .index import RetrievalIndex
+
+SNIPPET_CHARS = 220
+
+
+# ---------------- Build side ----------------
+
+class VocabularyBuilder:
+    """Interns tokens while an index is built, then renumbers them in sorted order."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+
+    def intern_all(self, tokens: Iterable[str]) -> List[int]:
+        ids = self._ids
+        out = []
+        for t in tokens:
+            i = ids.get(t)
+            if i is None:
+                i = ids[t] = len(ids)
+            out.append(i)
+        return out
+
+    def finalize(self) -> Tuple[bytes, array, array]:
+        """(vocab blob, vocab offsets, remap) where remap[build_id] == sorted id."""
+        ordered = sorted(self._ids, key=lambda t: t.encode("utf-8"))
+        remap = array("I", bytes(4 * len(ordered)))
+        blob = bytearray()
+        offsets = array("Q", [0])
+        for new_id, tok in enumerate(ordered):
+            remap[self._ids[tok]] = new_id
+            blob += tok.encode("utf-8")
+            offsets.append(len(blob))
+        return bytes(blob), offsets, remap
+
+
+def content_hash(text: str) -> int:
+    """64-bit hash of a chunk's text; equal text -> equal hash, across docs and builds."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def chunk_sections(
+    size: str,
+    chunk_tokens: Sequence[List[int]],
+    tie_keys: Sequence[tuple],
+    remap: array,
+    vocab_size: int,
+) -> List[Tuple[str, str, bytes]]:
+    """Token CSR, postings and tie-break columns for one chunk size."""
+    tok_ptr = array("Q", [0])
+    tok_ids = array("I")
+    postings: List[List[int]] = [[] for _ in range(vocab_size)]
+    for row, ids in enumerate(chunk_tokens):
+        sorted_ids = sorted({remap[i] for i in ids})
+        tok_ids.extend(sorted_ids)
+        tok_ptr.append(len(tok_ids))
+        for t in sorted_ids:
+            postings[t].append(row)
+
+    post_ptr = array("Q", [0])
+    post_ids = array("I")
+    for rows in postings:
+        post_ids.extend(rows)  # already ascending: rows were visited in order
+        post_ptr.append(len(post_ids))
+
+    ascending = sorted(range(len(tie_keys)), key=lambda r: (tie_keys[r], r))
+    rank = array("I", bytes(4 * len(ascending)))
+    for pos, row in enumerate(ascending):
+        rank[row] = pos
+    by_rank = array("I", reversed(ascending))
+
+    return [
+        (f"chunks.{size}.tok_ptr", "Q", tok_ptr.tobytes()),
+        (f"chunks.{size}.tok_ids", "I", tok_ids.tobytes()),
+        (f"chunks.{size}.post_ptr", "Q", post_ptr.tobytes()),
+        (f"chunks.{size}.post_ids", "I", post_ids.tobytes()),
+        (f"chunks.{size}.rank", "I", rank.tobytes()),
+        (f"chunks.{size}.by_rank", "I", by_rank.tobytes()),
+    ]
+
+
+# ---------------- Read side ----------------
+
+class Vocabulary:
+    __slots__ = ("_blob", "_off", "size")
+
+    def __init__(self, blob: memoryview, offsets: memoryview) -> None:
+        self._blob = blob
+        self._off = offsets
+        self.size = len(offsets) - 1
+
+    def token(self, token_id: int) -> str:
+        return bytes(self._blob[self._off[token_id] : self._off[token_id + 1]]).decode("utf-8")
+
+    def lookup(self, token: str) -> Optional[int]:
+        key = token.encode("utf-8")
+        blob, off = self._blob, self._off
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = bytes(blob[off[mid] : off[mid + 1]])
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def ids(self, tokens: Iterable[str]) -> List[int]:
+        """Ids of the tokens that exist in the corpus (unknown tokens can't score)."""
+        out = []
+        for t in tokens:
+            i = self.lookup(t)
+            if i is not None:
+                out.append(i)
+        return out
+
+
+class ChunkRef:
+    """One chunk row; fields are resolved from the mapped columns on access."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "ChunkStore", row: int) -> None:
+        self.store = store
+        self.row = row
+
+    @property
+    def doc_index(self) -> int:
+        return self.store.doc[self.row]
+
+    @property
+    def doc_id(self) -> str:
+        return self.store.index.doc_id(self.doc_index)
+
+    @property
+    def title(self) -> str:
+        return self.store.index.doc_title(self.doc_index)
+
+    @property
+    def ordinal(self) -> int:
+        return self.store.ord[self.row]
+
+    @property
+    def id(self) -> str:
+        return chunk_id(self.doc_id, self.store.size, self.ordinal)
+
+    @property
+    def content_hash(self) -> int:
+        return self.store.hash[self.row]
+
+    def view(self) -> memoryview:
+        """Zero-copy UTF-8 bytes of the chunk."""
+        return self.store.index.section("corpus")[self.store.start[self.row] : self.store.end[self.row]]
+
+    def text(self) -> str:
+        return bytes(self.view()).decode("utf-8")
+
+    def snippet(self, limit: int = SNIPPET_CHARS) -> str:
+        view = self.view()
+        # A char is at most 4 UTF-8 bytes: decoding 4*(limit+1) bytes is always
+        # enough to know whether the chunk is longer than `limit` chars.
+        cap = 4 * (limit + 1)
+        if len(view) > cap:
+            return bytes(view[:cap]).decode("utf-8", "ignore")[:limit] + "…"
+        text = bytes(view).decode("utf-8")
+        return text[:limit] + ("…" if len(text) > limit else "")
+
+    def token_ids(self) -> memoryview:
+        ptr = self.store.tok_ptr
+        return self.store.tok_ids[ptr[self.row] : ptr[self.row + 1]]
+
+    def overlap(self, q_ids: Iterable[int]) -> int:
+        """Number of distinct query tokens in this chunk (the lexical score)."""
+        toks = set(self.token_ids())
+        return sum(1 for t in set(q_ids) if t in toks)
+
+
+class ChunkStore:
+    """Columns for one chunk size of a mapped index."""
+
+    __slots__ = ("index", "size", "doc", "ord", "start", "end", "hash", "tok_ptr", "tok_ids", "post_ptr", "post_ids", "rank", "by_rank", "_dense")
+
+    def __init__(self, index: "RetrievalIndex", size: str) -> None:
+        self.index = index
+        self.size = size
+        col = lambda name: index.section(f"chunks.{size}.{name}")  # noqa: E731
+        self.doc = col("doc")
+        self.ord = col("ord")
+        self.start = col("start")
+        self.end = col("end")
+        self.hash = col("hash")
+        self.tok_ptr = col("tok_ptr")
+        self.tok_ids = col("tok_ids")
+        self.post_ptr = col("post_ptr")
+        self.post_ids = col("post_ids")
+        self.rank = col("rank")
+        self.by_rank = col("by_rank")
+        self._dense: Optional[DenseIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.doc)
+
+    def ref(self, row: int) -> ChunkRef:
+        return ChunkRef(self, row)
+
+    def dense(self) -> DenseIndex:
+        if self._dense is None:
+            from .dense import DenseIndex  # numpy is only imported once dense retrieval is used
+
+            self._dense = DenseIndex(self.index.section, self.size, int(self.index.header["dense"]["dim"]))
+        return self._dense
+
+    def overlap(self, q_ids: Iterable[int]) -> Dict[int, int]:
+        """chunk row -> number of distinct query tokens it contains (rows with 0 are omitted)."""
+        scores: Dict[int, int] = {}
+        get = scores.get
+        ptr, post = self.post_ptr, self.post_ids
+        for t in set(q_ids):
+            for row in post[ptr[t] : ptr[t + 1]]:
+                scores[row] = get(row, 0) + 1
+        return scores
+
+    def fuse(self, rankings: Sequence[Sequence[int]], k: int, c: int = 60) -> List[int]:
+        """Reciprocal-rank fusion of several row rankings (best first) into the k best rows."""
+        fused: Dict[int, float] = {}
+        get = fused.get
+        for ranking in rankings:
+            for pos, row in enumerate(ranking):
+                fused[row] = get(row, 0.0) + 1.0 / (c + pos + 1)
+        rank = self.rank
+        return [row for row, _ in heapq.nlargest(k, fused.items(), key=lambda kv: (kv[1], rank[kv[0]]))]
+
+    def top(self, scores: Dict[int, int], k: int) -> List[Tuple[int, int]]:
+        """(score, row) of the k best chunks, zero-score chunks included to fill k."""
+        if k <= 0:
+            return []
+        rank = self.rank
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], rank[kv[0]]))
+        out = [(score, row) for row, score in best]
+        if len(out) < k:
+            for row in self.by_rank:
+                if row not in scores:
+                    out.append((0, row))
+                    if len(out) == k:
+                        break
+        return out
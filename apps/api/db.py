@@ -1,24 +1,521 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
 import os
+import re
 import sqlite3
+import threading
+import time
 import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: shard allocation is not cross-process locked
+    fcntl = None  # type: ignore[assignment]
 
 DB_PATH = os.getenv("AI_LAB_DB_PATH", os.path.join(os.getcwd(), "apps", "api", "ai_lab.db"))
 
+DEFAULT_SCENARIO_ID = "dayzero-utility-outage"
+
+# Route each scenario to its own SQLite file (see "Shards" below).
+DB_SHARDING = os.getenv("AI_LAB_DB_SHARDING", "").strip().lower() in ("1", "true", "yes", "on")
+# Most shard files allocated; further scenarios stay in AI_LAB_DB_PATH.
+DB_MAX_SHARDS = int(os.getenv("AI_LAB_DB_MAX_SHARDS", "64"))
+# Open connections each thread keeps (least recently used ones are closed).
+DB_MAX_OPEN = int(os.getenv("AI_LAB_DB_MAX_OPEN", "16"))
+# Writer threads; every DB file is always written by the same one.
+DB_WRITERS = int(os.getenv("AI_LAB_DB_WRITERS", "4"))
+
+# Read connections that may run concurrently with the single writer (WAL).
+DB_READERS = int(os.getenv("AI_LAB_DB_READERS", "4"))
+# How long a connection waits on another process' write lock before failing.
+DB_BUSY_TIMEOUT_MS = int(os.getenv("AI_LAB_DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Background deletion of reset generations (see "Generations" below).
+GC_BATCH = int(os.getenv("AI_LAB_GC_BATCH", "500"))
+GC_PAUSE_MS = int(os.getenv("AI_LAB_GC_PAUSE_MS", "20"))
+GC_INTERVAL_S = float(os.getenv("AI_LAB_GC_INTERVAL_S", "60"))
+
+T = TypeVar("T")
+
 def _utcnow_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
-def connect() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+def _json_text(value: Any) -> str:
+    """Text for a *_json column; bytes are already-encoded JSON (e.g. fastjson.Raw) and stored as is."""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return json.dumps(value)
+
+# Statements that take the write lock when they open a transaction.
+_LOCKING_SQL = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE|BEGIN\s+(IMMEDIATE|EXCLUSIVE))\b", re.IGNORECASE)
+
+class _TimedConnection(sqlite3.Connection):
+    """
+    Reports commit durations and write-lock waits to apps/api/metrics.py. The
+    lock is taken by the first write of a transaction (or BEGIN IMMEDIATE), so
+    that statement's duration is the wait for it plus the statement itself.
+    """
+
+    def __init__(self, database: str, *args: Any, **kwargs: Any) -> None:
+        super().__init__(database, *args, **kwargs)
+        self.db_label = os.path.basename(database)
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        if self.in_transaction or not _LOCKING_SQL.match(sql):
+            return super().execute(sql, parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.DB_LOCK_WAIT.observe(time.perf_counter() - t0, self.db_label)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        if self.in_transaction or not _LOCKING_SQL.match(sql):
+            return super().executemany(sql, seq_of_parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.DB_LOCK_WAIT.observe(time.perf_counter() - t0, self.db_label)
+
+    def commit(self) -> None:
+        if not self.in_transaction:
+            return super().commit()
+        t0 = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            metrics.DB_COMMIT_DURATION.observe(time.perf_counter() - t0, self.db_label)
+
+def _open(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0, factory=_TimedConnection)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS};")
+    return conn
+
+def connect() -> sqlite3.Connection:
+    conn = _open(DB_PATH)
     ensure_schema(conn)
     return conn
 
+
+# ---------------- Shards ----------------
+#
+# With AI_LAB_DB_SHARDING=1 every scenario gets its own SQLite file, so one
+# busy scenario no longer holds the write lock every other scenario needs.
+# `<db dir>/shards/map.json` maps scenario id -> file (relative to the db dir,
+# or "default" for AI_LAB_DB_PATH itself); a scenario seen for the first time
+# is allocated a file and recorded there. Operators can edit the map to group
+# scenarios. The default scenario stays in AI_LAB_DB_PATH so existing data
+# keeps its home. Without sharding everything routes to AI_LAB_DB_PATH.
+#
+# Scenario ids come from clients, so only writes allocate, and only for
+# well-formed ids while fewer than AI_LAB_DB_MAX_SHARDS shards exist; any
+# scenario without a shard lives in AI_LAB_DB_PATH. Reads never allocate: an
+# unmapped scenario is read from AI_LAB_DB_PATH (where it has no rows unless
+# it overflowed there).
+#
+# Lists and summaries that are not scoped to one scenario fan out over every
+# shard and merge. Runs carry a scenario_id; point lookups without one probe
+# the shards in turn.
+
+_DEFAULT_SHARD = "default"
+_SHARDABLE_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.:-]{0,63}$")
+# How long the in-memory map is trusted without a stat() (write_for's event-loop fast path).
+_SHARD_MAP_FRESH_S = 1.0
+_shard_cache: Dict[str, Any] = {"map_path": None, "mtime": None, "map": {}, "checked": 0.0}
+_shard_lock = threading.Lock()
+
+
+def _shard_dir() -> str:
+    return os.path.join(os.path.dirname(DB_PATH), "shards")
+
+
+def _shard_map_path() -> str:
+    return os.path.join(_shard_dir(), "map.json")
+
+
+def _load_shard_map() -> Dict[str, str]:
+    path = _shard_map_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    cache = _shard_cache
+    if cache["map_path"] != path or cache["mtime"] != mtime:
+        shards = {DEFAULT_SCENARIO_ID: _DEFAULT_SHARD}
+        if mtime is not None:
+            with open(path) as f:
+                shards.update(json.load(f).get("shards", {}))
+        cache.update(map_path=path, mtime=mtime, map=shards)
+    cache["checked"] = time.monotonic()
+    return cache["map"]
+
+
+@contextmanager
+def _shard_map_lock() -> Iterator[None]:
+    os.makedirs(_shard_dir(), exist_ok=True)
+    with open(os.path.join(_shard_dir(), "map.lock"), "a+") as lf:
+        if fcntl is not None:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+
+def _allocated(shards: Dict[str, str]) -> int:
+    return len(set(shards.values()) - {_DEFAULT_SHARD})
+
+
+def _allocate_shard(scenario_id: str) -> str:
+    """The shard of a scenario about to be written, allocating one if allowed (else the default)."""
+    if not _SHARDABLE_ID.match(scenario_id) or _allocated(_load_shard_map()) >= DB_MAX_SHARDS:
+        return _DEFAULT_SHARD
+    with _shard_lock, _shard_map_lock():
+        shards = dict(_load_shard_map())  # another worker may have allocated it meanwhile
+        if scenario_id in shards:
+            return shards[scenario_id]
+        if _allocated(shards) >= DB_MAX_SHARDS:
+            return _DEFAULT_SHARD
+        slug = re.sub(r"[^a-z0-9]+", "-", scenario_id.lower()).strip("-")[:40] or "scenario"
+        digest = hashlib.sha1(scenario_id.encode("utf-8")).hexdigest()[:8]
+        shards[scenario_id] = f"shards/{slug}-{digest}.db"
+        tmp = f"{_shard_map_path()}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump({"shards": shards}, f, indent=2, sort_keys=True)
+        os.replace(tmp, _shard_map_path())
+        return shards[scenario_id]
+
+
+def _shard_file(name: str) -> str:
+    return DB_PATH if name == _DEFAULT_SHARD else os.path.join(os.path.dirname(DB_PATH), name)
+
+
+def shard_path(scenario_id: Optional[str], allocate: bool = True) -> str:
+    """
+    The DB file holding `scenario_id`'s runs and telemetry. With `allocate`
+    (writes only) a scenario seen for the first time may get a new shard; this
+    can block on the map's file lock, so never call it on the event loop.
+    """
+    if not DB_SHARDING or not scenario_id:
+        return DB_PATH
+    name = _load_shard_map().get(scenario_id)
+    if name is None:
+        name = _allocate_shard(scenario_id) if allocate else _DEFAULT_SHARD
+    return _shard_file(name)
+
+
+def _known_shard_path(scenario_id: Optional[str]) -> Optional[str]:
+    """shard_path() from memory alone, or None when the map must be re-read (or the shard allocated)."""
+    if not DB_SHARDING or not scenario_id:
+        return DB_PATH
+    cache = _shard_cache
+    name = cache["map"].get(scenario_id)
+    if name is None or cache["map_path"] != _shard_map_path() or time.monotonic() - cache["checked"] > _SHARD_MAP_FRESH_S:
+        return None
+    return _shard_file(name)
+
+
+def shard_paths() -> List[str]:
+    """Every DB file with data (the main DB first)."""
+    if not DB_SHARDING:
+        return [DB_PATH]
+    paths = [DB_PATH]
+    for name in sorted(set(_load_shard_map().values())):
+        path = _shard_file(name)
+        if path not in paths and os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def _scoped_paths(scenario_id: Optional[str]) -> List[str]:
+    """Files a read must look at. Never allocates a shard or creates a file."""
+    if not scenario_id:
+        return shard_paths()
+    path = shard_path(scenario_id, allocate=False)
+    return [path] if path == DB_PATH or os.path.exists(path) else []
+
+
+# ---------------- Per-thread connections ----------------
+#
+# Helpers below reuse long-lived connections per thread instead of opening
+# (and re-running schema DDL on) a fresh connection per call: one per DB file,
+# at most DB_MAX_OPEN per thread, least recently used closed first. Bumping the
+# epoch (e.g. after DB_PATH changes) makes every thread reopen on its next call.
+
+_local = threading.local()
+_epoch = 0
+_schema_ready: set = set()
+_schema_lock = threading.Lock()
+
+def _conn(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or DB_PATH
+    conns: "OrderedDict[str, sqlite3.Connection]" = getattr(_local, "conns", None)
+    if conns is None or _local.epoch != _epoch:
+        for old in (conns or {}).values():
+            try:
+                old.close()
+            except sqlite3.Error:
+                pass
+        conns = _local.conns = OrderedDict()
+        _local.epoch = _epoch
+    conn = conns.get(path)
+    if conn is not None:
+        conns.move_to_end(path)
+        return conn
+
+    conn = _open(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    # WAL + NORMAL is durable across application crashes; only an OS crash can
+    # lose the last commits, which is an acceptable trade for game artifacts.
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    if path not in _schema_ready:
+        with _schema_lock:
+            if path not in _schema_ready:
+                ensure_schema(conn)
+                _schema_ready.add(path)
+    conns[path] = conn
+    while len(conns) > max(1, DB_MAX_OPEN):
+        _, evicted = conns.popitem(last=False)
+        try:
+            evicted.close()
+        except sqlite3.Error:
+            pass
+    return conn
+
+def close_connections() -> None:
+    """Invalidate every cached per-thread connection (each thread reopens lazily)."""
+    global _epoch
+    with _schema_lock:
+        _epoch += 1
+        _schema_ready.clear()
+
+
+# ---------------- Generations ----------------
+#
+# A reset never deletes anything on the request path. Every run and telemetry
+# row is stamped with the generation it was written in, every read only sees
+# the current generation, and /api/reset just bumps it (one row in lab_meta of
+# AI_LAB_DB_PATH, shared by all workers and shards). Rows of older generations
+# are deleted afterwards by GarbageCollector, a few hundred at a time on the
+# writer thread that owns each file, so gameplay writes interleave with it.
+
+_GENERATION_SQL = "SELECT CAST(value AS INTEGER) FROM lab_meta WHERE key = 'generation'"
+
+
+def current_generation() -> int:
+    row = _conn(DB_PATH).execute(_GENERATION_SQL).fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_generation() -> int:
+    """Start a new (empty) generation and return its number."""
+    conn = _conn(DB_PATH)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            """INSERT INTO lab_meta (key, value) VALUES ('generation', '1')
+               ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"""
+        )
+        generation = int(conn.execute(_GENERATION_SQL).fetchone()[0])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return generation
+
+
+_GENERATION_TABLES = ("telemetry_events", "rag_runs", "eval_runs", "run_summaries", "run_config_stats", "rag_searches")
+
+
+def gc_batch(path: str, generation: int, limit: int = GC_BATCH) -> int:
+    """Delete up to `limit` rows older than `generation` from one DB file. Returns rows deleted."""
+    conn = _conn(path)
+    deleted = 0
+    try:
+        for table in _GENERATION_TABLES:
+            cur = conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE generation < ? LIMIT ?)",
+                (int(generation), limit - deleted),
+            )
+            deleted += max(0, cur.rowcount)
+            if deleted >= limit:
+                break
+        conn.commit()
+    except BaseException:
+        # The connection outlives this call: never leave a transaction (and the write lock) open on it.
+        conn.rollback()
+        raise
+    return deleted
+
+
+# ---------------- DB executor ----------------
+
+class DbExecutor:
+    """
+    Runs blocking SQLite helpers off the event loop.
+
+    Each DB file is written by exactly one dedicated thread (one connection),
+    so writes from this worker never contend with each other for a file's write
+    lock, while different shards are written in parallel. Reads use a separate
+    pool sized for WAL's concurrent readers. None of them use Starlette's shared
+    threadpool, so slow writes never hold the slots CPU-light requests need.
+    """
+
+    def __init__(self, readers: int = DB_READERS, writers: int = DB_WRITERS) -> None:
+        self.readers = max(1, readers)
+        self._writers: List[Optional[ThreadPoolExecutor]] = [None] * max(1, writers)
+        self._reader: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+
+    @property
+    def pending_writes(self) -> int:
+        """Writes submitted from this worker that have not finished yet (queued or running)."""
+        return self._pending_writes
+
+    def _writer_for(self, path: str) -> ThreadPoolExecutor:
+        i = zlib.crc32(path.encode("utf-8")) % len(self._writers)
+        writer = self._writers[i]
+        if writer is None:
+            with self._lock:
+                writer = self._writers[i]
+                if writer is None:
+                    writer = self._writers[i] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ai-lab-db-writer-{i}")
+        return writer
+
+    def _reader_pool(self) -> ThreadPoolExecutor:
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    self._reader = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="ai-lab-db-reader")
+        return self._reader
+
+    async def write(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Run a write against the main DB file."""
+        return await self._submit_write(DB_PATH, fn, *args, **kwargs)
+
+    async def write_for(self, scenario_id: Optional[str], fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Run a write on the writer thread that owns `scenario_id`'s shard."""
+        path = _known_shard_path(scenario_id)
+        if path is None:
+            # Reading the map (and allocating a shard) does file I/O and may wait on
+            # other workers' lock: do it on the main DB's writer thread, not the loop.
+            path = await self._submit_write(DB_PATH, shard_path, scenario_id)
+        return await self._submit_write(path, fn, *args, **kwargs)
+
+    async def _submit_write(self, path: str, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        writer = self._writer_for(path)
+        # Only touched from the event loop thread, so a plain counter is enough.
+        self._pending_writes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(writer, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending_writes -= 1
+
+    def write_blocking(self, path: str, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Run a write on `path`'s writer thread from a background (non event loop) thread."""
+        return self._writer_for(path).submit(fn, *args, **kwargs).result()
+
+    async def read(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        reader = self._reader_pool()
+        return await asyncio.get_running_loop().run_in_executor(reader, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for pool in (*self._writers, self._reader):
+                if pool is not None:
+                    pool.shutdown(wait=True)
+            self._writers = [None] * len(self._writers)
+            self._reader = None
+
+
+executor = DbExecutor()
+metrics.registry.collector(lambda: metrics.DB_PENDING_WRITES.set(executor.pending_writes))
+
+
+class GarbageCollector:
+    """
+    Deletes rows of past generations in the background: after every reset
+    (`wake()`) and every GC_INTERVAL_S (resets made by other workers), batch by
+    batch on each file's writer thread with a short pause in between.
+    """
+
+    def __init__(
+        self,
+        executor: DbExecutor,
+        batch: int = GC_BATCH,
+        pause_s: float = GC_PAUSE_MS / 1000.0,
+        interval_s: float = GC_INTERVAL_S,
+    ) -> None:
+        self.executor = executor
+        self.batch = max(1, batch)
+        self.pause_s = pause_s
+        self.interval_s = interval_s
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ai-lab-db-gc", daemon=True)
+            self._thread.start()
+        self.wake()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.sweep()
+            except Exception:
+                # Stale rows are invisible anyway; try again next round.
+                pass
+
+    def sweep(self) -> int:
+        """Delete every row of past generations. Returns rows deleted."""
+        generation = current_generation()
+        deleted = 0
+        for path in shard_paths():
+            while not self._stop.is_set():
+                n = self.executor.write_blocking(path, gc_batch, path, generation, self.batch)
+                deleted += n
+                if n < self.batch:
+                    break
+                time.sleep(self.pause_s)
+        return deleted
+
+
+gc = GarbageCollector(executor)
+
 def init_db() -> None:
     conn = connect()
     cur = conn.cursor()
@@ -32,7 +529,10 @@ def init_db() -> None:
           config_json TEXT NOT NULL,
           answer TEXT NOT NULL,
           citations_json TEXT NOT NULL,
-          retrieved_json TEXT NOT NULL
+          retrieved_json TEXT NOT NULL,
+          scenario_id TEXT,
+          generation INTEGER NOT NULL DEFAULT 0,
+          search_id TEXT
         )
         """
     )
@@ -45,7 +545,9 @@ def init_db() -> None:
           failures_json TEXT NOT NULL,
           rag_run_id TEXT,
           rag_score INTEGER NOT NULL,
-          rag_passed INTEGER NOT NULL
+          rag_passed INTEGER NOT NULL,
+          scenario_id TEXT,
+          generation INTEGER NOT NULL DEFAULT 0
         )
         """
     )
@@ -63,7 +565,10 @@ def init_db() -> None:
           event_type TEXT NOT NULL,
           latency_ms INTEGER,
           success INTEGER NOT NULL,
-          metadata_json TEXT NOT NULL
+          metadata_json TEXT NOT NULL,
+          client_event_id TEXT,
+          weight REAL NOT NULL DEFAULT 1.0,
+          generation INTEGER NOT NULL DEFAULT 0
         )
         """
     )
@@ -82,27 +587,117 @@ def insert_telemetry_event(
     run_id: Optional[str] = None,
     agent_id: Optional[str] = None,
     metadata: Optional[Dict[str, Any]] = None,
+    client_event_id: Optional[str] = None,
+    weight: float = 1.0,
 ) -> str:
-    event_id = uuid.uuid4().hex[:16]
-    conn = connect()
-    conn.execute(
-        """INSERT INTO telemetry_events (id, created_at, scenario_id, run_id, agent_id, event_type, latency_ms, success, metadata_json)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            event_id,
-            _utcnow_iso(),
-            scenario_id,
-            run_id,
-            agent_id,
-            event_type,
-            int(latency_ms) if latency_ms is not None else None,
-            1 if success else 0,
-            json.dumps(metadata or {}),
-        ),
-    )
-    conn.commit()
-    conn.close()
-    return event_id
+    ids, _ = insert_telemetry_events([
+        {
+            "scenario_id": scenario_id,
+            "event_type": event_type,
+            "success": success,
+            "latency_ms": latency_ms,
+            "run_id": run_id,
+            "agent_id": agent_id,
+            "metadata": metadata,
+            "client_event_id": client_event_id,
+            "weight": weight,
+        }
+    ])
+    return ids[0]
+
+
+_IN_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+
+def insert_telemetry_events(events: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """
+    Insert a batch of events (insert_telemetry_event kwargs), one transaction
+    per shard.
+
+    Events carrying a `client_event_id` are idempotent: one that is already
+    stored (or repeated within the batch) is not inserted again. Returns
+    (ids, duplicates): the stored id of every event in order (the original id
+    for a duplicate) and the client event ids that were duplicates. Event ids
+    are unique per shard and generation.
+    """
+    created_at = _utcnow_iso()
+    generation = current_generation()
+    by_shard: Dict[str, List[int]] = {}
+    for i, e in enumerate(events):
+        by_shard.setdefault(shard_path(e["scenario_id"]), []).append(i)
+
+    ids: List[str] = [""] * len(events)
+    duplicates: List[str] = []
+    for path, positions in by_shard.items():
+        shard_ids, shard_dups = _insert_telemetry_shard(
+            _conn(path), [events[i] for i in positions], created_at, generation
+        )
+        for i, event_id in zip(positions, shard_ids):
+            ids[i] = event_id
+        duplicates += shard_dups
+    return ids, duplicates
+
+
+def _insert_telemetry_shard(
+    conn: sqlite3.Connection, events: List[Dict[str, Any]], created_at: str, generation: int
+) -> Tuple[List[str], List[str]]:
+    keys = list(dict.fromkeys(e["client_event_id"] for e in events if e.get("client_event_id")))
+    # IMMEDIATE takes the write lock up front so no other process can insert a
+    # key between the lookup and the insert.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        known: Dict[str, str] = {}
+        for i in range(0, len(keys), _IN_CHUNK):
+            part = keys[i : i + _IN_CHUNK]
+            for row in conn.execute(
+                "SELECT client_event_id, id FROM telemetry_events "
+                f"WHERE generation = ? AND client_event_id IN ({','.join('?' * len(part))})",
+                [generation, *part],
+            ):
+                known[row["client_event_id"]] = row["id"]
+
+        ids: List[str] = []
+        duplicates: List[str] = []
+        rows = []
+        for e in events:
+            key = e.get("client_event_id")
+            if key and key in known:
+                ids.append(known[key])
+                duplicates.append(key)
+                continue
+            event_id = uuid.uuid4().hex[:16]
+            if key:
+                known[key] = event_id
+            ids.append(event_id)
+            latency_ms = e.get("latency_ms")
+            rows.append(
+                (
+                    event_id,
+                    created_at,
+                    e["scenario_id"],
+                    e.get("run_id"),
+                    e.get("agent_id"),
+                    e["event_type"],
+                    int(latency_ms) if latency_ms is not None else None,
+                    1 if e.get("success", True) else 0,
+                    json.dumps(e.get("metadata") or {}),
+                    key or None,
+                    float(e.get("weight", 1.0)),
+                    generation,
+                )
+            )
+        conn.executemany(
+            """INSERT OR IGNORE INTO telemetry_events
+               (id, created_at, scenario_id, run_id, agent_id, event_type, latency_ms, success, metadata_json,
+                client_event_id, weight, generation)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return ids, duplicates
 
 
 def list_telemetry_events(
@@ -111,8 +706,8 @@ def list_telemetry_events(
     since_iso: Optional[str] = None,
     limit: int = 2000,
 ) -> List[Dict[str, Any]]:
-    where = []
-    params: List[Any] = []
+    where = ["generation = ?"]
+    params: List[Any] = [current_generation()]
     if scenario_id:
         where.append("scenario_id = ?")
         params.append(scenario_id)
@@ -120,15 +715,11 @@ def list_telemetry_events(
         where.append("datetime(created_at) >= datetime(?)")
         params.append(since_iso)
 
-    sql = "SELECT * FROM telemetry_events"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
+    sql = "SELECT * FROM telemetry_events WHERE " + " AND ".join(where)
     sql += " ORDER BY datetime(created_at) ASC LIMIT ?"
     params.append(int(limit))
 
-    conn = connect()
-    rows = conn.execute(sql, tuple(params)).fetchall()
-    conn.close()
+    rows = _fan_out(sql, tuple(params), scenario_id, key="created_at", limit=limit)
 
     out: List[Dict[str, Any]] = []
     for r in rows:
@@ -143,41 +734,224 @@ def list_telemetry_events(
                 "latency_ms": r["latency_ms"],
                 "success": bool(r["success"]),
                 "metadata": json.loads(r["metadata_json"] or "{}"),
+                "weight": r["weight"],
             }
         )
     return out
 
-def insert_rag_run(*, passed: bool, score: int, config: Dict[str, Any], answer: str, citations: List[str], retrieved: list[dict]) -> str:
+
+def export_telemetry_rows(path: str, after_rowid: int, generation: int, limit: int = 50000) -> List[sqlite3.Row]:
+    """
+    Raw telemetry rows of one DB file with rowid > after_rowid, in rowid order,
+    skipping generations older than `generation` (analytics feed).
+    """
+    return _conn(path).execute(
+        "SELECT rowid AS rowid, created_at, scenario_id, event_type, latency_ms, success, weight, metadata_json, "
+        "generation FROM telemetry_events WHERE rowid > ? AND generation >= ? ORDER BY rowid LIMIT ?",
+        (int(after_rowid), int(generation), int(limit)),
+    ).fetchall()
+
+
+def telemetry_max_rowid(path: str) -> int:
+    row = _conn(path).execute("SELECT max(rowid) FROM telemetry_events").fetchone()
+    return int(row[0] or 0)
+
+
+def _fan_out(
+    sql: str,
+    params: tuple,
+    scenario_id: Optional[str],
+    *,
+    key: str,
+    limit: int,
+    descending: bool = False,
+) -> List[sqlite3.Row]:
+    """
+    Run a (per-shard ordered, limited) query on the shard of `scenario_id`, or
+    on every shard, and merge the results by `key`.
+    """
+    paths = _scoped_paths(scenario_id)
+    if len(paths) == 1:
+        return _conn(paths[0]).execute(sql, params).fetchall()
+    rows = [r for path in paths for r in _conn(path).execute(sql, params).fetchall()]
+    rows.sort(key=lambda r: r[key], reverse=descending)
+    return rows[: int(limit)]
+
+
+def _find(sql: str, params: tuple, scenario_id: Optional[str]) -> Optional[sqlite3.Row]:
+    """First row found for a point lookup, probing every shard when the scenario is unknown."""
+    for path in _scoped_paths(scenario_id):
+        row = _conn(path).execute(sql, params).fetchone()
+        if row is not None:
+            return row
+    return None
+
+
+# ---------------- Run summaries ----------------
+#
+# Listing runs never touches the wide rag_runs/eval_runs rows (answer,
+# citations, retrieved chunks, failures). Every insert also writes one narrow
+# run_summaries row (kind 'rag' or 'eval'; `score` is the RAG score or the eval
+# pass rate) and bumps the per-config counters in run_config_stats, in the same
+# transaction. `config_key` is the RAG config as canonical JSON; an eval carries
+# the key of the RAG run it evaluated ('' when unknown). Databases created
+# before these tables are backfilled once by _migrate.
+#
+# Runs graded by a config search (search_id set) get no summary: they are
+# reached through their search, and would otherwise flood the artifact lists
+# and skew the per-config pass rates of runs users made.
+
+# Bumped when the backfill changes what it materializes, to rebuild existing files.
+_SUMMARIES_VERSION = "2"
+
+# An eval run "passes" at this pass rate (the /api/eval/run gate).
+EVAL_PASS_RATE = 80
+
+_SUMMARY_COLUMNS = (
+    "id, kind, created_at, scenario_id, passed, score, config_key, rag_run_id, rag_score, rag_passed, generation"
+)
+
+
+def config_key(config: Dict[str, Any]) -> str:
+    return json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+
+def _record_summary(conn: sqlite3.Connection, row: tuple) -> None:
+    conn.execute(f"INSERT INTO run_summaries ({_SUMMARY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+    run_id, kind, created_at, scenario_id, passed, score, key = row[:7]
+    conn.execute(
+        """INSERT INTO run_config_stats
+             (generation, kind, scenario_id, config_key, runs, passed, score_sum, last_run_at)
+           VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+           ON CONFLICT (generation, kind, scenario_id, config_key) DO UPDATE SET
+             runs = runs + 1,
+             passed = passed + excluded.passed,
+             score_sum = score_sum + excluded.score_sum,
+             last_run_at = MAX(last_run_at, excluded.last_run_at)""",
+        (row[-1], kind, scenario_id, key, passed, score, created_at),
+    )
+
+
+def _list_summaries(kind: str, limit: int, scenario_id: Optional[str]) -> List[sqlite3.Row]:
+    sql = f"SELECT {_SUMMARY_COLUMNS} FROM run_summaries WHERE kind = ? AND generation = ?"
+    params: List[Any] = [kind, current_generation()]
+    if scenario_id:
+        sql += " AND scenario_id = ?"
+        params.append(scenario_id)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(int(limit))
+    return _fan_out(sql, tuple(params), scenario_id, key="created_at", limit=limit, descending=True)
+
+
+def config_stats(scenario_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Per-config aggregates of the current generation, merged across shards (and
+    scenarios unless one is given): {"rag": [...], "eval": [...]}, most used first.
+    """
+    sql = """SELECT kind, config_key, SUM(runs), SUM(passed), SUM(score_sum), MAX(last_run_at)
+             FROM run_config_stats WHERE generation = ?"""
+    params: List[Any] = [current_generation()]
+    if scenario_id:
+        sql += " AND scenario_id = ?"
+        params.append(scenario_id)
+    sql += " GROUP BY kind, config_key"
+    merged: Dict[Tuple[str, str], List[Any]] = {}
+    for path in _scoped_paths(scenario_id):
+        for kind, key, runs, passed, score_sum, last in _conn(path).execute(sql, params):
+            acc = merged.setdefault((kind, key), [0, 0, 0, ""])
+            acc[0] += runs
+            acc[1] += passed
+            acc[2] += score_sum
+            acc[3] = max(acc[3], last)
+    out: Dict[str, List[Dict[str, Any]]] = {"rag": [], "eval": []}
+    for (kind, key), (runs, passed, score_sum, last) in merged.items():
+        out[kind].append({
+            "config": json.loads(key) if key else None,
+            "runs": runs,
+            "passRate": round(passed / runs, 4),
+            "meanScore": round(score_sum / runs, 2),
+            "lastRunAt": last,
+        })
+    for rows in out.values():
+        rows.sort(key=lambda r: (-r["runs"], r["lastRunAt"]))
+    return out
+
+
+def insert_rag_run(
+    *,
+    passed: bool,
+    score: int,
+    config: Union[Dict[str, Any], bytes],
+    answer: str,
+    citations: Union[List[str], bytes],
+    retrieved: Union[List[Dict[str, Any]], bytes],
+    scenario_id: str = DEFAULT_SCENARIO_ID,
+) -> str:
+    conn = _conn(shard_path(scenario_id))
+    try:
+        run_id = _insert_rag_run(
+            conn,
+            _utcnow_iso(),
+            current_generation(),
+            passed=passed,
+            score=score,
+            config=config,
+            answer=answer,
+            citations=citations,
+            retrieved=retrieved,
+            scenario_id=scenario_id,
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return run_id
+
+
+def _insert_rag_run(
+    conn: sqlite3.Connection,
+    created_at: str,
+    generation: int,
+    *,
+    passed: bool,
+    score: int,
+    config: Union[Dict[str, Any], bytes],
+    answer: str,
+    citations: Union[List[str], bytes],
+    retrieved: Union[List[Dict[str, Any]], bytes],
+    scenario_id: str,
+    search_id: Optional[str] = None,
+) -> str:
     run_id = uuid.uuid4().hex[:12]
-    conn = connect()
+    config_text = _json_text(config)
     conn.execute(
-        """INSERT INTO rag_runs (id, created_at, passed, score, config_json, answer, citations_json, retrieved_json)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        """INSERT INTO rag_runs
+           (id, created_at, passed, score, config_json, answer, citations_json, retrieved_json, scenario_id, generation,
+            search_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (
             run_id,
-            _utcnow_iso(),
+            created_at,
             1 if passed else 0,
             int(score),
-            json.dumps(config),
+            config_text,
             answer,
-            json.dumps(citations),
-            json.dumps(retrieved),
+            _json_text(citations),
+            _json_text(retrieved),
+            scenario_id,
+            generation,
+            search_id,
         ),
     )
-    conn.commit()
-    conn.close()
+    if search_id is None:
+        _record_summary(conn, (
+            run_id, "rag", created_at, scenario_id, 1 if passed else 0, int(score),
+            config_key(json.loads(config_text)), None, None, None, generation,
+        ))
     return run_id
 
-def list_rag_runs(limit: int = 50) -> List[Dict[str, Any]]:
-    conn = connect()
-    rows = conn.execute(
-        """SELECT id, created_at, passed, score, config_json
-           FROM rag_runs
-           ORDER BY datetime(created_at) DESC
-           LIMIT ?""",
-        (int(limit),),
-    ).fetchall()
-    conn.close()
+def list_rag_runs(limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    rows = _list_summaries("rag", limit, scenario_id)
     out: List[Dict[str, Any]] = []
     for r in rows:
         out.append({
@@ -185,84 +959,181 @@ def list_rag_runs(limit: int = 50) -> List[Dict[str, Any]]:
             "created_at": r["created_at"],
             "passed": bool(r["passed"]),
             "score": int(r["score"]),
-            "config": json.loads(r["config_json"]),
+            "config": json.loads(r["config_key"]),
+            "scenario_id": r["scenario_id"],
         })
     return out
 
-def get_rag_run(run_id: str) -> Optional[Dict[str, Any]]:
-    conn = connect()
-    row = conn.execute(
-        """SELECT * FROM rag_runs WHERE id = ?""",
-        (run_id,),
-    ).fetchone()
-    conn.close()
+def get_rag_run(run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    row = _find("SELECT * FROM rag_runs WHERE id = ? AND generation = ?", (run_id, current_generation()), scenario_id)
     if not row:
         return None
     return {
         "id": row["id"],
         "created_at": row["created_at"],
+        "scenario_id": row["scenario_id"] or DEFAULT_SCENARIO_ID,
         "passed": bool(row["passed"]),
         "score": int(row["score"]),
         "config": json.loads(row["config_json"]),
         "answer": row["answer"],
         "citations": json.loads(row["citations_json"]),
         "retrieved": json.loads(row["retrieved_json"]),
+        "search_id": row["search_id"],
+    }
+
+# ---------------- Config searches ----------------
+#
+# A config search (optimizer.py) is stored as one rag_searches row (request,
+# leaderboard, best config, stats) plus a regular rag_run for every question
+# each candidate was graded on, all in one transaction. The runs point back
+# with rag_runs.search_id; leaderboard entry i lists the ids of its runs.
+
+def insert_rag_search(
+    *,
+    request: Dict[str, Any],
+    leaderboard: List[Dict[str, Any]],
+    best: Optional[Dict[str, Any]],
+    stats: Dict[str, Any],
+    runs: List[List[Dict[str, Any]]],
+    scenario_id: str = DEFAULT_SCENARIO_ID,
+) -> Tuple[str, str]:
+    """Store a search; `runs[i]` are insert_rag_run kwargs for leaderboard[i]. Returns (search id, created_at)."""
+    search_id = uuid.uuid4().hex[:12]
+    created_at = _utcnow_iso()
+    generation = current_generation()
+    conn = _conn(shard_path(scenario_id))
+    try:
+        entries = []
+        for entry, entry_runs in zip(leaderboard, runs):
+            ids = [
+                _insert_rag_run(conn, created_at, generation, scenario_id=scenario_id, search_id=search_id, **run)
+                for run in entry_runs
+            ]
+            entries.append({**entry, "runIds": ids})
+        if best is not None:
+            best = next((e for e in entries if e["rank"] == best["rank"]), best)
+        conn.execute(
+            """INSERT INTO rag_searches
+               (id, created_at, scenario_id, request_json, leaderboard_json, best_json, stats_json, generation)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                search_id,
+                created_at,
+                scenario_id,
+                json.dumps(request),
+                json.dumps(entries),
+                json.dumps(best),
+                json.dumps(stats),
+                generation,
+            ),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return search_id, created_at
+
+
+def _search_row(row: sqlite3.Row, full: bool) -> Dict[str, Any]:
+    out = {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "scenario_id": row["scenario_id"],
+        "best": json.loads(row["best_json"]),
+        "stats": json.loads(row["stats_json"]),
     }
+    if full:
+        out["request"] = json.loads(row["request_json"])
+        out["leaderboard"] = json.loads(row["leaderboard_json"])
+    return out
+
+
+def get_rag_search(search_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    row = _find("SELECT * FROM rag_searches WHERE id = ? AND generation = ?", (search_id, current_generation()), scenario_id)
+    return _search_row(row, full=True) if row else None
+
+
+def list_rag_searches(limit: int = 20, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    sql = "SELECT id, created_at, scenario_id, best_json, stats_json FROM rag_searches WHERE generation = ?"
+    params: List[Any] = [current_generation()]
+    if scenario_id:
+        sql += " AND scenario_id = ?"
+        params.append(scenario_id)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(int(limit))
+    rows = _fan_out(sql, tuple(params), scenario_id, key="created_at", limit=limit, descending=True)
+    return [_search_row(r, full=False) for r in rows]
+
 
-def insert_eval_run(*, pass_rate: int, failures: List[Dict[str, Any]], rag_run_id: Optional[str], rag_score: int, rag_passed: bool) -> str:
+def insert_eval_run(
+    *,
+    pass_rate: int,
+    failures: Union[List[Dict[str, Any]], bytes],
+    rag_run_id: Optional[str],
+    rag_score: int,
+    rag_passed: bool,
+    scenario_id: str = DEFAULT_SCENARIO_ID,
+) -> str:
     run_id = uuid.uuid4().hex[:12]
-    conn = connect()
-    conn.execute(
-        """INSERT INTO eval_runs (id, created_at, pass_rate, failures_json, rag_run_id, rag_score, rag_passed)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (
-            run_id,
-            _utcnow_iso(),
-            int(pass_rate),
-            json.dumps(failures),
-            rag_run_id,
-            int(rag_score),
-            1 if rag_passed else 0,
-        ),
-    )
-    conn.commit()
-    conn.close()
+    created_at = _utcnow_iso()
+    generation = current_generation()
+    conn = _conn(shard_path(scenario_id))
+    try:
+        conn.execute(
+            """INSERT INTO eval_runs
+               (id, created_at, pass_rate, failures_json, rag_run_id, rag_score, rag_passed, scenario_id, generation)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                run_id,
+                created_at,
+                int(pass_rate),
+                _json_text(failures),
+                rag_run_id,
+                int(rag_score),
+                1 if rag_passed else 0,
+                scenario_id,
+                generation,
+            ),
+        )
+        # An eval is attributed to the config of the RAG run it evaluated (when that run is in this file).
+        linked = None
+        if rag_run_id:
+            linked = conn.execute(
+                "SELECT config_key FROM run_summaries WHERE id = ? AND kind = 'rag'", (rag_run_id,)
+            ).fetchone()
+        _record_summary(conn, (
+            run_id, "eval", created_at, scenario_id, 1 if pass_rate >= EVAL_PASS_RATE else 0, int(pass_rate),
+            linked[0] if linked else "", rag_run_id, int(rag_score), 1 if rag_passed else 0, generation,
+        ))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
     return run_id
 
-def list_eval_runs(limit: int = 50) -> List[Dict[str, Any]]:
-    conn = connect()
-    rows = conn.execute(
-        """SELECT id, created_at, pass_rate, rag_run_id, rag_score, rag_passed
-           FROM eval_runs
-           ORDER BY datetime(created_at) DESC
-           LIMIT ?""",
-        (int(limit),),
-    ).fetchall()
-    conn.close()
+def list_eval_runs(limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    rows = _list_summaries("eval", limit, scenario_id)
     out: List[Dict[str, Any]] = []
     for r in rows:
         out.append({
             "id": r["id"],
             "created_at": r["created_at"],
-            "passRate": int(r["pass_rate"]),
+            "passRate": int(r["score"]),
             "ragRunId": r["rag_run_id"],
             "ragScore": int(r["rag_score"]),
             "ragPassed": bool(r["rag_passed"]),
+            "scenario_id": r["scenario_id"],
         })
     return out
 
-def get_eval_run(run_id: str) -> Optional[Dict[str, Any]]:
-    conn = connect()
-    row = conn.execute(
-        """SELECT * FROM eval_runs WHERE id = ?""",
-        (run_id,),
-    ).fetchone()
-    conn.close()
+def get_eval_run(run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    row = _find("SELECT * FROM eval_runs WHERE id = ? AND generation = ?", (run_id, current_generation()), scenario_id)
     if not row:
         return None
     return {
         "id": row["id"],
         "created_at": row["created_at"],
+        "scenario_id": row["scenario_id"] or DEFAULT_SCENARIO_ID,
         "passRate": int(row["pass_rate"]),
         "failures": json.loads(row["failures_json"]),
         "ragRunId": row["rag_run_id"],
@@ -289,7 +1160,10 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
           config_json TEXT NOT NULL,
           answer TEXT NOT NULL,
           citations_json TEXT NOT NULL,
-          retrieved_json TEXT NOT NULL
+          retrieved_json TEXT NOT NULL,
+          scenario_id TEXT,
+          generation INTEGER NOT NULL DEFAULT 0,
+          search_id TEXT
         );
 
         CREATE TABLE IF NOT EXISTS eval_runs (
@@ -299,7 +1173,9 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
           failures_json TEXT NOT NULL,
           rag_run_id TEXT,
           rag_score INTEGER NOT NULL,
-          rag_passed INTEGER NOT NULL
+          rag_passed INTEGER NOT NULL,
+          scenario_id TEXT,
+          generation INTEGER NOT NULL DEFAULT 0
         );
 
         CREATE TABLE IF NOT EXISTS telemetry_events (
@@ -311,9 +1187,130 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
           event_type TEXT NOT NULL,
           latency_ms INTEGER,
           success INTEGER NOT NULL,
-          metadata_json TEXT NOT NULL
+          metadata_json TEXT NOT NULL,
+          client_event_id TEXT,
+          weight REAL NOT NULL DEFAULT 1.0,
+          generation INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS lab_meta (
+          key TEXT PRIMARY KEY,
+          value TEXT NOT NULL
         );
+
+        CREATE TABLE IF NOT EXISTS run_summaries (
+          id TEXT PRIMARY KEY,
+          kind TEXT NOT NULL,
+          created_at TEXT NOT NULL,
+          scenario_id TEXT NOT NULL,
+          passed INTEGER NOT NULL,
+          score INTEGER NOT NULL,
+          config_key TEXT NOT NULL,
+          rag_run_id TEXT,
+          rag_score INTEGER,
+          rag_passed INTEGER,
+          generation INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS run_config_stats (
+          generation INTEGER NOT NULL,
+          kind TEXT NOT NULL,
+          scenario_id TEXT NOT NULL,
+          config_key TEXT NOT NULL,
+          runs INTEGER NOT NULL,
+          passed INTEGER NOT NULL,
+          score_sum INTEGER NOT NULL,
+          last_run_at TEXT NOT NULL,
+          PRIMARY KEY (generation, kind, scenario_id, config_key)
+        );
+
+        CREATE TABLE IF NOT EXISTS rag_searches (
+          id TEXT PRIMARY KEY,
+          created_at TEXT NOT NULL,
+          scenario_id TEXT NOT NULL,
+          request_json TEXT NOT NULL,
+          leaderboard_json TEXT NOT NULL,
+          best_json TEXT NOT NULL,
+          stats_json TEXT NOT NULL,
+          generation INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_run_summaries_recent
+          ON run_summaries(kind, generation, created_at);
+        CREATE INDEX IF NOT EXISTS idx_run_summaries_scenario_recent
+          ON run_summaries(kind, generation, scenario_id, created_at);
         """
     )
+    _migrate(conn)
     conn.commit()
 
+
+_ADDED_COLUMNS = {
+    "telemetry_events": {
+        "client_event_id": "TEXT",  # idempotent ingestion
+        "weight": "REAL NOT NULL DEFAULT 1.0",  # 1 / sample rate
+        "generation": "INTEGER NOT NULL DEFAULT 0",
+    },
+    # NULL = written before runs were scoped (the default scenario).
+    "rag_runs": {
+        "scenario_id": "TEXT",
+        "generation": "INTEGER NOT NULL DEFAULT 0",
+        "search_id": "TEXT",  # set on runs a config search (optimizer.py) graded
+    },
+    "eval_runs": {"scenario_id": "TEXT", "generation": "INTEGER NOT NULL DEFAULT 0"},
+}
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    # Databases created by older versions lack the columns added since.
+    for table, added in _ADDED_COLUMNS.items():
+        cols = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, ddl in added.items():
+            if name not in cols:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+    # NULLs never collide, so events sent without an id are never deduplicated.
+    # Ids are unique per generation: after a reset a replayed event counts again.
+    conn.execute("DROP INDEX IF EXISTS idx_telemetry_client_event_id")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_telemetry_client_event_gen "
+        "ON telemetry_events(client_event_id, generation)"
+    )
+    for table in _GENERATION_TABLES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_generation ON {table}(generation)")
+    row = conn.execute("SELECT value FROM lab_meta WHERE key = 'run_summaries'").fetchone()
+    if row is None or row[0] != _SUMMARIES_VERSION:
+        _backfill_summaries(conn)
+
+
+def _backfill_summaries(conn: sqlite3.Connection) -> None:
+    """Build run_summaries/run_config_stats from the runs already in this file (idempotent)."""
+    rag = [
+        (r[0], "rag", r[1], r[2] or DEFAULT_SCENARIO_ID, r[3], r[4], config_key(json.loads(r[5])), None, None, None, r[6])
+        for r in conn.execute(
+            "SELECT id, created_at, scenario_id, passed, score, config_json, generation FROM rag_runs "
+            "WHERE search_id IS NULL"
+        )
+    ]
+    conn.execute(
+        "DELETE FROM run_summaries WHERE kind = 'rag' AND id IN (SELECT id FROM rag_runs WHERE search_id IS NOT NULL)"
+    )
+    conn.executemany(
+        f"INSERT OR IGNORE INTO run_summaries ({_SUMMARY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rag
+    )
+    conn.execute(
+        f"""INSERT OR IGNORE INTO run_summaries ({_SUMMARY_COLUMNS})
+            SELECT e.id, 'eval', e.created_at, COALESCE(e.scenario_id, ?), e.pass_rate >= ?, e.pass_rate,
+                   COALESCE((SELECT r.config_key FROM run_summaries r WHERE r.id = e.rag_run_id AND r.kind = 'rag'), ''),
+                   e.rag_run_id, e.rag_score, e.rag_passed, e.generation
+            FROM eval_runs e""",
+        (DEFAULT_SCENARIO_ID, EVAL_PASS_RATE),
+    )
+    conn.execute("DELETE FROM run_config_stats")
+    conn.execute(
+        """INSERT INTO run_config_stats
+             (generation, kind, scenario_id, config_key, runs, passed, score_sum, last_run_at)
+           SELECT generation, kind, scenario_id, config_key, COUNT(*), SUM(passed), SUM(score), MAX(created_at)
+           FROM run_summaries GROUP BY generation, kind, scenario_id, config_key"""
+    )
+    conn.execute("INSERT OR REPLACE INTO lab_meta (key, value) VALUES ('run_summaries', ?)", (_SUMMARIES_VERSION,))
+
@@ -0,0 +1,230 @@
+"""
+Offline dense retrieval: hashed n-gram embeddings + an IVF index, in NumPy.
+
+No model and no external service. A chunk's vector is a signed feature hash of
+its tokens and their character trigrams ("restarting" and "restart" share most
+of theirs), weighted by the token's IDF in that chunk size and L2-normalized,
+so a dot product is a cosine similarity.
+
+Per chunk size the bundle (see index.py) stores:
+
+    chunks.<size>.dense.idf        IDF of every vocabulary token                   (f)
+    chunks.<size>.dense.centroids  IVF centroids, nlist x dim                      (f)
+    chunks.<size>.dense.list_ptr   start of each IVF list in `vec`                 (Q)
+    chunks.<size>.dense.rows       chunk row of each vector in `vec`               (I)
+    chunks.<size>.dense.vec        chunk vectors grouped by IVF list, n x dim      (f)
+
+Small tables get a single list (exact search). Larger ones are clustered with
+spherical k-means into ~sqrt(n) lists; a query scores the centroids and then
+only the vectors of its AI_LAB_DENSE_NPROBE best lists, so search cost grows
+with sqrt(n) instead of n. Vectors of one list are contiguous, so each probe is
+a single matrix-vector product over mapped memory.
+
+Configure via env (build time, recorded in the bundle header):
+  AI_LAB_DENSE_DIM       embedding width (default 256)
+  AI_LAB_DENSE_IVF_MIN   tables smaller than this are searched exactly (default 4096)
+and at query time:
+  AI_LAB_DENSE_NPROBE    IVF lists scanned per query (default 16)
+"""
+from __future__ import annotations
+
+import math
+import os
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+DENSE_DIM = int(os.getenv("AI_LAB_DENSE_DIM", "256"))
+IVF_MIN = int(os.getenv("AI_LAB_DENSE_IVF_MIN", "4096"))
+NPROBE = int(os.getenv("AI_LAB_DENSE_NPROBE", "16"))
+
+_KMEANS_ITERS = 10
+_KMEANS_SAMPLE_PER_LIST = 64
+_BLOCK = 1024  # chunks embedded / assigned per numpy batch
+
+
+# ---------------- Features ----------------
+
+def token_features(token: str, dim: int) -> Tuple[List[int], List[float]]:
+    """Hash buckets and signed weights of one token: the word itself + its char trigrams."""
+    padded = f"#{token}#"
+    grams = [padded[i : i + 3] for i in range(len(padded) - 2)]
+    gram_w = 1.0 / math.sqrt(len(grams))
+    buckets, weights = [], []
+    for feat, w in [(token, 1.0), *((g, gram_w) for g in grams)]:
+        h = zlib.crc32(feat.encode("utf-8"))
+        buckets.append(h % dim)
+        weights.append(w if h & 0x80000000 else -w)
+    return buckets, weights
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def embed_query(tokens: Iterable[str], weight: Dict[str, float], default_weight: float, dim: int) -> np.ndarray:
+    buckets: List[int] = []
+    weights: List[float] = []
+    for t in tokens:
+        b, w = token_features(t, dim)
+        idf = weight.get(t, default_weight)
+        buckets += b
+        weights += [x * idf for x in w]
+    v = np.bincount(np.asarray(buckets, dtype=np.int64), weights=weights, minlength=dim).astype(np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+# ---------------- Build side ----------------
+
+def _embed_chunks(
+    vocab_tokens: Sequence[str],
+    idf: np.ndarray,
+    tok_ptr: np.ndarray,
+    tok_ids: np.ndarray,
+    dim: int,
+) -> np.ndarray:
+    # Token features as CSR so every block of chunks is expanded with pure numpy.
+    feat_ptr = np.zeros(len(vocab_tokens) + 1, dtype=np.int64)
+    feat_bucket: List[int] = []
+    feat_w: List[float] = []
+    for i, tok in enumerate(vocab_tokens):
+        b, w = token_features(tok, dim)
+        feat_bucket += b
+        feat_w += w
+        feat_ptr[i + 1] = len(feat_bucket)
+    feat_bucket_a = np.asarray(feat_bucket, dtype=np.int64)
+    feat_w_a = np.asarray(feat_w, dtype=np.float64)
+
+    n = len(tok_ptr) - 1
+    out = np.zeros((n, dim), dtype=np.float32)
+    for a in range(0, n, _BLOCK):
+        b = min(a + _BLOCK, n)
+        toks = tok_ids[tok_ptr[a] : tok_ptr[b]].astype(np.int64)
+        if not len(toks):
+            continue
+        tok_row = np.repeat(np.arange(b - a), np.diff(tok_ptr[a : b + 1]))
+        flen = feat_ptr[toks + 1] - feat_ptr[toks]
+        # Index of every feature of every token: starts repeated, plus 0..len-1.
+        first = np.repeat(feat_ptr[toks], flen)
+        within = np.arange(int(flen.sum())) - np.repeat(np.cumsum(flen) - flen, flen)
+        feat = first + within
+        rows = np.repeat(tok_row, flen)
+        w = feat_w_a[feat] * np.repeat(idf[toks], flen)
+        block = np.bincount(rows * dim + feat_bucket_a[feat], weights=w, minlength=(b - a) * dim)
+        out[a:b] = block.reshape(b - a, dim)
+    return _normalize_rows(out).astype(np.float32, copy=False)
+
+
+def _kmeans(vecs: np.ndarray, nlist: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means on a sample; returns unit-norm centroids."""
+    n = len(vecs)
+    sample = vecs[rng.choice(n, size=min(n, nlist * _KMEANS_SAMPLE_PER_LIST), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(_KMEANS_ITERS):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        sums[empty] = centroids[empty]  # keep the old centroid for an empty cluster
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32, copy=False)
+
+
+def _assign(vecs: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vecs), dtype=np.int64)
+    for a in range(0, len(vecs), _BLOCK * 8):
+        out[a : a + _BLOCK * 8] = np.argmax(vecs[a : a + _BLOCK * 8] @ centroids.T, axis=1)
+    return out
+
+
+def dense_sections(
+    size: str,
+    vocab_tokens: Sequence[str],
+    tok_ptr: bytes,
+    tok_ids: bytes,
+    post_ptr: bytes,
+    *,
+    dim: int = DENSE_DIM,
+    ivf_min: int = IVF_MIN,
+) -> List[Tuple[str, str, bytes]]:
+    """Dense vectors and IVF lists for one chunk size, from its token CSR columns."""
+    tok_ptr_a = np.frombuffer(tok_ptr, dtype=np.uint64).astype(np.int64)
+    tok_ids_a = np.frombuffer(tok_ids, dtype=np.uint32)
+    df = np.diff(np.frombuffer(post_ptr, dtype=np.uint64).astype(np.int64))
+    n = len(tok_ptr_a) - 1
+    idf = np.log((1 + n) / (1 + df)) + 1.0
+
+    vecs = _embed_chunks(vocab_tokens, idf, tok_ptr_a, tok_ids_a, dim)
+
+    if n < max(ivf_min, 1):
+        nlist = 1
+        centroids = np.zeros((1, dim), dtype=np.float32)
+        order = np.arange(n, dtype=np.int64)
+        counts = np.array([n], dtype=np.int64)
+    else:
+        nlist = max(1, int(math.sqrt(n)))
+        centroids = _kmeans(vecs, nlist, np.random.default_rng(0))
+        assign = _assign(vecs, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+
+    list_ptr = np.zeros(nlist + 1, dtype=np.uint64)
+    list_ptr[1:] = np.cumsum(counts)
+    return [
+        (f"chunks.{size}.dense.idf", "f", idf.astype(np.float32).tobytes()),
+        (f"chunks.{size}.dense.centroids", "f", centroids.tobytes()),
+        (f"chunks.{size}.dense.list_ptr", "Q", list_ptr.tobytes()),
+        (f"chunks.{size}.dense.rows", "I", order.astype(np.uint32).tobytes()),
+        (f"chunks.{size}.dense.vec", "f", np.ascontiguousarray(vecs[order]).tobytes()),
+    ]
+
+
+# ---------------- Read side ----------------
+
+class DenseIndex:
+    """IVF search over one chunk size's mapped vectors (zero-copy numpy views)."""
+
+    __slots__ = ("dim", "idf", "centroids", "list_ptr", "rows", "vec", "_default_idf")
+
+    def __init__(self, section, size: str, dim: int) -> None:
+        arr = lambda name, dtype: np.frombuffer(section(f"chunks.{size}.dense.{name}"), dtype=dtype)  # noqa: E731
+        self.dim = dim
+        self.idf = arr("idf", np.float32)
+        self.centroids = arr("centroids", np.float32).reshape(-1, dim)
+        self.list_ptr = arr("list_ptr", np.uint64).astype(np.int64)
+        self.rows = arr("rows", np.uint32)
+        self.vec = arr("vec", np.float32).reshape(-1, dim)
+        # Tokens the corpus has never seen are as rare as it gets.
+        self._default_idf = float(self.idf.max()) if len(self.idf) else 1.0
+
+    def query_vector(self, tokens: Iterable[str], token_id) -> np.ndarray:
+        weight = {}
+        for t in tokens:
+            i = token_id(t)
+            weight[t] = float(self.idf[i]) if i is not None else self._default_idf
+        return embed_query(list(weight), weight, self._default_idf, self.dim)
+
+    def search(self, q: np.ndarray, k: int, nprobe: int = NPROBE) -> List[Tuple[float, int]]:
+        """(cosine, chunk row) of the k nearest chunks, best first."""
+        if k <= 0 or not len(self.vec):
+            return []
+        nlist = len(self.centroids)
+        if nlist == 1:
+            positions = np.arange(len(self.vec))
+            scores = self.vec @ q
+        else:
+            probe = np.argsort(-(self.centroids @ q))[:nprobe]
+            parts = [(int(self.list_ptr[l]), int(self.list_ptr[l + 1])) for l in probe]
+            parts = [(a, b) for a, b in parts if b > a]
+            if not parts:
+                return []
+            positions = np.concatenate([np.arange(a, b) for a, b in parts])
+            scores = np.concatenate([self.vec[a:b] @ q for a, b in parts])
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(float(scores[i]), int(self.rows[positions[i]])) for i in best]
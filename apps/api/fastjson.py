@@ -0,0 +1,123 @@
+"""
+JSON encoding for hot responses and for payloads persisted as JSON text.
+
+`dumps(obj)` returns compact UTF-8 bytes, using orjson when it is installed
+(optional: `pip install orjson`) and otherwise the stdlib encoder with the
+settings Starlette's JSONResponse uses. NumPy arrays and scalars and datetimes
+are encoded either way.
+
+`Raw` marks bytes that already are encoded JSON. `obj()` assembles a JSON
+object from (key, value) pairs and splices Raw values in verbatim, so a
+payload serialized once (say, the retrieved chunks a RAG run persists) goes
+into the response byte for byte without being encoded again. `dumps()` does
+the same for Raw values nested anywhere in what it encodes: orjson >= 3.9
+embeds them as `orjson.Fragment`s, other encoders emit an unguessable
+placeholder string that is replaced by the bytes afterwards.
+
+Routes return `response(...)`: when a route returns a Response, FastAPI skips
+the response_model validation and the jsonable_encoder pass. The
+response_model is still declared for the OpenAPI schema, so the handler is
+responsible for producing exactly that shape.
+
+Configure via env:
+  AI_LAB_FAST_JSON   0 to use the stdlib encoder even when orjson is installed (default 1)
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import secrets
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from starlette.responses import Response
+
+FAST_JSON = os.getenv("AI_LAB_FAST_JSON", "1").strip().lower() not in ("0", "false", "no", "off")
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore[assignment]
+
+
+class Raw(bytes):
+    """Bytes that already are one encoded JSON value."""
+
+
+def _default(o: Any) -> Any:
+    if hasattr(o, "tolist"):  # numpy arrays and scalars
+        return o.tolist()
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class _Splicer:
+    """
+    `default` hook for one dumps() call: each Raw becomes a placeholder string
+    carrying a per-call random token (NUL-delimited, so it is always escaped the
+    same way), and splice() swaps the encoded placeholders for the raw bytes.
+    """
+
+    __slots__ = ("raws", "token")
+
+    def __init__(self) -> None:
+        self.raws: list = []
+        self.token: Optional[str] = None
+
+    def __call__(self, o: Any) -> Any:
+        if not isinstance(o, Raw):
+            return _default(o)
+        if self.token is None:
+            self.token = secrets.token_hex(8)
+        self.raws.append(o)
+        return f"\0{self.token}:{len(self.raws) - 1}\0"
+
+    def splice(self, body: bytes) -> bytes:
+        if not self.raws:
+            return body
+        pattern = re.compile(rb'"\\u0000' + self.token.encode() + rb":(\d+)\\u0000\"")
+        return pattern.sub(lambda m: self.raws[int(m.group(1))], body)
+
+
+def _stdlib(default: Callable[[Any], Any]) -> json.JSONEncoder:
+    return json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=default)
+
+
+if orjson is not None and FAST_JSON:
+    _OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    if hasattr(orjson, "Fragment"):  # orjson >= 3.9
+        def _fragment_default(o: Any) -> Any:
+            return orjson.Fragment(bytes(o)) if isinstance(o, Raw) else _default(o)
+
+        def dumps(obj: Any) -> bytes:
+            return orjson.dumps(obj, default=_fragment_default, option=_OPTS)
+    else:
+        def dumps(obj: Any) -> bytes:
+            splicer = _Splicer()
+            return splicer.splice(orjson.dumps(obj, default=splicer, option=_OPTS))
+
+    ENGINE = "orjson"
+else:
+    def dumps(obj: Any) -> bytes:
+        splicer = _Splicer()
+        return splicer.splice(_stdlib(splicer).encode(obj).encode("utf-8"))
+
+    ENGINE = "json"
+
+
+def raw(obj: Any) -> Raw:
+    return Raw(dumps(obj))
+
+
+def obj(pairs: Iterable[Tuple[str, Any]]) -> Raw:
+    """Encode a JSON object; Raw values are embedded as is."""
+    parts = [dumps(k) + b":" + (v if isinstance(v, Raw) else dumps(v)) for k, v in pairs]
+    return Raw(b"{" + b",".join(parts) + b"}")
+
+
+def response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    body = content if isinstance(content, Raw) else dumps(content)
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
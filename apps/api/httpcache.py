@@ -0,0 +1,144 @@
+"""
+HTTP caching for responses that never change: finished run artifacts and the
+static NPC scripts.
+
+Each cacheable response is serialized once into a `CachedResponse`: the JSON
+body bytes, a strong ETag (hash of those bytes) and its Cache-Control. Entries
+live in an in-process LRU capped by total body bytes, so repeat requests skip
+SQLite, Pydantic and JSON encoding entirely, and a client that already holds
+the entity (`If-None-Match`) gets a bodiless 304.
+
+Run artifacts are immutable once written, so they are sent with
+`Cache-Control: ..., immutable` and browsers do not even revalidate them. A
+reset (db.py "Generations") retires artifacts logically, possibly in another
+worker, so artifact entries are keyed by the current generation and their
+ETag covers it: after a reset every worker misses (and re-reads, finding
+nothing) and an old ETag no longer matches. The resetting worker also clears
+its cache to free the memory at once.
+
+Configure via env:
+  AI_LAB_RESPONSE_CACHE_MB   memory cap of the response cache (default 32)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import fastjson, metrics
+
+RESPONSE_CACHE_MB = float(os.getenv("AI_LAB_RESPONSE_CACHE_MB", "32"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# NPC scripts only change with a deploy: reuse briefly, then revalidate (cheap 304).
+STATIC = "public, max-age=300"
+
+_ENTRY_OVERHEAD = 256  # rough per-entry bookkeeping bytes, so tiny bodies still count
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    cache_control: str
+    tag: Optional[str] = None  # caller data checked on hit (e.g. the artifact's scenario)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + _ENTRY_OVERHEAD
+
+
+def json_body(content: Any) -> bytes:
+    return fastjson.dumps(content)
+
+
+def etag_for(body: bytes, generation: Optional[int] = None) -> str:
+    h = hashlib.blake2b(body, digest_size=16)
+    if generation is not None:
+        h.update(b"\0generation=%d" % generation)
+    return '"' + h.hexdigest() + '"'
+
+
+def make_entry(
+    content: Any, cache_control: str, tag: Optional[str] = None, generation: Optional[int] = None
+) -> CachedResponse:
+    """`generation`: the DB generation the content belongs to, folded into the ETag."""
+    body = json_body(content)
+    return CachedResponse(body=body, etag=etag_for(body, generation), cache_control=cache_control, tag=tag)
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 prescribes for it)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags
+
+
+def respond(request: Request, entry: CachedResponse) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": entry.cache_control}
+    if not_modified(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """LRU of CachedResponse by key, bounded by total body bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.CACHE_REQUESTS.inc("miss" if entry is None else "hit")
+        return entry
+
+    def put(self, key: str, entry: CachedResponse) -> CachedResponse:
+        if entry.size > self.max_bytes:
+            return entry  # would evict everything else; serve it uncached
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+    def stats(self) -> Tuple[int, int]:
+        """(entries, bytes)"""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+
+
+@metrics.registry.collector
+def _export_cache_stats() -> None:
+    entries, size = cache.stats()
+    metrics.CACHE_ENTRIES.set(entries)
+    metrics.CACHE_BYTES.set(size)
@@ -0,0 +1,509 @@
+"""
+Shared retrieval index.
+
+The corpus and its per-size chunk tables are built once into a flat binary
+bundle and memory-mapped read-only by every worker, so `uvicorn --workers N`
+shares one copy through the page cache instead of holding N copies on the heap.
+
+Layout of a bundle file (all integers little-endian, sections 8-byte aligned):
+
+    b"AILABIX1" | u32 header length | header JSON | sections...
+
+The header names each section with its offset (relative to the aligned end of
+the header), byte length and `array` typecode, and records the tokenizer and
+chunking configs the bundle was built with. There is one chunk table per
+configured chunk size (built-ins + data/lab_docs/chunking.json, see
+chunking.py). Sections:
+
+    corpus                    UTF-8 text of every doc (paragraphs re-joined by "\\n\\n")
+    doc.start / doc.end       byte span of each doc in `corpus`              (Q)
+    doc.meta / doc.meta_off   "id" + "title" strings and their offsets       (B / Q)
+    chunks.<size>.doc         doc index of each chunk                        (I)
+    chunks.<size>.ord         ordinal of the chunk within its doc            (I)
+    chunks.<size>.start/.end  byte span of each chunk in `corpus`            (Q)
+    chunks.<size>.hash        64-bit hash of the chunk text                  (Q)
+    chunks.<size>.*, vocab*   token ids, postings and tie ranks (chunkstore.py)
+    chunks.<size>.dense.*     hashed embeddings + IVF lists (dense.py)
+
+Generations: each build writes `index-<generation>.bin` and then atomically
+replaces the `CURRENT` pointer file. Workers stat `CURRENT` at most every
+AI_LAB_INDEX_POLL_S seconds and attach the new generation when it changes;
+in-flight requests keep using the mapping they started with.
+
+Snapshots: a bundle can be prebuilt at deploy time into a read-only directory
+shipped with the code. While the index dir has no generation yet, a worker
+maps the snapshot directly (no build, no copy) if its recorded digest of the
+corpus files still matches, so serverless cold starts never build the index.
+
+    python -m apps.api.index build [--force]   # publish a new generation
+    python -m apps.api.index watch             # rebuild whenever data/lab_docs changes
+    python -m apps.api.index snapshot [--out]  # prebuild the deploy-time snapshot
+    python -m apps.api.index info
+
+Configure via env:
+  AI_LAB_INDEX_DIR       where bundles live (default: <db dir>/.index)
+  AI_LAB_INDEX_POLL_S    how often workers check for a new generation (default 2)
+  AI_LAB_INDEX_SNAPSHOT  prebuilt snapshot dir (default: apps/api/.index-snapshot)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: builds are not cross-process locked
+    fcntl = None  # type: ignore[assignment]
+
+from . import db
+from .chunking import BUILTIN_SPECS, ChunkSpec, chunk_doc, load_specs as load_chunk_specs, normalize_doc
+from .chunkstore import ChunkStore, Vocabulary, VocabularyBuilder, chunk_sections, content_hash
+from .tokenizer import Tokenizer, TokenizerConfig, load_config as load_tokenizer_config
+
+MAGIC = b"AILABIX1"
+
+DOCS_DIR = Path(__file__).resolve().parents[2] / "data" / "lab_docs"
+INDEX_DIR = os.getenv("AI_LAB_INDEX_DIR", os.path.join(os.path.dirname(db.DB_PATH), ".index"))
+POLL_S = float(os.getenv("AI_LAB_INDEX_POLL_S", "2"))
+SNAPSHOT_DIR = os.getenv("AI_LAB_INDEX_SNAPSHOT", str(Path(__file__).resolve().parent / ".index-snapshot"))
+
+
+# ---------------- Corpus ----------------
+
+def load_docs(docs_dir: Path = DOCS_DIR) -> list[dict]:
+    docs = []
+    for p in sorted(docs_dir.glob("*.md")):
+        text = p.read_text()
+        docs.append({
+            "id": p.stem,
+            "title": text.splitlines()[0].lstrip("# "),
+            "text": text
+        })
+    return docs
+
+
+def _corpus_files(docs_dir: Path) -> List[Path]:
+    return sorted([*docs_dir.glob("*.md"), *docs_dir.glob("tokenizer.json"), *docs_dir.glob("chunking.json")])
+
+
+def docs_fingerprint(docs_dir: Path = DOCS_DIR) -> str:
+    """Cheap change detector: names, sizes and mtimes of the corpus files (+ tokenizer/chunking config)."""
+    h = hashlib.sha1()
+    for p in _corpus_files(docs_dir):
+        st = p.stat()
+        h.update(f"{p.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def docs_digest(docs_dir: Path = DOCS_DIR) -> str:
+    """Content hash of the same files: survives the copy into a deployment (mtimes do not)."""
+    h = hashlib.sha1()
+    for p in _corpus_files(docs_dir):
+        h.update(f"{p.name}\0".encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+# ---------------- Bundle writer ----------------
+
+def _char_to_byte_offsets(text: str, base: int) -> Callable[[int], int]:
+    """Map character offsets in `text` to byte offsets in the UTF-8 corpus buffer."""
+    if text.isascii():
+        return lambda i: base + i
+    prefix = array("Q", [0])
+    total = 0
+    for ch in text:
+        total += len(ch.encode("utf-8"))
+        prefix.append(total)
+    return lambda i: base + prefix[i]
+
+
+def write_bundle(
+    docs: List[Dict[str, str]],
+    path: str,
+    *,
+    generation: str,
+    fingerprint: str,
+    digest: Optional[str] = None,
+    tokenizer_config: TokenizerConfig = TokenizerConfig(),
+    chunk_specs: Sequence[ChunkSpec] = BUILTIN_SPECS,
+) -> None:
+    from .dense import DENSE_DIM, dense_sections  # numpy: only builds and dense queries pay for it
+
+    tokenizer = Tokenizer(tokenizer_config)
+    sizes = [spec.name for spec in chunk_specs]
+    corpus = bytearray()
+    doc_start = array("Q")
+    doc_end = array("Q")
+    meta = bytearray()
+    meta_off = array("Q", [0])
+    # doc index, ordinal within the doc, byte start/end, content hash
+    chunks = {size: (array("I"), array("I"), array("Q"), array("Q"), array("Q")) for size in sizes}
+    vocab = VocabularyBuilder()
+    chunk_tokens: Dict[str, List[List[int]]] = {size: [] for size in sizes}
+    tie_keys: Dict[str, List[tuple]] = {size: [] for size in sizes}
+
+    for di, d in enumerate(docs):
+        text, paras = normalize_doc(d["text"])
+        base = len(corpus)
+        encoded = text.encode("utf-8")
+        corpus += encoded
+        doc_start.append(base)
+        doc_end.append(base + len(encoded))
+        for s in (d["id"], d["title"]):
+            meta += s.encode("utf-8")
+            meta_off.append(len(meta))
+
+        to_byte = _char_to_byte_offsets(text, base)
+        for spec in chunk_specs:
+            c_doc, c_ord, c_start, c_end, c_hash = chunks[spec.name]
+            spans = chunk_doc(text, paras, spec)
+            texts = [text[start:end] for start, end in spans]
+            for ordinal, ((start, end), chunk, toks) in enumerate(zip(spans, texts, tokenizer.tokenize_many(texts))):
+                c_doc.append(di)
+                c_ord.append(ordinal)
+                c_hash.append(content_hash(chunk))
+                c_start.append(to_byte(start))
+                c_end.append(to_byte(end))
+                chunk_tokens[spec.name].append(vocab.intern_all(toks))
+                tie_keys[spec.name].append((d["id"], d["title"], chunk))
+
+    vocab_blob, vocab_off, remap = vocab.finalize()
+    vocab_tokens = [vocab_blob[vocab_off[i] : vocab_off[i + 1]].decode("utf-8") for i in range(len(vocab_off) - 1)]
+    sections: List[Tuple[str, str, bytes]] = [
+        ("corpus", "B", bytes(corpus)),
+        ("vocab", "B", vocab_blob),
+        ("vocab.off", "Q", vocab_off.tobytes()),
+        ("doc.start", "Q", doc_start.tobytes()),
+        ("doc.end", "Q", doc_end.tobytes()),
+        ("doc.meta", "B", bytes(meta)),
+        ("doc.meta_off", "Q", meta_off.tobytes()),
+    ]
+    for size, (c_doc, c_ord, c_start, c_end, c_hash) in chunks.items():
+        sections += [
+            (f"chunks.{size}.doc", "I", c_doc.tobytes()),
+            (f"chunks.{size}.ord", "I", c_ord.tobytes()),
+            (f"chunks.{size}.start", "Q", c_start.tobytes()),
+            (f"chunks.{size}.end", "Q", c_end.tobytes()),
+            (f"chunks.{size}.hash", "Q", c_hash.tobytes()),
+        ]
+        lexical = chunk_sections(size, chunk_tokens[size], tie_keys[size], remap, len(vocab_off) - 1)
+        cols = {name: data for name, _, data in lexical}
+        sections += lexical
+        sections += dense_sections(
+            size,
+            vocab_tokens,
+            cols[f"chunks.{size}.tok_ptr"],
+            cols[f"chunks.{size}.tok_ids"],
+            cols[f"chunks.{size}.post_ptr"],
+            dim=DENSE_DIM,
+        )
+    _write_sections(path, sections, {
+        "generation": generation,
+        "fingerprint": fingerprint,
+        "digest": digest,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "docs": len(docs),
+        "sizes": sizes,
+        "chunking": [spec.to_dict() for spec in chunk_specs],
+        "tokenizer": tokenizer_config.to_dict(),
+        "dense": {"dim": DENSE_DIM},
+    })
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _write_sections(path: str, sections: List[Tuple[str, str, bytes]], header: Dict[str, Any]) -> None:
+    # Section offsets are relative to the (aligned) end of the header, so the
+    # header can be serialized in one go.
+    rel = 0
+    table = {}
+    for name, typecode, data in sections:
+        table[name] = {"offset": rel, "length": len(data), "typecode": typecode}
+        rel = _align(rel + len(data))
+    raw = json.dumps({**header, "sections": table}, separators=(",", ":")).encode()
+    data_start = _align(len(MAGIC) + 4 + len(raw))
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(raw)))
+        f.write(raw)
+        for name, _, data in sections:
+            f.write(b"\0" * (data_start + table[name]["offset"] - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ---------------- Bundle reader ----------------
+
+class RetrievalIndex:
+    """Read-only view over one mapped bundle. Cheap to share across threads."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mm)
+        if bytes(buf[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: not a retrieval index bundle")
+        (hlen,) = struct.unpack_from("<I", buf, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header: Dict[str, Any] = json.loads(bytes(buf[start : start + hlen]))
+        data_start = _align(start + hlen)
+        self._sections: Dict[str, memoryview] = {}
+        for name, info in self.header["sections"].items():
+            off = data_start + info["offset"]
+            view = buf[off : off + info["length"]]
+            self._sections[name] = view if info["typecode"] == "B" else view.cast(info["typecode"])
+
+        self.generation: str = self.header["generation"]
+        self.fingerprint: str = self.header["fingerprint"]
+        self.digest: Optional[str] = self.header.get("digest")
+        self.n_docs: int = int(self.header["docs"])
+        self.sizes: Tuple[str, ...] = tuple(self.header["sizes"])
+        self._corpus = self._sections["corpus"]
+        self.vocab = Vocabulary(self._sections["vocab"], self._sections["vocab.off"])
+        self.tokenizer = Tokenizer(TokenizerConfig.from_dict(self.header.get("tokenizer")))
+        self._stores: Dict[str, ChunkStore] = {}
+        self.query_ids = lru_cache(maxsize=4096)(self._query_ids)
+
+    def section(self, name: str) -> memoryview:
+        return self._sections[name]
+
+    def _meta(self, k: int) -> str:
+        off = self._sections["doc.meta_off"]
+        return bytes(self._sections["doc.meta"][off[k] : off[k + 1]]).decode("utf-8")
+
+    def doc_id(self, i: int) -> str:
+        return self._meta(2 * i)
+
+    def doc_title(self, i: int) -> str:
+        return self._meta(2 * i + 1)
+
+    def doc_text(self, i: int) -> str:
+        return self.text(self._sections["doc.start"][i], self._sections["doc.end"][i])
+
+    def text(self, start: int, end: int) -> str:
+        return bytes(self._corpus[start:end]).decode("utf-8")
+
+    def _query_ids(self, question: str) -> Tuple[int, ...]:
+        """Vocabulary ids of a query's tokens under this index's tokenizer (memoized)."""
+        return tuple(self.vocab.ids(self.tokenizer.query(question)))
+
+    def store(self, size: str) -> ChunkStore:
+        st = self._stores.get(size)
+        if st is None:
+            st = self._stores[size] = ChunkStore(self, size)
+        return st
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "fingerprint": self.fingerprint,
+            "createdAt": self.header.get("createdAt"),
+            "docs": self.n_docs,
+            "chunks": {size: len(self._sections[f"chunks.{size}.doc"]) for size in self.sizes},
+            "vocab": self.vocab.size,
+            "bytes": len(self._mm),
+        }
+
+
+# ---------------- Generations ----------------
+
+class IndexStore:
+    """
+    Publishes and attaches bundle generations in `index_dir`.
+
+    `source` yields the docs to index and `fingerprint` identifies that corpus
+    version; a published generation is reused for as long as the fingerprint
+    matches.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = INDEX_DIR,
+        *,
+        source: Callable[[], List[Dict[str, str]]] = load_docs,
+        fingerprint: Callable[[], str] = docs_fingerprint,
+        digest: Callable[[], str] = docs_digest,
+        tokenizer_config: Callable[[], TokenizerConfig] = lambda: load_tokenizer_config(DOCS_DIR),
+        chunk_specs: Callable[[], Sequence[ChunkSpec]] = lambda: load_chunk_specs(DOCS_DIR),
+        poll_s: float = POLL_S,
+        snapshot_dir: Optional[str] = SNAPSHOT_DIR,
+    ) -> None:
+        self.index_dir = index_dir
+        self.source = source
+        self.fingerprint = fingerprint
+        self.digest = digest
+        self.snapshot_dir = snapshot_dir
+        self.tokenizer_config = tokenizer_config
+        self.chunk_specs = chunk_specs
+        self.poll_s = poll_s
+        self._index: Optional[RetrievalIndex] = None
+        self._pointer: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.index_dir, "CURRENT")
+
+    def _read_pointer(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _build_lock(self) -> Iterator[None]:
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, "build.lock"), "a+") as lf:
+            if fcntl is not None:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+    def publish(self, *, force: bool = False) -> str:
+        """
+        Build a new generation unless the published one already matches the
+        corpus. Safe to call from every worker at once: one builds, the rest
+        wait on the lock and then find the fresh generation.
+        """
+        fp = self.fingerprint()
+        with self._build_lock():
+            current = self._read_pointer()
+            if current and not force:
+                try:
+                    if RetrievalIndex(os.path.join(self.index_dir, current)).fingerprint == fp:
+                        return current
+                except (OSError, ValueError):
+                    pass  # missing/corrupt bundle: rebuild
+
+            generation = f"{int(time.time() * 1000):x}-{os.getpid()}"
+            name = f"index-{generation}.bin"
+            write_bundle(
+                self.source(),
+                os.path.join(self.index_dir, name),
+                generation=generation,
+                fingerprint=fp,
+                digest=self.digest(),
+                tokenizer_config=self.tokenizer_config(),
+                chunk_specs=self.chunk_specs(),
+            )
+
+            tmp = self.pointer_path + f".tmp-{os.getpid()}"
+            with open(tmp, "w") as f:
+                f.write(name)
+            os.replace(tmp, self.pointer_path)
+            self._gc(keep={name, current})
+            return name
+
+    def _gc(self, keep: set) -> None:
+        # Unlinking a file another worker still has mapped is safe on POSIX; its
+        # pages stay valid until that worker drops the mapping.
+        for p in Path(self.index_dir).glob("index-*.bin"):
+            if p.name not in keep:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    def _attach_snapshot(self) -> Optional[RetrievalIndex]:
+        """The deploy-time snapshot, if there is one and it was built from this corpus."""
+        if not self.snapshot_dir or os.path.abspath(self.snapshot_dir) == os.path.abspath(self.index_dir):
+            return None
+        try:
+            with open(os.path.join(self.snapshot_dir, "CURRENT")) as f:
+                index = RetrievalIndex(os.path.join(self.snapshot_dir, f.read().strip()))
+        except (OSError, ValueError):
+            return None
+        return index if index.digest and index.digest == self.digest() else None
+
+    def current(self) -> RetrievalIndex:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.poll_s:
+            return self._index
+        with self._lock:
+            self._checked_at = now
+            pointer = self._read_pointer()
+            if pointer is None:
+                if self._pointer == _SNAPSHOT and self._index is not None:
+                    return self._index
+                snapshot = self._attach_snapshot()
+                if snapshot is not None:
+                    self._index, self._pointer = snapshot, _SNAPSHOT
+                    return snapshot
+                pointer = self.publish()
+            if pointer != self._pointer or self._index is None:
+                # The old mapping is released once the last request using it finishes.
+                self._index = RetrievalIndex(os.path.join(self.index_dir, pointer))
+                self._pointer = pointer
+            return self._index
+
+
+_SNAPSHOT = "<snapshot>"
+
+store = IndexStore()
+
+
+# ---------------- CLI ----------------
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m apps.api.index", description="Build/inspect the shared retrieval index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="publish a new generation if the corpus changed")
+    b.add_argument("--force", action="store_true", help="rebuild even if the corpus is unchanged")
+    w = sub.add_parser("watch", help="poll the corpus and publish on change")
+    w.add_argument("--interval", type=float, default=5.0)
+    sn = sub.add_parser("snapshot", help="prebuild a read-only bundle to ship with a deployment")
+    sn.add_argument("--out", default=SNAPSHOT_DIR, help=f"snapshot directory (default {SNAPSHOT_DIR})")
+    sub.add_parser("info", help="describe the current generation")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        print(store.publish(force=args.force))
+    elif args.cmd == "snapshot":
+        from .library import Library  # the Lab Library ships its own bundle next to the docs'
+
+        snap = IndexStore(args.out, snapshot_dir=None)
+        print(os.path.join(args.out, snap.publish(force=True)))
+        books = os.path.join(args.out, "library")
+        print(os.path.join(books, Library(index_dir=books, snapshot_dir=None).store.publish(force=True)))
+    elif args.cmd == "watch":
+        last = None
+        while True:
+            name = store.publish()
+            if name != last:
+                print(f"{datetime.now(timezone.utc).isoformat()} serving {name}", flush=True)
+                last = name
+            time.sleep(args.interval)
+    else:
+        print(json.dumps(store.current().info(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+# ---------------- Telemetry sampling + admission control ----------------
+#
+# Sampling: each (scenario, event type) can be kept with probability `rate`.
+# A kept event is stored with weight 1/rate, and the summary/timeseries
+# aggregates are weighted, so rates and counts stay unbiased estimates of the
+# full stream. Failed and escalated events are always kept (weight 1): they are
+# rare and they are what the dashboards are for.
+#
+# The keep/drop decision for an event with a client `eventId` is a hash of that
+# id, so a retried event gets the same decision as the original.
+#
+# Admission: a token bucket (one token per stored event) bounds the ingest rate
+# of this worker, and the request is refused outright while the DB writer
+# backlog is saturated. Both answer 429 with a Retry-After hint, so gameplay
+# writes that share the writer thread never queue behind a telemetry flood.
+#
+# Configure via env:
+#   AI_LAB_TELEMETRY_SAMPLE_RATES   JSON of rates keyed by "scenario:eventType",
+#                                   "scenario:*", "eventType" or "*" (most
+#                                   specific wins; default 1.0), e.g.
+#                                   {"response": 0.25, "dayzero-utility-outage:rag_run": 0.5}
+#   AI_LAB_INGEST_RATE              sustained events/s admitted (default 2000)
+#   AI_LAB_INGEST_BURST             bucket size in events (default 4000)
+#   AI_LAB_INGEST_MAX_PENDING       max queued DB writes before refusing (default 64)
+# -----------------------------------------------------------------------------
+
+INGEST_RATE = float(os.getenv("AI_LAB_INGEST_RATE", "2000"))
+INGEST_BURST = float(os.getenv("AI_LAB_INGEST_BURST", "4000"))
+INGEST_MAX_PENDING = int(os.getenv("AI_LAB_INGEST_MAX_PENDING", "64"))
+
+
+class Sampler:
+    def __init__(self, rates: Optional[Dict[str, float]] = None) -> None:
+        self.rates: Dict[str, float] = {}
+        for key, rate in (rates or {}).items():
+            rate = float(rate)
+            if not 0.0 < rate <= 1.0:
+                raise ValueError(f"sample rate for {key!r} must be in (0, 1], got {rate}")
+            self.rates[key] = rate
+
+    @classmethod
+    def from_env(cls) -> "Sampler":
+        return cls(json.loads(os.getenv("AI_LAB_TELEMETRY_SAMPLE_RATES", "") or "{}"))
+
+    def rate(self, scenario_id: str, event_type: str) -> float:
+        rates = self.rates
+        for key in (f"{scenario_id}:{event_type}", f"{scenario_id}:*", event_type, "*"):
+            if key in rates:
+                return rates[key]
+        return 1.0
+
+    def weight(
+        self,
+        scenario_id: str,
+        event_type: str,
+        *,
+        success: bool = True,
+        escalated: bool = False,
+        event_id: Optional[str] = None,
+    ) -> Optional[float]:
+        """Storage weight (1/rate) if the event is kept, None if it is sampled out."""
+        if not success or escalated or event_type == "escalation":
+            return 1.0
+        rate = self.rate(scenario_id, event_type)
+        if rate >= 1.0:
+            return 1.0
+        if event_id:
+            digest = hashlib.blake2b(event_id.encode("utf-8"), digest_size=8).digest()
+            u = int.from_bytes(digest, "big") / 2.0**64
+        else:
+            u = random.random()
+        return 1.0 / rate if u < rate else None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n: float) -> float:
+        """Take n tokens. Returns 0 if admitted, else seconds until n tokens are available."""
+        n = min(n, self.burst)  # an oversized batch waits for a full bucket, not forever
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            return (n - self._tokens) / self.rate if self.rate > 0 else 60.0
+
+
+sampler = Sampler.from_env()
+bucket = TokenBucket(INGEST_RATE, INGEST_BURST)
+
+
+def admit(n_events: int, pending_writes: int) -> Optional[int]:
+    """None if a batch of n_events may be written now, else a Retry-After in whole seconds."""
+    if pending_writes >= INGEST_MAX_PENDING:
+        return 1
+    if n_events <= 0:
+        return None
+    wait = bucket.take(n_events)
+    return None if wait <= 0 else max(1, math.ceil(wait))
@@ -0,0 +1,258 @@
+"""
+Lab Library: the field manuals in data/books/books.json, served page by page.
+
+The books are parsed once into a catalog (table of contents, pages, glossary)
+that is reloaded when the file changes, and indexed with the same machinery as
+the RAG corpus: every page becomes one doc (`<bookId>/p<n>`) of an IndexStore
+bundle built with the lab docs' tokenizer and chunk sizes. So page search is the
+lexical overlap of the whole-page ("large") chunks, snippets come from the best
+matching paragraph ("small" chunk), and `rag_run` can retrieve book chunks with
+any chunk size it accepts for the docs.
+
+The library bundle lives in `<AI_LAB_INDEX_DIR>/library` and is built on first
+use; `python -m apps.api.index snapshot` also writes it into the deploy-time
+snapshot (`<snapshot>/library`).
+
+Configure via env:
+  AI_LAB_BOOKS_PATH   the books file (default: data/books/books.json)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chunking import load_specs as load_chunk_specs
+from .chunkstore import SNIPPET_CHARS
+from .index import DOCS_DIR, INDEX_DIR, POLL_S, SNAPSHOT_DIR, IndexStore, RetrievalIndex
+from .tokenizer import load_config as load_tokenizer_config
+
+BOOKS_PATH = Path(os.getenv("AI_LAB_BOOKS_PATH", str(Path(__file__).resolve().parents[2] / "data" / "books" / "books.json")))
+
+PAGE_SIZE = "large"  # one chunk per page
+PARAGRAPH_SIZE = "small"  # one chunk per paragraph; paragraph 0 is the page heading
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def page_doc_id(book_id: str, number: int) -> str:
+    return f"{book_id}/p{number}"
+
+
+# ---------------- Catalog ----------------
+
+@dataclass(frozen=True)
+class Catalog:
+    fingerprint: str
+    books: List[Dict[str, Any]]
+    by_id: Dict[str, Dict[str, Any]]
+    # lowercased term -> [(book id, entry)]
+    glossary: Dict[str, List[Tuple[str, Dict[str, str]]]]
+
+    def toc(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": b["id"],
+                "title": b["title"],
+                "subtitle": b.get("subtitle"),
+                "pages": [p["title"] for p in b["pages"]],
+                "glossaryTerms": len(b.get("glossary") or []),
+            }
+            for b in self.books
+        ]
+
+
+def _config_files() -> List[Path]:
+    # The library is tokenized and chunked like the lab docs, so their config is part of its identity.
+    return sorted([*DOCS_DIR.glob("tokenizer.json"), *DOCS_DIR.glob("chunking.json")])
+
+
+def books_fingerprint(path: Path = BOOKS_PATH) -> str:
+    h = hashlib.sha1()
+    for p in (path, *_config_files()):
+        st = p.stat()
+        h.update(f"{p.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def books_digest(path: Path = BOOKS_PATH) -> str:
+    h = hashlib.sha1()
+    for p in (path, *_config_files()):
+        h.update(f"{p.name}\0".encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def load_catalog(path: Path = BOOKS_PATH) -> Catalog:
+    fingerprint = books_fingerprint(path)
+    books = json.loads(path.read_text()).get("books", [])
+    glossary: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+    for b in books:
+        for entry in b.get("glossary") or []:
+            glossary.setdefault(entry["term"].lower(), []).append((b["id"], entry))
+    return Catalog(fingerprint=fingerprint, books=books, by_id={b["id"]: b for b in books}, glossary=glossary)
+
+
+def book_docs(catalog: Catalog) -> List[Dict[str, str]]:
+    """One indexable doc per page: the heading, then the body's blank-line separated paragraphs."""
+    docs = []
+    for b in catalog.books:
+        for n, page in enumerate(b["pages"], start=1):
+            docs.append({
+                "id": page_doc_id(b["id"], n),
+                "title": f"{b['title']}: {page['title']}",
+                "text": f"# {page['title']}\n\n" + "\n".join(page.get("body") or []),
+            })
+    return docs
+
+
+# ---------------- Library ----------------
+
+class Library:
+    def __init__(
+        self,
+        path: Path = BOOKS_PATH,
+        index_dir: str = os.path.join(INDEX_DIR, "library"),
+        snapshot_dir: Optional[str] = os.path.join(SNAPSHOT_DIR, "library"),
+        poll_s: float = POLL_S,
+    ) -> None:
+        self.path = path
+        self.poll_s = poll_s
+        self._catalog: Optional[Catalog] = None
+        self._checked_at = 0.0
+        self._indexed: Optional[str] = None  # catalog fingerprint the index was last checked against
+        self._lock = threading.Lock()
+        self.store = IndexStore(
+            index_dir,
+            source=lambda: book_docs(self.catalog()),
+            fingerprint=lambda: books_fingerprint(self.path),
+            digest=lambda: books_digest(self.path),
+            tokenizer_config=lambda: load_tokenizer_config(DOCS_DIR),
+            chunk_specs=lambda: load_chunk_specs(DOCS_DIR),
+            poll_s=poll_s,
+            snapshot_dir=snapshot_dir,
+        )
+
+    def catalog(self) -> Catalog:
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked_at < self.poll_s:
+            return self._catalog
+        with self._lock:
+            self._checked_at = now
+            if self._catalog is None or self._catalog.fingerprint != books_fingerprint(self.path):
+                self._catalog = load_catalog(self.path)
+            return self._catalog
+
+    def index(self) -> RetrievalIndex:
+        fingerprint = self.catalog().fingerprint
+        if self._indexed != fingerprint:
+            if self._indexed is not None:
+                # The books changed under a running worker: publish them (a no-op if another worker did).
+                self.store.publish()
+            self._indexed = fingerprint
+        return self.store.current()
+
+    def pages(self, book_id: str, offset: int = 0, limit: int = 1) -> Optional[Dict[str, Any]]:
+        book = self.catalog().by_id.get(book_id)
+        if book is None:
+            return None
+        offset = max(0, offset)
+        pages = book["pages"][offset : offset + max(0, limit)]
+        return {
+            "bookId": book_id,
+            "offset": offset,
+            "total": len(book["pages"]),
+            "pages": [
+                {"number": offset + i + 1, "title": p["title"], "body": p.get("body") or []}
+                for i, p in enumerate(pages)
+            ],
+        }
+
+    def glossary(self, term: Optional[str] = None, book_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Glossary entries: all of them, or those whose term equals `term` (else starts with it), case-insensitively."""
+        catalog = self.catalog()
+        if term is None:
+            books = [catalog.by_id[book_id]] if book_id in catalog.by_id else ([] if book_id else catalog.books)
+            return [{"bookId": b["id"], **e} for b in books for e in b.get("glossary") or []]
+        key = term.strip().lower()
+        hits = catalog.glossary.get(key)
+        if hits is None:
+            hits = [h for k, entries in catalog.glossary.items() if k.startswith(key) for h in entries]
+        return [{"bookId": bid, **e} for bid, e in hits if book_id is None or bid == book_id]
+
+    def search(self, q: str, limit: int = 10, book_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Pages ranked by distinct query-token overlap, each with a highlighted paragraph snippet."""
+        idx = self.index()
+        q_ids = idx.query_ids(q)
+        if not q_ids or limit <= 0:
+            return []
+        prefix = f"{book_id}/p" if book_id else None
+
+        pages = idx.store(PAGE_SIZE)
+        scores = pages.overlap(q_ids)
+        if prefix:
+            scores = {row: s for row, s in scores.items() if idx.doc_id(pages.doc[row]).startswith(prefix)}
+        ranked = pages.top(scores, min(limit, len(scores)))
+
+        # Best body paragraph per hit page: (score, -ordinal, row).
+        paras = idx.store(PARAGRAPH_SIZE)
+        wanted = {pages.doc[row] for _, row in ranked}
+        best: Dict[int, Tuple[int, int, int]] = {}
+        for row, score in paras.overlap(q_ids).items():
+            doc, ordinal = paras.doc[row], paras.ord[row]
+            if doc in wanted and ordinal > 0:
+                cand = (score, -ordinal, row)
+                if cand > best.get(doc, (0, 0, -1)):
+                    best[doc] = cand
+
+        q_tokens = idx.tokenizer.query(q)
+        hits = []
+        for score, row in ranked:
+            ref = pages.ref(row)
+            book, _, number = ref.doc_id.rpartition("/p")
+            if ref.doc_index in best:
+                text = paras.ref(best[ref.doc_index][2]).text()
+            else:
+                text = ref.text().split("\n\n", 1)[-1]
+            snippet, highlights = _highlight(text, q_tokens, idx)
+            hits.append({
+                "bookId": book,
+                "page": int(number),
+                "title": ref.title,
+                "score": score,
+                "snippet": snippet,
+                "highlights": highlights,
+            })
+        return hits
+
+
+def _highlight(text: str, q_tokens: frozenset, idx: RetrievalIndex, limit: int = SNIPPET_CHARS) -> Tuple[str, List[List[int]]]:
+    """
+    Cut `text` to at most `limit` chars around its first query-token match and
+    return it with the [start, end) char spans of the matching words.
+    """
+    spans = [
+        [m.start(), m.end()]
+        for m in _WORD_RE.finditer(text)
+        if idx.tokenizer.query(m.group()) & q_tokens
+    ]
+    if len(text) <= limit:
+        return text, spans
+    start = 0
+    if spans and spans[0][1] > limit:
+        start = max(0, spans[0][0] - limit // 4)
+        start = text.find(" ", start) + 1 or start  # begin on a word
+    end = start + limit
+    snippet = ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+    shift = 1 if start else 0
+    kept = [[s - start + shift, e - start + shift] for s, e in spans if s >= start and e <= end]
+    return snippet, kept
+
+
+library = Library()
@@ -1,33 +1,39 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Literal, List, Any
-from pathlib import Path
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Optional, Dict, Literal, List, Any, Sequence, Set, Tuple
+import asyncio
+import logging
 import re
+import threading
 import time
 from datetime import datetime, timedelta, timezone
 import sqlite3
 import os
 
-from apps.api.db import connect  # or ensure_schema, depending on your structure
-
 from .db import (
+    DEFAULT_SCENARIO_ID,
+    executor as db_executor,
+    bump_generation,
+    current_generation,
+    gc as db_gc,
     init_db,
-    insert_rag_run,
-    list_rag_runs,
-    get_rag_run,
-    insert_eval_run,
-    list_eval_runs,
-    get_eval_run,
-    insert_telemetry_event,
-    list_telemetry_events,
 )
+from .perf import PerfMiddleware, TimedRoute, registry as perf_registry, span
+from . import fastjson, httpcache, ingest, metrics, optimizer, profiler, referee, storage
+from .chunkstore import ChunkRef
+from .index import store as index_store
+from .library import library
 
-DEFAULT_SCENARIO_ID = "dayzero-utility-outage"
+log = logging.getLogger(__name__)
 
 app = FastAPI(title="AI Lab – Day Zero API")
+# Must be set before any route is declared so every endpoint reports stage timings.
+app.router.route_class = TimedRoute
 
 # -----------------------------------------------------------------------------
 # CORS
@@ -48,8 +54,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Added last so it wraps everything (CORS included) and sees the full request time.
+app.add_middleware(PerfMiddleware)
+
+# SQLite write contention surfaces as OperationalError("database is locked").
+# Report it as a retryable 503 instead of an opaque 500 so clients (and
+# bench.loadtest) can tell contention apart from real bugs.
+@app.exception_handler(sqlite3.OperationalError)
+async def sqlite_operational_error(request, exc: sqlite3.OperationalError):
+    msg = str(exc)
+    if "locked" in msg or "busy" in msg:
+        return JSONResponse(status_code=503, content={"detail": msg}, headers={"Retry-After": "1"})
+    return JSONResponse(status_code=500, content={"detail": "Database error"})
+
 # ---------------- Models ----------------
 
 class Effects(BaseModel):
@@ -71,13 +91,21 @@ class Meters(BaseModel):
     regHeat: int
 
 
-ChunkSize = Literal["small", "medium", "large"]
+# "small" | "medium" | "large" are always available; a corpus can configure more
+# (data/lab_docs/chunking.json), so the name is checked against the index.
+ChunkSize = str
+# lexical: token overlap; dense: hashed-embedding ANN (apps/api/dense.py); hybrid: both, rank-fused.
+RetrievalMode = Literal["lexical", "dense", "hybrid"]
+# docs: data/lab_docs; library: the Lab Library books (apps/api/library.py).
+RagSource = Literal["docs", "library"]
 
 
 class RagConfig(BaseModel):
     chunk_size: ChunkSize = Field(alias="chunkSize")
     top_k: int = Field(alias="topK")
     require_citations: bool = Field(alias="requireCitations")
+    retrieval: RetrievalMode = "lexical"
+    sources: List[RagSource] = Field(default_factory=lambda: ["docs"], min_length=1)
 
     class Config:
         populate_by_name = True
@@ -101,6 +129,7 @@ class RagResult(BaseModel):
 class RagRunRequest(BaseModel):
     config: RagConfig
     question: str
+    scenarioId: str = DEFAULT_SCENARIO_ID
 
 
 class RagRunResponse(BaseModel):
@@ -111,6 +140,26 @@ class RagRunResponse(BaseModel):
     createdAt: str
 
 
+class RagSearchSpace(BaseModel):
+    # None: every chunk size the index has.
+    chunkSize: Optional[List[ChunkSize]] = Field(default=None, min_length=1)
+    topK: List[int] = Field(default_factory=lambda: [1, 2, 3, 5, 8], min_length=1)
+    requireCitations: List[bool] = Field(default_factory=lambda: [True], min_length=1)
+    retrieval: List[RetrievalMode] = Field(default_factory=lambda: ["lexical"], min_length=1)
+    sources: List[List[RagSource]] = Field(default_factory=lambda: [["docs"]], min_length=1)
+
+
+class RagOptimizeRequest(BaseModel):
+    # None: optimizer.DEFAULT_QUESTIONS.
+    questions: Optional[List[str]] = Field(default=None, min_length=1)
+    space: RagSearchSpace = Field(default_factory=RagSearchSpace)
+    minPassRate: float = Field(default=0.8, ge=0.0, le=1.0)
+    strategy: Literal["halving", "early_stop", "exhaustive"] = "halving"
+    eta: int = Field(default=2, ge=2)
+    minQuestions: int = Field(default=2, ge=1)
+    scenarioId: str = DEFAULT_SCENARIO_ID
+
+
 class EvalFailure(BaseModel):
     id: str
     reason: str
@@ -126,6 +175,7 @@ class EvalRunRequest(BaseModel):
     ragScore: int = 0
     ragPassed: bool = False
     ragRunId: Optional[str] = None
+    scenarioId: str = DEFAULT_SCENARIO_ID
 
 
 class EvalRunResponse(BaseModel):
@@ -141,6 +191,7 @@ class WhiteboardRequest(BaseModel):
     ragPassed: bool
     evalPassRate: int
     meters: Meters
+    scenarioId: str = DEFAULT_SCENARIO_ID
 
 
 RefVerdict = Literal["SHIP", "REVISE", "BLOCK"]
@@ -153,6 +204,23 @@ class WhiteboardResponse(BaseModel):
     effects: Effects
 
 
+class MeterColumns(BaseModel):
+    reliability: List[int]
+    risk: List[int]
+    regHeat: List[int]
+
+
+class WhiteboardBatchRequest(BaseModel):
+    """Column arrays of states; a column of length 1 applies to every state."""
+    talkedToCount: List[int]
+    ragPassed: List[bool]
+    evalPassRate: List[int]
+    meters: MeterColumns
+    scenarioId: str = DEFAULT_SCENARIO_ID
+    # What-if overrides on top of the scenario's thresholds (see referee.Thresholds).
+    thresholds: Dict[str, int] = Field(default_factory=dict)
+
+
 # ---------------- Telemetry Models (v1.10) ----------------
 
 class TelemetryEventIn(BaseModel):
@@ -163,6 +231,8 @@ class TelemetryEventIn(BaseModel):
     latency_ms: Optional[int] = Field(default=None, alias="latencyMs")
     success: bool = True
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    # Client-chosen id: resending an event with the same id is a no-op.
+    event_id: Optional[str] = Field(default=None, alias="eventId", min_length=1, max_length=128)
 
     class Config:
         populate_by_name = True
@@ -184,41 +254,15 @@ class TelemetryPoint(BaseModel):
     value: float
 
 
-class TelemetryIngestResponse(BaseModel):
-    ok: bool
-    ids: List[str]
-
-
-# ---------------- Helpers ----------------
-
-def load_docs() -> list[dict]:
-    docs_dir = Path(__file__).resolve().parents[2] / "data" / "lab_docs"
-    docs = []
-    for p in docs_dir.glob("*.md"):
-        text = p.read_text()
-        docs.append({
-            "id": p.stem,
-            "title": text.splitlines()[0].lstrip("# "),
-            "text": text
-        })
-    return docs
+_TELEMETRY_BATCH = TypeAdapter(List[TelemetryEventIn])
 
 
-DOCS = load_docs()
-
-
-def tokenize(s: str) -> set[str]:
-    s = re.sub(r"[^a-z0-9\s]", " ", s.lower())
-    return {t for t in s.split() if len(t) > 2}
-
+class TelemetryIngestResponse(BaseModel):
+    ok: bool
+    ids: List[Optional[str]]  # None where the event was sampled out
+    duplicates: List[str] = Field(default_factory=list)
+    sampledOut: int = 0
 
-def chunk_text(text: str, size: ChunkSize) -> list[str]:
-    paras = [p.strip() for p in text.split("\n\n") if p.strip()]
-    if size == "small":
-        return paras
-    if size == "medium":
-        return ["\n\n".join(paras[i:i+2]) for i in range(0, len(paras), 2)]
-    return ["\n\n".join(paras)]
 
 # ---------------- NPC / Agent endpoints ----------------
 
@@ -270,11 +314,17 @@ AGENT_SCRIPTS = {
 }
 
 @app.get("/api/agent/{agent_id}", response_model=InteractionResponse)
-def agent(agent_id: str):
-    script = AGENT_SCRIPTS.get(agent_id)
-    if not script:
-        raise HTTPException(status_code=404, detail="Unknown agent")
-    return InteractionResponse(lines=script["lines"], effects=Effects(**script.get("effects", {})))
+async def agent(agent_id: str, request: Request):
+    # Scripts are static: serialize each once, then serve bytes (or a 304).
+    key = f"agent:{agent_id}"
+    entry = httpcache.cache.get(key)
+    if entry is None:
+        script = AGENT_SCRIPTS.get(agent_id)
+        if not script:
+            raise HTTPException(status_code=404, detail="Unknown agent")
+        resp = InteractionResponse(lines=script["lines"], effects=Effects(**script.get("effects", {})))
+        entry = httpcache.cache.put(key, httpcache.make_entry(resp.model_dump(mode="json"), httpcache.STATIC))
+    return httpcache.respond(request, entry)
 
 
 # ---------------- Reset / Clear Run ----------------
@@ -282,107 +332,21 @@ def agent(agent_id: str):
 class ResetRequest(BaseModel):
     wipe_db: bool = True
 
-def _candidate_db_paths() -> List[Path]:
-    """
-    Try the common locations:
-      1) current working directory (where uvicorn was launched)
-      2) alongside this file (apps/api)
-      3) repo root (assuming apps/api/main.py)
-    """
-    here = Path(__file__).resolve()
-    cwd = Path.cwd()
-    api_dir = here.parent
-    repo_root = here.parents[2] if len(here.parents) >= 3 else cwd
-
-    return [
-        cwd / "ai_lab.db",
-        api_dir / "ai_lab.db",
-        repo_root / "ai_lab.db",
-    ]
-
-def _delete_sqlite_files(db_path: Path) -> Dict[str, Any]:
-    removed = []
-    missing = []
-    errors = []
-
-    for p in [db_path, Path(str(db_path) + "-wal"), Path(str(db_path) + "-shm")]:
-        try:
-            if p.exists():
-                p.unlink()
-                removed.append(str(p))
-            else:
-                missing.append(str(p))
-        except Exception as e:
-            errors.append({"file": str(p), "error": str(e)})
-
-    return {"removed": removed, "missing": missing, "errors": errors}
-
-def _truncate_all_tables(db_path: Path) -> Dict[str, Any]:
+@app.post("/api/reset")
+async def reset_run(req: ResetRequest = Body(default=ResetRequest())):
     """
-    If file deletion fails (locked, permissions, etc.), wipe all tables.
+    Start a fresh run. O(1): bumps the DB generation, so every read stops
+    seeing earlier runs and telemetry at once; the old rows are deleted in the
+    background (see db.py "Generations"). No file is touched, so in-flight
+    requests and other workers never race a deleted database.
     """
-    wiped_tables: List[str] = []
-    conn = sqlite3.connect(str(db_path))
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = [r[0] for r in cur.fetchall()]
-
-        cur.execute("PRAGMA foreign_keys=OFF;")
-        for t in tables:
-            cur.execute(f'DELETE FROM "{t}";')
-            wiped_tables.append(t)
-
-        conn.commit()
-        # shrink file
-        cur.execute("VACUUM;")
-        conn.commit()
-    finally:
-        conn.close()
-
-    return {"wiped_tables": wiped_tables}
-
-@app.post("/api/reset")
-def reset_run(req: ResetRequest = Body(default=ResetRequest())):
     if not req.wipe_db:
         return {"ok": True, "wiped": False}
 
-    candidates = _candidate_db_paths()
-    results: List[Dict[str, Any]] = []
-
-    # First attempt: delete db files wherever we find them
-    for db in candidates:
-        if db.exists() or Path(str(db) + "-wal").exists() or Path(str(db) + "-shm").exists():
-            r = {"db": str(db), **_delete_sqlite_files(db)}
-            results.append(r)
-
-    # If nothing found, still report what we checked
-    if not results:
-        return {
-            "ok": True,
-            "wiped": False,
-            "reason": "No db file found in expected locations",
-            "checked": [str(p) for p in candidates],
-        }
-
-    # If deletion had errors but the main db still exists, truncate as fallback
-    for r in results:
-        db = Path(r["db"])
-        if db.exists():
-            try:
-                r["truncate_fallback"] = _truncate_all_tables(db)
-            except Exception as e:
-                r["truncate_fallback_error"] = str(e)
-
-    # Recreate empty DB + schema so subsequent API calls don't 500
-    try:
-        conn = connect()
-        conn.close()
-    except Exception as e:
-        # Don't fail reset if schema init fails — frontend can still recover
-        results.append({"schema_reinit_error": str(e)})
-
-    return {"ok": True, "wiped": True, "results": results}
+    generation = await db_executor.write(bump_generation)
+    httpcache.cache.clear()
+    db_gc.start()  # wakes the collector (and starts it if startup was lazy)
+    return {"ok": True, "wiped": True, "generation": generation}
 
 # ---------------- Telemetry helpers ----------------
 
@@ -406,17 +370,6 @@ def _parse_window(window: str) -> timedelta:
     return timedelta(days=n)
 
 
-def _percentile(values: List[int], p: float) -> Optional[int]:
-    if not values:
-        return None
-    v = sorted(values)
-    if len(v) == 1:
-        return int(v[0])
-    # nearest-rank
-    k = max(0, min(len(v) - 1, int(round((p / 100.0) * (len(v) - 1)))))
-    return int(v[k])
-
-
 def _bucket_seconds(window_td: timedelta) -> int:
     sec = int(window_td.total_seconds())
     if sec <= 6 * 3600:
@@ -428,34 +381,69 @@ def _bucket_seconds(window_td: timedelta) -> int:
 
 # ---------------- RAG ----------------
 
-@app.post("/api/rag/run", response_model=RagRunResponse)
-def rag_run(req: RagRunRequest):
-    t0 = time.perf_counter()
-    q_tokens = tokenize(req.question)
+def _retrieve(
+    question: str,
+    chunk_size: ChunkSize,
+    top_k: int,
+    mode: RetrievalMode = "lexical",
+    sources: Sequence[RagSource] = ("docs",),
+) -> list[tuple[int, ChunkRef]]:
+    """
+    (score, chunk) for the top_k chunks. `mode` only changes which chunks are
+    picked; the score is always the lexical overlap, so grading is comparable
+    across modes and across sources (ties go to the source listed first).
+    """
+    found: list[tuple[int, int, int, ChunkRef]] = []
+    for si, source in enumerate(dict.fromkeys(sources)):
+        attach = index_store.current if source == "docs" else library.index
+        for pos, (score, ref) in enumerate(_retrieve_from(attach, question, chunk_size, top_k, mode)):
+            found.append((-score, si, pos, ref))
+    found.sort(key=lambda f: f[:3])
+    return [(-neg, ref) for neg, _, _, ref in found[:top_k]]
+
+
+def _retrieve_from(attach, question: str, chunk_size: ChunkSize, top_k: int, mode: RetrievalMode) -> list[tuple[int, ChunkRef]]:
+    with span("tokenize"):
+        idx = attach()
+        q_ids = idx.query_ids(question)
+
+    with span("chunk"):
+        if chunk_size not in idx.sizes:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown chunkSize {chunk_size!r}; available: {', '.join(idx.sizes)}",
+            )
+        store = idx.store(chunk_size)
+
+    if mode == "lexical":
+        with span("score"):
+            return [(score, store.ref(row)) for score, row in store.top(store.overlap(q_ids), top_k)]
 
-    scored = []
-    for d in DOCS:
-        for chunk in chunk_text(d["text"], req.config.chunk_size):
-            score = len(tokenize(chunk) & q_tokens)
-            scored.append((score, d["id"], d["title"], chunk))
+    pool = top_k if mode == "dense" else max(4 * top_k, 32)
+    with span("embed"):
+        dense = store.dense()
+        q_vec = dense.query_vector(idx.tokenizer.query(question), idx.vocab.lookup)
+    with span("ann"):
+        rows = [row for _, row in dense.search(q_vec, pool)]
 
-    scored.sort(reverse=True)
-    top = scored[:req.config.top_k]
+    with span("score"):
+        if mode == "hybrid":
+            lexical = [row for score, row in store.top(store.overlap(q_ids), pool) if score > 0]
+            rows = store.fuse([lexical, rows], top_k)
+        refs = [store.ref(row) for row in rows[:top_k]]
+        return [(ref.overlap(q_ids), ref) for ref in refs]
 
+
+def _rag_grade(top: Sequence[tuple[int, ChunkRef]], require_citations: bool) -> Dict[str, Any]:
+    """Answer and score retrieved chunks (rag_run's pass/score logic, shared with the config optimizer)."""
     retrieved = []
     citations = []
     evidence = 0
 
-    for score, did, title, chunk in top:
+    for score, chunk in top:
         evidence += score
-        cid = f"{did}:{len(retrieved)}"
-        retrieved.append(
-            RagRetrieved(
-                id=cid,
-                title=title,
-                snippet=chunk[:220] + ("…" if len(chunk) > 220 else "")
-            )
-        )
+        cid = chunk.id
+        retrieved.append({"id": cid, "title": chunk.title, "snippet": chunk.snippet()})
         citations.append(cid)
 
     answer = (
@@ -464,170 +452,392 @@ def rag_run(req: RagRunRequest):
         "and escalate if context is missing."
     )
 
-    if req.config.require_citations:
+    if require_citations:
         answer += " Evidence: " + ", ".join(f"[{c}]" for c in citations[:2])
 
     score = min(100, evidence * 12)
-    passed = score >= 55
+    return {
+        "passed": score >= 55,
+        "score": score,
+        "answer": answer,
+        "citations": citations,
+        "retrieved": retrieved,
+    }
 
-    effects = Effects(
-        reliability=3 if passed else -2,
-        risk=-3 if passed else 2,
-        cost=1,
-        regHeat=-2 if passed else 2,
+
+async def _rag_score(req: RagRunRequest) -> Dict[str, Any]:
+    """Retrieve, answer and score: everything a RAG run reports before it is persisted."""
+    # Retrieval is pure CPU: keep it off the event loop.
+    top = await run_in_threadpool(
+        _retrieve, req.question, req.config.chunk_size, req.config.top_k, req.config.retrieval, req.config.sources
     )
+    graded = _rag_grade(top, req.config.require_citations)
+    passed, score, answer = graded["passed"], graded["score"], graded["answer"]
 
-    run_id = insert_rag_run(
-        passed=passed,
-        score=score,
-        config={
-            "chunkSize": req.config.chunk_size,
-            "topK": req.config.top_k,
-            "requireCitations": req.config.require_citations,
-        },
-        answer=answer,
-        citations=citations,
-        retrieved=[r.model_dump() for r in retrieved],
+    # Encoded once: the same bytes are stored with the run and sent back.
+    with span("serialize"):
+        config_json = fastjson.raw(req.config.model_dump(by_alias=True))
+        citations_json = fastjson.raw(graded["citations"])
+        retrieved_json = fastjson.raw(graded["retrieved"])
+
+    return {
+        **graded,
+        "lines": [f"RAG score {score} → {'PASS' if passed else 'FAIL'}", "", answer],
+        "effects": {"reliability": 3 if passed else -2, "cost": 1, "risk": -3 if passed else 2, "regHeat": -2 if passed else 2},
+        "config_json": config_json,
+        "citations_json": citations_json,
+        "retrieved_json": retrieved_json,
+    }
+
+
+async def _rag_persist(req: RagRunRequest, run: Dict[str, Any]) -> Tuple[str, str]:
+    """Store the run; (run id, created_at) once it is committed."""
+    with span("db_insert"):
+        run_id = await db_executor.write_for(
+            req.scenarioId,
+            storage.runs.insert_rag_run,
+            scenario_id=req.scenarioId,
+            passed=run["passed"],
+            score=run["score"],
+            config=run["config_json"],
+            answer=run["answer"],
+            citations=run["citations_json"],
+            retrieved=run["retrieved_json"],
+        )
+
+        created_at = (await db_executor.read(storage.runs.get_rag_run, run_id, req.scenarioId))["created_at"]
+    return run_id, created_at
+
+
+async def _rag_telemetry(req: RagRunRequest, run: Dict[str, Any], run_id: str, t0: float) -> None:
+    # Emit telemetry event (v1.10); sampled like client events (see ingest.py).
+    weight = ingest.sampler.weight(req.scenarioId, "rag_run")
+    with span("telemetry"):
+        try:
+            if weight is not None:
+                await db_executor.write_for(
+                    req.scenarioId,
+                    storage.telemetry.insert_event,
+                    scenario_id=req.scenarioId,
+                    run_id=run_id,
+                    agent_id="rag",
+                    event_type="rag_run",
+                    success=True,
+                    latency_ms=int((time.perf_counter() - t0) * 1000),
+                    metadata={
+                        "passed": run["passed"],
+                        "score": run["score"],
+                        "citations": len(run["citations"]),
+                        "sources_used": len(run["retrieved"]),
+                        "config": {
+                            "chunkSize": req.config.chunk_size,
+                            "topK": req.config.top_k,
+                            "requireCitations": req.config.require_citations,
+                            "retrieval": req.config.retrieval,
+                        },
+                    },
+                    weight=weight,
+                )
+        except Exception:
+            # Never let telemetry failures break gameplay.
+            pass
+
+
+@app.post("/api/rag/run", response_model=RagRunResponse)
+async def rag_run(req: RagRunRequest):
+    t0 = time.perf_counter()
+    run = await _rag_score(req)
+    run_id, created_at = await _rag_persist(req, run)
+    await _rag_telemetry(req, run, run_id, t0)
+
+    # Same shape as RagRunResponse, written straight to bytes.
+    with span("serialize"):
+        rag = fastjson.obj([
+            ("passed", run["passed"]),
+            ("score", run["score"]),
+            ("answer", run["answer"]),
+            ("citations", run["citations_json"]),
+            ("retrieved", run["retrieved_json"]),
+            ("config", run["config_json"]),
+        ])
+        body = fastjson.obj([
+            ("lines", run["lines"]),
+            ("effects", run["effects"]),
+            ("rag", rag),
+            ("runId", run_id),
+            ("createdAt", created_at),
+        ])
+    return fastjson.response(body)
+
+
+# Tasks that must finish even if the request that started them goes away.
+_detached: Set["asyncio.Task[Any]"] = set()
+
+
+def _detach(coro: Any) -> "asyncio.Task[Any]":
+    """Run `coro` as a task nobody has to await: kept alive until done; a failure is logged and counted."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _detached.add(task)
+
+    def _done(t: "asyncio.Task[Any]") -> None:
+        _detached.discard(t)
+        if t.cancelled() or t.exception() is None:
+            return
+        name = t.get_coro().__qualname__
+        metrics.BACKGROUND_FAILURES.inc(name)
+        log.error("background task %s failed", name, exc_info=t.exception())
+
+    task.add_done_callback(_done)
+    return task
+
+
+async def _rag_store(req: RagRunRequest, run: Dict[str, Any], t0: float) -> Tuple[str, str]:
+    """_rag_persist, then telemetry in the background; (run id, created_at)."""
+    run_id, created_at = await _rag_persist(req, run)
+    _detach(_rag_telemetry(req, run, run_id, t0))
+    return run_id, created_at
+
+
+def _error_fields(e: BaseException) -> List[Tuple[str, Any]]:
+    """status/detail of the response the exception handlers would have sent."""
+    if isinstance(e, HTTPException):
+        return [("status", e.status_code), ("detail", e.detail)]
+    if isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e)):
+        return [("status", 503), ("detail", str(e))]
+    if isinstance(e, sqlite3.Error):
+        return [("status", 500), ("detail", "Database error")]
+    return [("status", 500), ("detail", "Internal Server Error")]
+
+
+def _stream_frame(sse: bool, kind: str, fields: List[Tuple[str, Any]]) -> bytes:
+    data = fastjson.obj([("type", kind), *fields])
+    if sse:
+        return b"event: " + kind.encode() + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+
+@app.post("/api/rag/run/stream")
+async def rag_run_stream(req: RagRunRequest, accept: Optional[str] = Header(default=None)):
+    """
+    rag_run, streamed as it happens: NDJSON, or Server-Sent Events when the
+    client accepts text/event-stream. Frames, each with a `type`:
+
+      retrieved  citations + retrieved snippets, as soon as scoring is done
+      answer     lines, effects, passed, score, answer, config
+      done       runId + createdAt, once the run is committed
+      error      status + detail, if persisting failed (the run is then not stored)
+
+    Together they carry exactly what rag_run returns. Bad requests (e.g. an
+    unknown chunkSize) still fail with a plain status before the stream starts.
+    The run is stored (and telemetry sent) whether or not the client keeps
+    reading: storing starts with the stream in a task of its own.
+    """
+    t0 = time.perf_counter()
+    run = await _rag_score(req)
+    sse = "text/event-stream" in (accept or "")
+    stored = _detach(_rag_store(req, run, t0))
+
+    async def frames():
+        yield _stream_frame(sse, "retrieved", [
+            ("citations", run["citations_json"]),
+            ("retrieved", run["retrieved_json"]),
+        ])
+        yield _stream_frame(sse, "answer", [
+            ("lines", run["lines"]),
+            ("effects", run["effects"]),
+            ("passed", run["passed"]),
+            ("score", run["score"]),
+            ("answer", run["answer"]),
+            ("config", run["config_json"]),
+        ])
+        try:
+            # Shielded: a client that disconnects cancels this wait, not the store.
+            run_id, created_at = await asyncio.shield(stored)
+        except Exception as e:
+            # Headers are gone: report what the exception handlers would have as a final frame.
+            yield _stream_frame(sse, "error", _error_fields(e))
+            return
+        yield _stream_frame(sse, "done", [("runId", run_id), ("createdAt", created_at)])
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # No proxy buffering, or the early frames arrive together with the last one.
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
     )
 
-    created_at = get_rag_run(run_id)["created_at"]
 
-    # Emit telemetry event (v1.10)
+# ---------------- RAG config optimizer ----------------
+
+@app.post("/api/rag/optimize")
+async def rag_optimize(req: RagOptimizeRequest):
+    """
+    Search the RAG config space for the cheapest config that passes a question
+    set (see optimizer.py). The graded questions of the top
+    AI_LAB_OPTIMIZER_KEEP_RUNS leaderboard entries are stored as rag_runs
+    linked to the search (the other entries keep their stats only); returns
+    the search id, the best config and the leaderboard.
+    """
+    space = req.space
+    questions = req.questions or optimizer.DEFAULT_QUESTIONS
+    if space.chunkSize is None:
+        sizes = (await run_in_threadpool(index_store.current)).sizes
+    else:
+        sizes = space.chunkSize
     try:
-        insert_telemetry_event(
-            scenario_id=DEFAULT_SCENARIO_ID,
-            run_id=run_id,
-            agent_id="rag",
-            event_type="rag_run",
-            success=True,
-            latency_ms=int((time.perf_counter() - t0) * 1000),
-            metadata={
-                "passed": passed,
-                "score": score,
-                "citations": len(citations),
-                "sources_used": len(retrieved),
-                "config": {
-                    "chunkSize": req.config.chunk_size,
-                    "topK": req.config.top_k,
-                    "requireCitations": req.config.require_citations,
-                },
-            },
+        grid = optimizer.candidates(sizes, space.topK, space.requireCitations, space.retrieval, space.sources)
+        with span("search"):
+            result = await run_in_threadpool(
+                optimizer.search,
+                grid,
+                questions,
+                _retrieve,
+                _rag_grade,
+                min_pass_rate=req.minPassRate,
+                strategy=req.strategy,
+                eta=req.eta,
+                min_questions=req.minQuestions,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    runs = [
+        [
+            {
+                "passed": r["passed"],
+                "score": r["score"],
+                "config": trial.candidate.config(),
+                "answer": r["answer"],
+                "citations": r["citations"],
+                "retrieved": r["retrieved"],
+            }
+            for r in trial.results
+        ]
+        if rank < optimizer.OPTIMIZER_KEEP_RUNS
+        else []
+        for rank, trial in enumerate(result["trials"])
+    ]
+    result["stats"]["storedRuns"] = sum(len(r) for r in runs)
+    request = req.model_dump()
+    request["questions"] = list(questions)
+    request["space"]["chunkSize"] = list(sizes)
+    with span("db_insert"):
+        search_id, created_at = await db_executor.write_for(
+            req.scenarioId,
+            storage.runs.insert_rag_search,
+            scenario_id=req.scenarioId,
+            request=request,
+            leaderboard=result["leaderboard"],
+            best=result["best"],
+            stats=result["stats"],
+            runs=runs,
         )
-    except Exception:
-        # Never let telemetry failures break gameplay.
-        pass
+    search = await db_executor.read(storage.runs.get_rag_search, search_id, req.scenarioId)
+    return fastjson.response(_rag_search(search))
 
-    return RagRunResponse(
-        lines=[f"RAG score {score} → {'PASS' if passed else 'FAIL'}", "", answer],
-        effects=effects,
-        rag=RagResult(
-            passed=passed,
-            score=score,
-            answer=answer,
-            citations=citations,
-            retrieved=retrieved,
-            config=req.config,
-        ),
-        runId=run_id,
-        createdAt=created_at,
-    )
+
+@app.get("/api/rag/optimize")
+async def rag_searches(limit: int = 20, scenarioId: Optional[str] = None):
+    """Recent config searches (best config + stats), across all scenarios unless one is given."""
+    searches = await db_executor.read(storage.runs.list_rag_searches, limit, scenarioId)
+    return fastjson.response([_rag_search(s) for s in searches])
+
+
+@app.get("/api/rag/optimize/{search_id}")
+async def rag_search(search_id: str, scenarioId: Optional[str] = None):
+    """One config search with its full leaderboard (each entry lists the ids of its rag_runs)."""
+    search = await db_executor.read(storage.runs.get_rag_search, search_id, scenarioId)
+    if not search:
+        raise HTTPException(status_code=404, detail="Config search not found")
+    return fastjson.response(_rag_search(search))
+
+
+def _rag_search(s: Dict[str, Any]) -> Dict[str, Any]:
+    out = {
+        "searchId": s["id"],
+        "createdAt": s["created_at"],
+        "scenarioId": s["scenario_id"],
+        "best": s["best"],
+        "stats": s["stats"],
+    }
+    if "leaderboard" in s:
+        out["request"] = s["request"]
+        out["leaderboard"] = s["leaderboard"]
+    return out
 
 
 # ---------------- Eval ----------------
 
 @app.post("/api/eval/run", response_model=EvalRunResponse)
-def eval_run(req: EvalRunRequest):
+async def eval_run(req: EvalRunRequest):
     t0 = time.perf_counter()
     base = 55 + (20 if req.ragPassed else 0)
     pass_rate = min(100, base + (req.ragScore - 55) // 2)
 
     failures = []
     if pass_rate < 80:
-        failures.append(EvalFailure(id="E-01", reason="Insufficient grounding"))
-
-    run_id = insert_eval_run(
-        pass_rate=pass_rate,
-        failures=[f.model_dump() for f in failures],
-        rag_run_id=req.ragRunId,
-        rag_score=req.ragScore,
-        rag_passed=req.ragPassed,
-    )
+        failures.append({"id": "E-01", "reason": "Insufficient grounding"})
+    failures_json = fastjson.raw(failures)
+
+    with span("db_insert"):
+        run_id = await db_executor.write_for(
+            req.scenarioId,
+            storage.runs.insert_eval_run,
+            scenario_id=req.scenarioId,
+            pass_rate=pass_rate,
+            failures=failures_json,
+            rag_run_id=req.ragRunId,
+            rag_score=req.ragScore,
+            rag_passed=req.ragPassed,
+        )
 
-    created_at = get_eval_run(run_id)["created_at"]
+        created_at = (await db_executor.read(storage.runs.get_eval_run, run_id, req.scenarioId))["created_at"]
 
-    # Emit telemetry event (v1.10)
-    try:
-        insert_telemetry_event(
-            scenario_id=DEFAULT_SCENARIO_ID,
-            run_id=run_id,
-            agent_id="eval",
-            event_type="eval_run",
-            success=True,
-            latency_ms=int((time.perf_counter() - t0) * 1000),
-            metadata={
-                "passRate": pass_rate,
-                "ragRunId": req.ragRunId,
-                "ragScore": req.ragScore,
-                "ragPassed": req.ragPassed,
-                "failures": [f.model_dump() for f in failures],
-            },
-        )
-    except Exception:
-        pass
-
-    return EvalRunResponse(
-        lines=[f"Eval pass rate: {pass_rate}%"],
-        effects=Effects(reliability=4 if pass_rate >= 80 else -2),
-        eval=EvalResult(
-            ran=True,
-            passRate=pass_rate,
-            failures=failures,
-        ),
-        runId=run_id,
-        createdAt=created_at,
-    )
+    # Emit telemetry event (v1.10); sampled like client events (see ingest.py).
+    weight = ingest.sampler.weight(req.scenarioId, "eval_run")
+    with span("telemetry"):
+        try:
+            if weight is not None:
+                await db_executor.write_for(
+                    req.scenarioId,
+                    storage.telemetry.insert_event,
+                    scenario_id=req.scenarioId,
+                    run_id=run_id,
+                    agent_id="eval",
+                    event_type="eval_run",
+                    success=True,
+                    latency_ms=int((time.perf_counter() - t0) * 1000),
+                    metadata={
+                        "passRate": pass_rate,
+                        "ragRunId": req.ragRunId,
+                        "ragScore": req.ragScore,
+                        "ragPassed": req.ragPassed,
+                        "failures": failures,
+                    },
+                    weight=weight,
+                )
+        except Exception:
+            pass
+
+    # Same shape as EvalRunResponse, written straight to bytes.
+    return fastjson.response(fastjson.obj([
+        ("lines", [f"Eval pass rate: {pass_rate}%"]),
+        ("effects", {"reliability": 4 if pass_rate >= 80 else -2, "cost": 0, "risk": 0, "regHeat": 0}),
+        ("eval", fastjson.obj([("ran", True), ("passRate", pass_rate), ("failures", failures_json)])),
+        ("runId", run_id),
+        ("createdAt", created_at),
+    ]))
 
 # ---------------- Whiteboard ----------------
 
 @app.post("/api/station/whiteboard", response_model=WhiteboardResponse)
-def whiteboard(req: WhiteboardRequest):
-    reasons: list[str] = []
-    verdict: RefVerdict = "REVISE"
-
-    # Required interactions
-    if req.talkedToCount < 4:
-        reasons.append("You have not consulted all four council members.")
-
-    # RAG gate
-    if not req.ragPassed:
-        reasons.append("RAG Test Rig did not pass.")
-
-    # Eval gate
-    if req.evalPassRate < 80:
-        reasons.append(f"Eval pass rate too low ({req.evalPassRate}% < 80%).")
-
-    # Meter gates
-    if req.meters.risk > 60:
-        reasons.append(f"Risk too high ({req.meters.risk} > 60).")
-
-    if req.meters.regHeat > 60:
-        reasons.append(f"Regulatory heat too high ({req.meters.regHeat} > 60).")
-
-    if req.meters.reliability < 55:
-        reasons.append(f"Reliability too low ({req.meters.reliability} < 55).")
-
-    # Final verdict logic
-    if not reasons:
-        verdict = "SHIP"
-    elif req.meters.risk >= 80 or req.meters.regHeat >= 80:
-        verdict = "BLOCK"
-
-    effects = Effects(
-        reliability=2 if verdict == "SHIP" else 0,
-        risk=-1 if verdict == "SHIP" else (1 if verdict == "BLOCK" else 0),
-        regHeat=-1 if verdict == "SHIP" else (1 if verdict == "BLOCK" else 0),
-        cost=0,
-    )
+async def whiteboard(req: WhiteboardRequest):
+    m = req.meters
+    t = referee.thresholds.for_scenario(req.scenarioId)
+    code, mask = referee.judge(req.talkedToCount, req.ragPassed, req.evalPassRate, m.risk, m.regHeat, m.reliability, t)
+    reasons = referee.reason_lines(mask, req.talkedToCount, req.evalPassRate, m.risk, m.regHeat, m.reliability, t)
+    verdict: RefVerdict = referee.VERDICTS[code]
+    effects = Effects(**referee.VERDICT_EFFECTS[code])
 
     lines = [
         "Whiteboard referee review complete.",
@@ -649,12 +859,111 @@ def whiteboard(req: WhiteboardRequest):
     )
 
 
+@app.get("/api/station/whiteboard/thresholds")
+async def whiteboard_thresholds(scenarioId: str = DEFAULT_SCENARIO_ID):
+    return {"scenarioId": scenarioId, "thresholds": referee.thresholds.for_scenario(scenarioId).to_dict()}
+
+
+@app.post("/api/station/whiteboard/batch")
+async def whiteboard_batch(req: WhiteboardBatchRequest):
+    """Referee verdicts for many states at once, as compact arrays.
+
+    `verdicts[i]` indexes `verdictNames`; `reasons[i]` is a bit mask of
+    `reasonCodes` (0 when every gate passed).
+    """
+    m = req.meters
+    columns = [req.talkedToCount, req.ragPassed, req.evalPassRate, m.risk, m.regHeat, m.reliability]
+    n = max(len(c) for c in columns)
+    if any(len(c) not in (1, n) for c in columns):
+        raise HTTPException(status_code=422, detail="Columns must all have the same length (or length 1).")
+    if n > referee.REFEREE_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {referee.REFEREE_MAX_BATCH} states per batch.")
+    try:
+        t = referee.thresholds.for_scenario(req.scenarioId).override(req.thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    with span("referee"):
+        verdicts, reasons = referee.judge_batch(*columns, t)
+        counts = referee.verdict_counts(verdicts)
+    return fastjson.response({
+        "scenarioId": req.scenarioId,
+        "n": n,
+        "thresholds": t.to_dict(),
+        "verdictNames": list(referee.VERDICTS),
+        "reasonCodes": referee.REASON_CODES,
+        "effects": list(referee.VERDICT_EFFECTS),
+        "counts": dict(zip(referee.VERDICTS, counts)),
+        "verdicts": verdicts,
+        "reasons": reasons,
+    })
+
+
+# ---------------- Library ----------------
+#
+# The Book Viewer fetches only what it shows: the table of contents, one page
+# at a time, glossary lookups and search hits. Catalog views are keyed by the
+# books' fingerprint, so an edited books.json is served fresh.
+
+LIBRARY_MAX_PAGES = 20
+LIBRARY_MAX_HITS = 50
+
+
+@app.get("/api/library")
+async def library_toc(request: Request):
+    catalog = await run_in_threadpool(library.catalog)
+    key = f"library:toc:{catalog.fingerprint}"
+    entry = httpcache.cache.get(key)
+    if entry is None:
+        entry = httpcache.cache.put(key, httpcache.make_entry({"books": catalog.toc()}, httpcache.STATIC))
+    return httpcache.respond(request, entry)
+
+
+@app.get("/api/library/search")
+async def library_search(q: str, limit: int = 10, bookId: Optional[str] = None):
+    """Pages ranked by query-token overlap; `highlights` are [start, end) spans in `snippet`."""
+    limit = max(1, min(limit, LIBRARY_MAX_HITS))
+    # Attaching (or first building) the library index and scoring are CPU work.
+    hits = await run_in_threadpool(library.search, q, limit, bookId)
+    return {"q": q, "hits": hits}
+
+
+@app.get("/api/library/glossary")
+async def library_glossary(term: Optional[str] = None, bookId: Optional[str] = None):
+    """Every glossary entry, or the entries for `term` (exact match, else prefix; case-insensitive)."""
+    entries = await run_in_threadpool(library.glossary, term, bookId)
+    return {"term": term, "entries": entries}
+
+
+@app.get("/api/library/{book_id}/pages")
+async def library_pages(book_id: str, request: Request, offset: int = 0, limit: int = 1):
+    limit = max(1, min(limit, LIBRARY_MAX_PAGES))
+    catalog = await run_in_threadpool(library.catalog)
+    key = f"library:pages:{catalog.fingerprint}:{book_id}:{offset}:{limit}"
+    entry = httpcache.cache.get(key)
+    if entry is None:
+        content = library.pages(book_id, offset, limit)
+        if content is None:
+            raise HTTPException(status_code=404, detail="Unknown book")
+        entry = httpcache.cache.put(key, httpcache.make_entry(content, httpcache.STATIC))
+    return httpcache.respond(request, entry)
+
+
 # ---------------- Artifacts ----------------
 
+@app.get("/api/artifacts/stats")
+async def artifacts_stats(scenarioId: Optional[str] = None):
+    """
+    Per-config run counts, pass rates and mean scores (RAG score / eval pass
+    rate) from the materialized summary tables, across all scenarios unless one is given.
+    """
+    return fastjson.response(await db_executor.read(storage.runs.config_stats, scenarioId))
+
+
 @app.get("/api/artifacts/rag")
-def artifacts_rag(limit: int = 50):
-    """List recent RAG runs (summary)."""
-    runs = list_rag_runs(limit)
+async def artifacts_rag(limit: int = 50, scenarioId: Optional[str] = None):
+    """List recent RAG runs (summary), across all scenarios unless one is given."""
+    runs = await db_executor.read(storage.runs.list_rag_runs, limit, scenarioId)
     out = []
     for r in runs:
         out.append(
@@ -666,17 +975,39 @@ def artifacts_rag(limit: int = 50):
                 "passed": r["passed"],
                 "score": r["score"],
                 "config": r["config"],
+                "scenarioId": r["scenario_id"],
             }
         )
-    return out
+    return fastjson.response(out)
 
 
 @app.get("/api/artifacts/rag/{run_id}")
-def artifact_rag(run_id: str):
-    """Get a single RAG run (full)."""
-    r = get_rag_run(run_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="RAG artifact not found")
+async def artifact_rag(run_id: str, request: Request, scenarioId: Optional[str] = None):
+    """
+    Get a single RAG run (full). `scenarioId` narrows the lookup to one shard.
+    Runs never change once written: served from the response cache with a
+    strong ETag and `Cache-Control: immutable`.
+    """
+    return httpcache.respond(request, await rag_artifact_entry(run_id, scenarioId))
+
+
+async def rag_artifact_entry(run_id: str, scenarioId: Optional[str] = None) -> httpcache.CachedResponse:
+    """The cached, serialized artifact of a RAG run (lookup and encoding, no HTTP); 404 if unknown."""
+    # Keyed by generation: after a reset (in any worker) retired entries miss everywhere.
+    generation = await db_executor.read(current_generation)
+    key = f"rag:{generation}:{run_id}"
+    entry = httpcache.cache.get(key)
+    if entry is None or (scenarioId and entry.tag != scenarioId):
+        r = await db_executor.read(storage.runs.get_rag_run, run_id, scenarioId)
+        if not r:
+            raise HTTPException(status_code=404, detail="RAG artifact not found")
+        entry = httpcache.cache.put(
+            key, httpcache.make_entry(_rag_artifact(r), httpcache.IMMUTABLE, tag=r["scenario_id"], generation=generation)
+        )
+    return entry
+
+
+def _rag_artifact(r: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": r["id"],
         "created_at": r["created_at"],
@@ -687,13 +1018,15 @@ def artifact_rag(run_id: str):
         "answer": r["answer"],
         "citations": r["citations"],
         "retrieved": r["retrieved"],
+        "scenarioId": r["scenario_id"],
+        "searchId": r.get("search_id"),  # set when a config search graded this run
     }
 
 
 @app.get("/api/artifacts/eval")
-def artifacts_eval(limit: int = 50):
-    """List recent Eval runs (summary)."""
-    runs = list_eval_runs(limit)
+async def artifacts_eval(limit: int = 50, scenarioId: Optional[str] = None):
+    """List recent Eval runs (summary), across all scenarios unless one is given."""
+    runs = await db_executor.read(storage.runs.list_eval_runs, limit, scenarioId)
     out = []
     for r in runs:
         out.append(
@@ -705,17 +1038,35 @@ def artifacts_eval(limit: int = 50):
                 "ragRunId": r.get("ragRunId"),
                 "ragScore": r["ragScore"],
                 "ragPassed": r["ragPassed"],
+                "scenarioId": r["scenario_id"],
             }
         )
-    return out
+    return fastjson.response(out)
 
 
 @app.get("/api/artifacts/eval/{run_id}")
-def artifact_eval(run_id: str):
-    """Get a single Eval run (full)."""
-    r = get_eval_run(run_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="Eval artifact not found")
+async def artifact_eval(run_id: str, request: Request, scenarioId: Optional[str] = None):
+    """Get a single Eval run (full); cached like RAG runs. `scenarioId` narrows the lookup to one shard."""
+    return httpcache.respond(request, await eval_artifact_entry(run_id, scenarioId))
+
+
+async def eval_artifact_entry(run_id: str, scenarioId: Optional[str] = None) -> httpcache.CachedResponse:
+    """The cached, serialized artifact of an Eval run (lookup and encoding, no HTTP); 404 if unknown."""
+    # Keyed by generation: after a reset (in any worker) retired entries miss everywhere.
+    generation = await db_executor.read(current_generation)
+    key = f"eval:{generation}:{run_id}"
+    entry = httpcache.cache.get(key)
+    if entry is None or (scenarioId and entry.tag != scenarioId):
+        r = await db_executor.read(storage.runs.get_eval_run, run_id, scenarioId)
+        if not r:
+            raise HTTPException(status_code=404, detail="Eval artifact not found")
+        entry = httpcache.cache.put(
+            key, httpcache.make_entry(_eval_artifact(r), httpcache.IMMUTABLE, tag=r["scenario_id"], generation=generation)
+        )
+    return entry
+
+
+def _eval_artifact(r: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": r["id"],
         "created_at": r["created_at"],
@@ -725,6 +1076,7 @@ def artifact_eval(run_id: str):
         "ragRunId": r.get("ragRunId"),
         "ragScore": r["ragScore"],
         "ragPassed": r["ragPassed"],
+        "scenarioId": r["scenario_id"],
     }
 
 
@@ -732,139 +1084,214 @@ def artifact_eval(run_id: str):
 # ---------------- Telemetry API (v1.10) ----------------
 
 @app.post("/api/telemetry/event", response_model=TelemetryIngestResponse)
-def telemetry_event(payload: Any = Body(...)):
+async def telemetry_event(
+    payload: Any = Body(...),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key", max_length=128),
+):
     """
     Ingest 1 or many events.
 
     Supports:
       - single event { ... }
       - batch [ { ... }, ... ]
+
+    Retries are safe when events carry an `eventId`, or when the request has an
+    `Idempotency-Key` header (event i of the batch then gets "<key>:<i>").
+    Events already stored are skipped and listed in `duplicates`.
+
+    Events may be sampled out (see ingest.py); the rest are stored with their
+    sampling weight. Returns 429 + Retry-After when this worker's ingest budget
+    or DB writer backlog is exhausted.
     """
     events_raw = payload if isinstance(payload, list) else [payload]
 
-    ids: List[str] = []
-    for raw in events_raw:
-        # Validate using your Pydantic model (wherever it is defined in this file)
-        evt = TelemetryEventIn.model_validate(raw)
-
-        ids.append(
-            insert_telemetry_event(
-                scenario_id=evt.scenario_id,
-                run_id=evt.run_id,
-                agent_id=evt.agent_id,
-                event_type=evt.event_type,
-                success=bool(evt.success),
-                latency_ms=evt.latency_ms,
-                metadata=evt.metadata,
-            )
+    # Validate the whole batch first (in one pass) so a bad event doesn't leave a partial write.
+    events = []
+    keep: List[bool] = []
+    for i, evt in enumerate(_TELEMETRY_BATCH.validate_python(events_raw)):
+        event_id = evt.event_id or (f"{idempotency_key}:{i}" if idempotency_key else None)
+        weight = ingest.sampler.weight(
+            evt.scenario_id,
+            evt.event_type,
+            success=evt.success,
+            escalated=evt.metadata.get("escalated") is True,
+            event_id=event_id,
+        )
+        keep.append(weight is not None)
+        if weight is None:
+            continue
+        events.append(
+            {
+                "scenario_id": evt.scenario_id,
+                "run_id": evt.run_id,
+                "agent_id": evt.agent_id,
+                "event_type": evt.event_type,
+                "success": bool(evt.success),
+                "latency_ms": evt.latency_ms,
+                "metadata": evt.metadata,
+                "client_event_id": event_id,
+                "weight": weight,
+            }
+        )
+
+    sampled_out = keep.count(False)
+    if sampled_out:
+        metrics.TELEMETRY_EVENTS.inc("sampled_out", amount=sampled_out)
+    with span("admit"):
+        retry_after = ingest.admit(len(events), db_executor.pending_writes)
+    if retry_after is not None:
+        metrics.TELEMETRY_EVENTS.inc("rejected", amount=len(events))
+        raise HTTPException(
+            status_code=429,
+            detail="Telemetry ingest is saturated; retry later",
+            headers={"Retry-After": str(retry_after)},
         )
 
-    return TelemetryIngestResponse(ok=True, ids=ids)
+    # One write per scenario, each on the writer that owns its shard.
+    by_scenario: Dict[str, List[int]] = {}
+    for i, e in enumerate(events):
+        by_scenario.setdefault(e["scenario_id"], []).append(i)
+    stored: List[str] = [""] * len(events)
+    duplicates: List[str] = []
+    with span("db_insert"):
+        results = await asyncio.gather(*(
+            db_executor.write_for(sid, storage.telemetry.insert_events, [events[i] for i in positions])
+            for sid, positions in by_scenario.items()
+        ))
+    for positions, (shard_ids, shard_dups) in zip(by_scenario.values(), results):
+        for i, event_id in zip(positions, shard_ids):
+            stored[i] = event_id
+        duplicates += shard_dups
+
+    metrics.TELEMETRY_EVENTS.inc("stored", amount=len(events) - len(duplicates))
+    if duplicates:
+        metrics.TELEMETRY_EVENTS.inc("duplicate", amount=len(duplicates))
+
+    it = iter(stored)
+    ids = [next(it) if kept else None for kept in keep]
+    return fastjson.response({"ok": True, "ids": ids, "duplicates": duplicates, "sampledOut": sampled_out})
 
 
 @app.get("/api/telemetry/summary", response_model=TelemetrySummary)
-def telemetry_summary(scenarioId: str = DEFAULT_SCENARIO_ID, window: str = "24h"):
+async def telemetry_summary(scenarioId: str = DEFAULT_SCENARIO_ID, window: str = "24h"):
     td = _parse_window(window)
     since = (datetime.now(timezone.utc) - td).isoformat()
-    events = list_telemetry_events(scenario_id=scenarioId, since_iso=since, limit=5000)
-
-    latencies = [int(e["latency_ms"]) for e in events if e.get("latency_ms") is not None]
-    total = len(events)
-    errors = sum(1 for e in events if not e.get("success", True))
-
-    esc = 0
-    for e in events:
-        if e.get("event_type") == "escalation":
-            esc += 1
-        else:
-            md = e.get("metadata") or {}
-            if md.get("escalated") is True:
-                esc += 1
-
-    cit_total = 0
-    cit_covered = 0
-    for e in events:
-        if e.get("event_type") in ("rag_run", "response"):
-            md = e.get("metadata") or {}
-            if "citations" in md:
-                cit_total += 1
-                if int(md.get("citations") or 0) > 0:
-                    cit_covered += 1
-
-    return TelemetrySummary(
-        scenarioId=scenarioId,
-        window=window,
-        latencyP50=_percentile(latencies, 50),
-        latencyP95=_percentile(latencies, 95),
-        errorRate=(errors / total) if total else 0.0,
-        escalationRate=(esc / total) if total else 0.0,
-        citationCoverage=(cit_covered / cit_total) if cit_total else 0.0,
-        totalEvents=total,
-    )
+    # Weighted aggregates (a sampled event stands for 1/rate events); the
+    # engine is chosen by AI_LAB_ANALYTICS (see storage.py / analytics.py).
+    with span("aggregate"):
+        summary = await db_executor.read(storage.analytics.summary, scenarioId, since)
+    return TelemetrySummary(scenarioId=scenarioId, window=window, **summary)
 
 
 @app.get("/api/telemetry/timeseries", response_model=List[TelemetryPoint])
-def telemetry_timeseries(
+async def telemetry_timeseries(
     metric: str,
     scenarioId: str = DEFAULT_SCENARIO_ID,
     window: str = "24h",
 ):
     td = _parse_window(window)
-    since_dt = datetime.now(timezone.utc) - td
-    since = since_dt.isoformat()
-    events = list_telemetry_events(scenario_id=scenarioId, since_iso=since, limit=20000)
+    since = (datetime.now(timezone.utc) - td).isoformat()
+    with span("aggregate"):
+        points = await db_executor.read(storage.analytics.timeseries, scenarioId, since, metric, _bucket_seconds(td))
+    return fastjson.response([
+        {"timestamp": datetime.fromtimestamp(k, tz=timezone.utc).isoformat(), "value": float(v)}
+        for k, v in points
+    ])
 
-    bucket_sec = _bucket_seconds(td)
 
-    def bucket_key(dt: datetime) -> int:
-        return int(dt.timestamp() // bucket_sec) * bucket_sec
+# ---------------- Perf ----------------
 
-    buckets: Dict[int, List[float]] = {}
-    for e in events:
-        try:
-            dt = datetime.fromisoformat(e["created_at"].replace("Z", "+00:00"))
-        except Exception:
-            continue
-        k = bucket_key(dt)
-        buckets.setdefault(k, [])
-
-        md = e.get("metadata") or {}
-        if metric in ("latency_p95", "latency_p50", "latency"):
-            if e.get("latency_ms") is not None:
-                buckets[k].append(float(e["latency_ms"]))
-        elif metric == "error_rate":
-            buckets[k].append(0.0 if e.get("success", True) else 1.0)
-        elif metric == "escalation_rate":
-            is_esc = e.get("event_type") == "escalation" or bool(md.get("escalated"))
-            buckets[k].append(1.0 if is_esc else 0.0)
-        elif metric == "citation_coverage":
-            if e.get("event_type") in ("rag_run", "response") and "citations" in md:
-                buckets[k].append(1.0 if int(md.get("citations") or 0) > 0 else 0.0)
-        elif metric == "eval_pass_rate":
-            if e.get("event_type") == "eval_run" and "passRate" in md:
-                buckets[k].append(float(md.get("passRate")))
-
-    points: List[TelemetryPoint] = []
-    for k in sorted(buckets.keys()):
-        vals = buckets[k]
-        if not vals:
-            continue
+@app.get("/api/perf")
+def perf(route: Optional[str] = None, reset: bool = False):
+    """
+    Rolling per-route stage timings (validate, tokenize, chunk, score,
+    db_insert, telemetry, serialize, total). `route` filters on the
+    "METHOD /path/template" key; `reset=true` clears the window after reading.
+    """
+    snap = perf_registry.snapshot(route)
+    if reset:
+        perf_registry.reset()
+    return snap
+
+
+@app.get("/api/metrics")
+def metrics_exposition():
+    """
+    Prometheus text exposition: per-route request counters and latency
+    histograms, stage timings, SQLite commit / write-lock times, DB writer
+    backlog and response cache hits. Merged across the workers sharing
+    AI_LAB_METRICS_DIR (see metrics.py); never touches the database.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ---------------- Admin: sampling profiler ----------------
 
-        if metric in ("latency_p95", "latency_p50"):
-            ints = [int(x) for x in vals]
-            p = 95 if metric == "latency_p95" else 50
-            v = float(_percentile(ints, p) or 0)
-        elif metric.endswith("_rate") or metric == "citation_coverage":
-            v = sum(vals) / len(vals)
-        else:
-            v = sum(vals) / len(vals)
+@app.post("/api/admin/profile")
+async def admin_profile(
+    seconds: float = 10.0,
+    intervalMs: float = 5.0,
+    lines: bool = False,
+    format: Literal["collapsed", "json"] = "collapsed",
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    """
+    Sample every thread of this worker for `seconds` and return collapsed stacks
+    (pipe into flamegraph.pl, or load in speedscope). Disabled unless
+    AI_LAB_PROFILER_ENABLED is set; requires X-Admin-Token == AI_LAB_PROFILER_TOKEN.
+    """
+    if not profiler.profiler_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.check_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    # Sample from a dedicated thread so the event loop (and the threadpools the
+    # sync handlers and DB helpers run on) keep serving the traffic we are trying to observe.
+    try:
+        result = await asyncio.wrap_future(profiler.sample_in_thread(seconds, intervalMs, lines))
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "json":
+        return {
+            "seconds": result["seconds"],
+            "intervalMs": result["intervalMs"],
+            "samples": result["samples"],
+            "stacks": dict(result["stacks"].most_common()),
+        }
+    return PlainTextResponse(
+        profiler.to_collapsed(result["stacks"]),
+        headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Seconds": str(result["seconds"]),
+        },
+    )
 
-        ts = datetime.fromtimestamp(k, tz=timezone.utc).isoformat()
-        points.append(TelemetryPoint(timestamp=ts, value=v))
 
-    return points
+# Long-running servers warm everything at boot. Serverless entrypoints (api/)
+# set AI_LAB_EAGER_INIT=0: the schema is then created on first DB use and the
+# index attached on first retrieval, so a cold start only pays for what its
+# first request needs.
+EAGER_INIT = os.getenv("AI_LAB_EAGER_INIT", "1").strip().lower() not in ("0", "false", "no", "off")
 
 
 @app.on_event("startup")
 def startup():
+    # Snapshots this worker's metrics for the others' /api/metrics (with AI_LAB_METRICS_DIR).
+    metrics.registry.start()
+    if not EAGER_INIT:
+        return
     init_db()
+    # Attach (or, for the first worker, build + publish) the shared retrieval index.
+    index_store.current()
+    # Load the analytics copy (if any) off the request path.
+    threading.Thread(target=storage.analytics.sync, name="analytics-sync", daemon=True).start()
+    # Deletes rows of generations retired by /api/reset.
+    db_gc.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    db_gc.stop()
+    db_executor.shutdown()
+    metrics.registry.stop()
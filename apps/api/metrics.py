@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ---------------- Metrics (Prometheus text exposition) ----------------
+#
+# An in-memory registry of counters, gauges and histograms, served by
+# GET /api/metrics in the Prometheus text format (version 0.0.4). Updates are
+# a dict bump under a lock; nothing here touches SQLite, so a scrape never
+# competes with gameplay writes.
+#
+# Multiple workers: with AI_LAB_METRICS_DIR set, every process writes its
+# registry to `<dir>/metrics-<pid>-<token>.json` (atomically, every
+# AI_LAB_METRICS_FLUSH_S while it changed), and a scrape flushes its own
+# process, then merges every file: counters and histograms are summed over all
+# processes (exited workers included, so totals never go backwards), gauges
+# over the live ones. Other workers' values are at most one flush interval old.
+# Point every worker of a server at the same directory and empty it before the
+# server starts. Without the directory a scrape reports its own process only
+# (one worker, or a serverless instance).
+#
+# Configure via env:
+#   AI_LAB_METRICS_DIR       shared directory for per-process snapshots (default: off)
+#   AI_LAB_METRICS_FLUSH_S   snapshot interval in seconds (default 1)
+# -----------------------------------------------------------------------------
+
+METRICS_DIR = os.getenv("AI_LAB_METRICS_DIR", "")
+METRICS_FLUSH_S = float(os.getenv("AI_LAB_METRICS_FLUSH_S", "1"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (s) of the duration buckets; the same edges as /api/perf's histograms.
+DURATION_BUCKETS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, registry: "Registry", name: str) -> None:
+        self._registry = registry
+        self._name = name
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._registry._add(self._name, labels, amount)
+
+
+class Gauge:
+    def __init__(self, registry: "Registry", name: str) -> None:
+        self._registry = registry
+        self._name = name
+
+    def set(self, value: float, *labels: str) -> None:
+        self._registry._set(self._name, labels, value)
+
+
+class Histogram:
+    def __init__(self, registry: "Registry", name: str, buckets: Sequence[float]) -> None:
+        self._registry = registry
+        self._name = name
+        self._buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        self._registry._observe(self._name, labels, bisect.bisect_left(self._buckets, value), value)
+
+
+class Registry:
+    def __init__(self, directory: str = METRICS_DIR, flush_s: float = METRICS_FLUSH_S) -> None:
+        self.directory = directory
+        self.flush_s = flush_s
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # the scrape and the flusher thread share one file
+        # name -> {"kind", "help", "labels", "buckets"?}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        # name -> labels -> value (counter/gauge) or [per-bucket counts..., +Inf count, sum] (histogram)
+        self._values: Dict[str, Dict[Labels, Any]] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._dirty = False
+        self._token = uuid.uuid4().hex[:8]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- declaration --
+
+    def _declare(self, name: str, kind: str, help: str, labels: Sequence[str], **extra: Any) -> None:
+        if name in self._meta:
+            raise ValueError(f"metric {name!r} is already registered")
+        self._meta[name] = {"kind": kind, "help": help, "labels": list(labels), **extra}
+        self._values[name] = {}
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        self._declare(name, "counter", help, labels)
+        return Counter(self, name)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        self._declare(name, "gauge", help, labels)
+        return Gauge(self, name)
+
+    def histogram(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS_S
+    ) -> Histogram:
+        self._declare(name, "histogram", help, labels, buckets=list(buckets))
+        return Histogram(self, name, buckets)
+
+    def collector(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Register `fn` to refresh gauges right before every snapshot (usable as a decorator)."""
+        self._collectors.append(fn)
+        return fn
+
+    # -- updates --
+
+    def _add(self, name: str, labels: Labels, amount: float) -> None:
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0.0) + amount
+            self._dirty = True
+
+    def _set(self, name: str, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[name][labels] = float(value)
+            self._dirty = True
+
+    def _observe(self, name: str, labels: Labels, bucket: int, value: float) -> None:
+        with self._lock:
+            series = self._values[name]
+            h = series.get(labels)
+            if h is None:
+                h = series[labels] = [0] * (len(self._meta[name]["buckets"]) + 1) + [0.0]
+            h[bucket] += 1
+            h[-1] += value
+            self._dirty = True
+
+    # -- snapshots --
+
+    def collect(self) -> None:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                # A broken collector must not take the other metrics down with it.
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process' metrics as plain JSON data."""
+        self.collect()
+        with self._lock:
+            self._dirty = False
+            return {
+                "pid": os.getpid(),
+                "metrics": {
+                    name: {
+                        **meta,
+                        "series": [
+                            [list(labels), list(v) if isinstance(v, list) else v]
+                            for labels, v in self._values[name].items()
+                        ],
+                    }
+                    for name, meta in self._meta.items()
+                },
+            }
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"metrics-{os.getpid()}-{self._token}.json")
+
+    def flush(self) -> None:
+        """Write this process' snapshot into the shared directory (no-op without one)."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        tmp = f"{path}.tmp"
+        with self._flush_lock:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f, separators=(",", ":"))
+            os.replace(tmp, path)
+
+    def gather(self) -> Dict[str, Dict[str, Any]]:
+        """Every process' metrics merged (just this process' without a shared directory)."""
+        if not self.directory:
+            return merge([(self.snapshot(), True)])
+        self.flush()
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith("metrics-") and entry.name.endswith(".json")):
+                continue
+            try:
+                with open(entry.path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue  # vanished or (pre-rename) partial: skip this round
+            snapshots.append((snap, _alive(int(snap.get("pid", 0)))))
+        return merge(snapshots)
+
+    def render(self) -> str:
+        return exposition(self.gather())
+
+    # -- background flushing --
+
+    def start(self) -> None:
+        """Flush every flush_s while anything changed (only with a shared directory)."""
+        if not self.directory or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ai-lab-metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_s):
+            # Gauges move without a metric update, so refresh them every round.
+            if self._dirty or self._collectors:
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+    def _after_fork(self) -> None:
+        # A forked worker starts from zero under its own file; the parent's values stay in the parent's file.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        for series in self._values.values():
+            series.clear()
+        self._token = uuid.uuid4().hex[:8]
+        self._stop = threading.Event()
+        self._thread = None
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots: Iterable[Tuple[Dict[str, Any], bool]]) -> Dict[str, Dict[str, Any]]:
+    """Merge (snapshot, process alive) pairs: sum counters and histograms, and the gauges of live processes."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snap, alive in snapshots:
+        for name, m in snap["metrics"].items():
+            if m["kind"] == "gauge" and not alive:
+                continue
+            into = merged.get(name)
+            if into is None:
+                into = merged[name] = {k: v for k, v in m.items() if k != "series"}
+                into["series"] = {}
+            elif into["kind"] != m["kind"] or into.get("buckets") != m.get("buckets"):
+                continue  # redefined by a newer deploy; keep the first definition
+            series = into["series"]
+            for labels, value in m["series"]:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    acc = series.get(key)
+                    series[key] = value if acc is None else [a + b for a, b in zip(acc, value)]
+                else:
+                    series[key] = series.get(key, 0.0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(x: float) -> str:
+    if x == int(x) and abs(x) < 1e15:
+        return str(int(x))
+    return repr(float(x))
+
+
+def exposition(metrics: Dict[str, Dict[str, Any]]) -> str:
+    """Render merged metrics in the Prometheus text format."""
+    lines: List[str] = []
+    for name in sorted(metrics):
+        m = metrics[name]
+        lines.append(f"# HELP {name} {m['help']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        names = m["labels"]
+        for labels in sorted(m["series"]):
+            value = m["series"][labels]
+            if m["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_num(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip([*map(repr, map(float, m["buckets"])), "+Inf"], value[:-1]):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_num(value[-1])}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry._after_fork)
+
+
+# ---------------- The lab's metrics ----------------
+#
+# Declared here so the exposition lists them (at zero) from the first scrape
+# on; the modules that own the measured code update them.
+
+HTTP_REQUESTS = registry.counter(
+    "ai_lab_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_DURATION = registry.histogram(
+    "ai_lab_http_request_duration_seconds", "Time to the response start, by route template.", ("method", "route")
+)
+STAGE_DURATION = registry.histogram(
+    "ai_lab_stage_duration_seconds",
+    "Request stage timings (the Server-Timing stages: validate, chunk, tokenize, score, db_insert, ...).",
+    ("method", "route", "stage"),
+)
+DB_COMMIT_DURATION = registry.histogram(
+    "ai_lab_db_commit_duration_seconds", "SQLite COMMIT duration, by DB file.", ("db",)
+)
+DB_LOCK_WAIT = registry.histogram(
+    "ai_lab_db_lock_wait_seconds",
+    "First write statement of a SQLite transaction, by DB file: waiting for the write lock plus that statement.",
+    ("db",),
+)
+DB_PENDING_WRITES = registry.gauge(
+    "ai_lab_db_pending_writes",
+    "DB writes queued or running on the writer threads (telemetry ingest is refused past AI_LAB_INGEST_MAX_PENDING).",
+)
+TELEMETRY_EVENTS = registry.counter(
+    "ai_lab_telemetry_events_total",
+    "Telemetry events received by /api/telemetry/event: stored, duplicate, sampled_out or rejected (429).",
+    ("outcome",),
+)
+BACKGROUND_FAILURES = registry.counter(
+    "ai_lab_background_task_failures_total",
+    "Background work (e.g. telemetry after a streamed RAG run) that raised, by coroutine.",
+    ("task",),
+)
+CACHE_REQUESTS = registry.counter(
+    "ai_lab_response_cache_requests_total", "Response cache lookups by result (hit or miss).", ("result",)
+)
+CACHE_BYTES = registry.gauge("ai_lab_response_cache_bytes", "Bytes held by the response cache.")
+CACHE_ENTRIES = registry.gauge("ai_lab_response_cache_entries", "Entries in the response cache.")
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# ---------------- RAG config optimizer ----------------
+#
+# Searches RAG configs (chunkSize x topK x requireCitations x retrieval x
+# sources) for the cheapest one that passes a question set, graded with
+# rag_run's own score/pass logic. A config passes when its pass rate over the
+# questions reaches `min_pass_rate`; its cost is the retrieved context it
+# feeds the answer (mean UTF-8 bytes per question).
+#
+# Candidates are evaluated in rungs on a growing prefix of the questions
+# (min_questions, then x eta, ... up to all of them):
+#
+#   early_stop  a candidate is dropped as soon as it has failed more questions
+#               than min_pass_rate allows. Exact: never drops a passing config.
+#   halving     early_stop, plus successive halving: after every rung only the
+#               best 1/eta of the survivors (pass rate so far, then cost) go on.
+#               Far fewer evaluations; may miss a passing config that started
+#               worse than cheaper ones that later fail.
+#   exhaustive  every candidate on every question (the baseline).
+#
+# Candidates share work: lexical rankings are a prefix of each other, so one
+# retrieval at the largest topK a rung needs serves every candidate with the
+# same (question, chunkSize, sources), whatever its topK or requireCitations.
+# Tokenization and chunk stores are the process-wide ones rag_run uses. The
+# retrievals of a rung run in parallel on a small thread pool.
+#
+# Configure via env:
+#   AI_LAB_OPTIMIZER_WORKERS          retrieval threads (default 4)
+#   AI_LAB_OPTIMIZER_MAX_CANDIDATES   max configs per search (default 512)
+#   AI_LAB_OPTIMIZER_MAX_QUESTIONS    max questions per search (default 100)
+#   AI_LAB_OPTIMIZER_KEEP_RUNS        leaderboard entries whose graded questions
+#                                     are stored as rag_runs (default 10)
+# -----------------------------------------------------------------------------
+
+OPTIMIZER_WORKERS = int(os.getenv("AI_LAB_OPTIMIZER_WORKERS", "4"))
+OPTIMIZER_MAX_CANDIDATES = int(os.getenv("AI_LAB_OPTIMIZER_MAX_CANDIDATES", "512"))
+OPTIMIZER_MAX_QUESTIONS = int(os.getenv("AI_LAB_OPTIMIZER_MAX_QUESTIONS", "100"))
+# Bounds one search's insert (KEEP_RUNS x MAX_QUESTIONS rows in one transaction
+# on the shard's writer), so telemetry writes queued behind it are not starved.
+OPTIMIZER_KEEP_RUNS = int(os.getenv("AI_LAB_OPTIMIZER_KEEP_RUNS", "10"))
+
+STRATEGIES = ("halving", "early_stop", "exhaustive")
+
+# The questions the lab docs are meant to answer.
+DEFAULT_QUESTIONS = [
+    "Should we auto restart the relay after an outage?",
+    "What context is required before authorizing a restart?",
+    "How do we handle prompt injection in operator messages?",
+    "What pass rate does the eval policy require before release?",
+    "When must the agent escalate instead of answering?",
+]
+
+# (question, chunk size, top k, retrieval mode, sources) -> [(score, chunk)], best first
+Retrieve = Callable[[str, str, int, str, Sequence[str]], List[Tuple[int, Any]]]
+# (retrieved, require citations) -> {"passed", "score", "answer", "citations", "retrieved"}
+Grade = Callable[[Sequence[Tuple[int, Any]], bool], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class Candidate:
+    chunk_size: str
+    top_k: int
+    require_citations: bool
+    retrieval: str = "lexical"
+    sources: Tuple[str, ...] = ("docs",)
+
+    def config(self) -> Dict[str, Any]:
+        """The RagConfig (by alias) rag_run would be called with."""
+        return {
+            "chunkSize": self.chunk_size,
+            "topK": self.top_k,
+            "requireCitations": self.require_citations,
+            "retrieval": self.retrieval,
+            "sources": list(self.sources),
+        }
+
+    def retrieval_key(self) -> Tuple[Any, ...]:
+        # Lexical top-k is a prefix of top-K (ties break on a fixed chunk rank),
+        # so only dense/hybrid candidates need a retrieval of their own topK.
+        top_k = None if self.retrieval == "lexical" else self.top_k
+        return (self.chunk_size, self.retrieval, self.sources, top_k)
+
+
+def candidates(
+    chunk_sizes: Sequence[str],
+    top_ks: Sequence[int],
+    require_citations: Sequence[bool] = (True,),
+    retrievals: Sequence[str] = ("lexical",),
+    sources: Sequence[Sequence[str]] = (("docs",),),
+) -> List[Candidate]:
+    """The config grid, in a stable order; raises ValueError when it is empty or too large."""
+    grid = [
+        Candidate(size, int(k), bool(cite), mode, tuple(dict.fromkeys(src)))
+        for size, k, cite, mode, src in itertools.product(
+            dict.fromkeys(chunk_sizes),
+            sorted(set(top_ks)),
+            dict.fromkeys(require_citations),
+            dict.fromkeys(retrievals),
+            sources,
+        )
+    ]
+    grid = list(dict.fromkeys(grid))
+    if not grid:
+        raise ValueError("the search space is empty")
+    if any(c.top_k < 1 for c in grid):
+        raise ValueError("topK values must be >= 1")
+    if len(grid) > OPTIMIZER_MAX_CANDIDATES:
+        raise ValueError(f"{len(grid)} candidate configs; at most {OPTIMIZER_MAX_CANDIDATES} per search")
+    return grid
+
+
+@dataclass
+class Trial:
+    candidate: Candidate
+    results: List[Dict[str, Any]] = field(default_factory=list)  # grade() output + contextBytes, per question
+    status: str = "running"  # running -> passed | failed | pruned
+    reason: Optional[str] = None
+
+    @property
+    def failures(self) -> int:
+        return sum(1 for r in self.results if not r["passed"])
+
+    @property
+    def pass_rate(self) -> float:
+        return 1.0 - self.failures / len(self.results) if self.results else 0.0
+
+    @property
+    def mean_score(self) -> float:
+        return sum(r["score"] for r in self.results) / len(self.results) if self.results else 0.0
+
+    @property
+    def cost(self) -> float:
+        return sum(r["contextBytes"] for r in self.results) / len(self.results) if self.results else 0.0
+
+    def entry(self) -> Dict[str, Any]:
+        return {
+            "config": self.candidate.config(),
+            "status": self.status,
+            "reason": self.reason,
+            "questions": len(self.results),
+            "passRate": round(self.pass_rate, 4),
+            "meanScore": round(self.mean_score, 2),
+            "contextBytes": round(self.cost, 1),
+        }
+
+
+def rungs(n_questions: int, strategy: str, min_questions: int, eta: int) -> List[int]:
+    """Question budgets (prefix lengths) of successive rungs."""
+    if strategy == "exhaustive":
+        return [n_questions]
+    budgets = []
+    b = max(1, min(min_questions, n_questions))
+    while b < n_questions:
+        budgets.append(b)
+        b *= eta
+    return budgets + [n_questions]
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=max(1, OPTIMIZER_WORKERS), thread_name_prefix="ai-lab-optimizer")
+    return _pool
+
+
+def search(
+    grid: Sequence[Candidate],
+    questions: Sequence[str],
+    retrieve: Retrieve,
+    grade: Grade,
+    *,
+    min_pass_rate: float = 0.8,
+    strategy: str = "halving",
+    eta: int = 2,
+    min_questions: int = 2,
+) -> Dict[str, Any]:
+    """
+    Run one search. Returns {"best", "leaderboard", "trials", "stats"}:
+    `best` is the cheapest passing leaderboard entry (None if no config
+    passed), `trials` parallels the leaderboard with every graded question.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+    if not questions:
+        raise ValueError("the question set is empty")
+    if len(questions) > OPTIMIZER_MAX_QUESTIONS:
+        raise ValueError(f"{len(questions)} questions; at most {OPTIMIZER_MAX_QUESTIONS} per search")
+
+    t0 = time.perf_counter()
+    n = len(questions)
+    allowed_failures = math.floor((1.0 - min_pass_rate) * n + 1e-9)
+    trials = [Trial(c) for c in grid]
+    alive = list(trials)
+    retrievals = 0
+
+    for budget in rungs(n, strategy, min_questions, eta):
+        # One retrieval per (question, retrieval key), deep enough for every candidate sharing it.
+        depth: Dict[Tuple[int, Tuple[Any, ...]], int] = {}
+        for t in alive:
+            for q in range(len(t.results), budget):
+                key = (q, t.candidate.retrieval_key())
+                depth[key] = max(depth.get(key, 0), t.candidate.top_k)
+        jobs = {
+            key: _executor().submit(retrieve, questions[key[0]], key[1][0], k, key[1][1], key[1][2])
+            for key, k in depth.items()
+        }
+        ranked = {key: job.result() for key, job in jobs.items()}
+        retrievals += len(ranked)
+
+        for t in alive:
+            c = t.candidate
+            for q in range(len(t.results), budget):
+                top = ranked[(q, c.retrieval_key())][: c.top_k]
+                graded = grade(top, c.require_citations)
+                graded["contextBytes"] = sum(len(ref.view()) for _, ref in top)
+                t.results.append(graded)
+            if strategy != "exhaustive" and t.failures > allowed_failures:
+                t.status, t.reason = "failed", f"failed {t.failures} of {len(t.results)} questions"
+        alive = [t for t in alive if t.status == "running"]
+
+        if strategy == "halving" and budget < n and len(alive) > 1:
+            alive.sort(key=lambda t: (-t.pass_rate, t.cost))
+            keep = max(1, math.ceil(len(alive) / eta))
+            for t in alive[keep:]:
+                t.status, t.reason = "pruned", f"halving after {budget} questions"
+            alive = alive[:keep]
+
+    for t in alive:
+        t.status = "passed" if t.pass_rate >= min_pass_rate - 1e-9 else "failed"
+
+    status_order = {"passed": 0, "pruned": 1, "failed": 2}
+    trials.sort(key=lambda t: (status_order[t.status], t.cost if t.status == "passed" else -len(t.results), -t.pass_rate, t.cost))
+    leaderboard = [dict(t.entry(), rank=i + 1) for i, t in enumerate(trials)]
+    evaluations = sum(len(t.results) for t in trials)
+    return {
+        "best": leaderboard[0] if trials[0].status == "passed" else None,
+        "leaderboard": leaderboard,
+        "trials": trials,
+        "stats": {
+            "strategy": strategy,
+            "candidates": len(trials),
+            "questions": n,
+            "evaluations": evaluations,
+            "exhaustiveEvaluations": len(trials) * n,
+            "retrievals": retrievals,
+            "searchMs": round((time.perf_counter() - t0) * 1000, 2),
+        },
+    }
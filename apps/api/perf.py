@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+
+from . import metrics
+
+# ---------------- Per-request stage timings ----------------
+#
+# Handlers wrap their hot sections in `span("stage")`. PerfMiddleware owns one
+# RequestTimings per request, reports it in a `Server-Timing` header and feeds
+# rolling per-route histograms that /api/perf serves.
+#
+# Configure via env:
+#   AI_LAB_PERF_WINDOW=2048   samples kept per route/stage
+# -----------------------------------------------------------------------------
+
+PERF_WINDOW = int(os.getenv("AI_LAB_PERF_WINDOW", "2048"))
+
+# Upper bounds (ms) of the histogram buckets; anything slower lands in "+Inf".
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestTimings:
+    __slots__ = ("started", "stages", "endpoint_started", "endpoint_finished", "responded")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+        self.responded: Optional[float] = None
+
+    def add(self, name: str, ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def mark_response_start(self) -> None:
+        """
+        Called once headers are about to go out. Everything before the endpoint
+        ran is request parsing + validation; everything after it returned is
+        response_model validation + JSON rendering. Both are added to what the
+        handler timed itself under the same names (e.g. a `span("serialize")`
+        around encoding its own response bytes).
+        """
+        self.responded = time.perf_counter()
+        if self.endpoint_started is not None:
+            self.add("validate", (self.endpoint_started - self.started) * 1000)
+        if self.endpoint_finished is not None:
+            self.add("serialize", (self.responded - self.endpoint_finished) * 1000)
+
+    def total_ms(self) -> float:
+        end = self.responded if self.responded is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("ai_lab_request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block and add it to the current request's stages (no-op outside a request)."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - t0) * 1000)
+
+
+# ---------------- Rolling histograms ----------------
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round((p / 100.0) * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+class PerfRegistry:
+    def __init__(self, window: int = PERF_WINDOW) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        # route -> stage -> most recent samples (ms)
+        self._samples: Dict[str, Dict[str, Deque[float]]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, route: str, timings: RequestTimings) -> None:
+        total = timings.total_ms()
+        with self._lock:
+            stages = self._samples.setdefault(route, {})
+            for name, ms in list(timings.stages.items()) + [("total", total)]:
+                dq = stages.get(name)
+                if dq is None:
+                    dq = stages[name] = deque(maxlen=self.window)
+                dq.append(ms)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+    def snapshot(self, route: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            copied = {
+                r: {name: list(dq) for name, dq in stages.items()}
+                for r, stages in self._samples.items()
+                if route is None or r == route
+            }
+            counts = dict(self._counts)
+
+        routes: Dict[str, Any] = {}
+        for r, stages in copied.items():
+            routes[r] = {
+                "requests": counts.get(r, 0),
+                "stages": {name: _summarize(vals) for name, vals in stages.items()},
+            }
+        return {"window": self.window, "boundsMs": list(HISTOGRAM_BOUNDS_MS), "routes": routes}
+
+
+def _summarize(values: List[float]) -> Dict[str, Any]:
+    v = sorted(values)
+    buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for x in v:
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if x <= bound:
+                buckets[i] += 1
+                break
+        else:
+            buckets[-1] += 1
+
+    def rnd(x: Optional[float]) -> Optional[float]:
+        return round(x, 3) if x is not None else None
+
+    return {
+        "samples": len(v),
+        "meanMs": rnd(sum(v) / len(v)) if v else None,
+        "p50Ms": rnd(_percentile(v, 50)),
+        "p95Ms": rnd(_percentile(v, 95)),
+        "p99Ms": rnd(_percentile(v, 99)),
+        "maxMs": rnd(v[-1]) if v else None,
+        "histogram": buckets,
+    }
+
+
+registry = PerfRegistry()
+
+
+# ---------------- ASGI wiring ----------------
+
+def route_key(scope: Dict[str, Any]) -> str:
+    """Group by route template (/api/artifacts/rag/{run_id}), not the concrete path."""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+class PerfMiddleware:
+    """Outermost ASGI middleware: owns the request's timings and emits Server-Timing."""
+
+    def __init__(self, app: Callable, registry: PerfRegistry = registry) -> None:
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500  # unless a response starts
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings.mark_response_start()
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.registry.record(route_key(scope), timings)
+            export_metrics(scope, status, timings)
+
+
+def export_metrics(scope: Dict[str, Any], status: int, timings: RequestTimings) -> None:
+    """Count the request and its stage timings in the Prometheus metrics (apps/api/metrics.py)."""
+    method = scope.get("method", "")
+    # Unmatched paths share one label, so scanners cannot blow up the series count.
+    route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+    metrics.HTTP_REQUESTS.inc(method, route, str(status))
+    metrics.HTTP_DURATION.observe(timings.total_ms() / 1000, method, route)
+    for name, ms in timings.stages.items():
+        metrics.STAGE_DURATION.observe(ms / 1000, method, route, name)
+
+
+def _mark_endpoint(call: Callable) -> Callable:
+    if asyncio.iscoroutinefunction(call):
+        async def timed_async(**values: Any) -> Any:
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_started = time.perf_counter()
+            try:
+                return await call(**values)
+            finally:
+                if timings is not None:
+                    timings.endpoint_finished = time.perf_counter()
+
+        return timed_async
+
+    def timed_sync(**values: Any) -> Any:
+        timings = _current.get()
+        if timings is not None:
+            timings.endpoint_started = time.perf_counter()
+        try:
+            return call(**values)
+        finally:
+            if timings is not None:
+                timings.endpoint_finished = time.perf_counter()
+
+    return timed_sync
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that marks when the endpoint function starts/returns, so the
+    middleware can split request validation and response serialization out of
+    the handler time. The dependant is already analysed at this point, so
+    swapping `dependant.call` does not affect parameter resolution.
+    """
+
+    def get_route_handler(self) -> Callable:
+        if self.dependant.call is not None and not getattr(self.dependant.call, "_perf_marked", False):
+            marked = _mark_endpoint(self.dependant.call)
+            marked._perf_marked = True  # type: ignore[attr-defined]
+            self.dependant.call = marked
+        return super().get_route_handler()
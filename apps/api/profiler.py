@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+# ---------------- On-demand sampling profiler ----------------
+#
+# Samples every thread's Python stack with sys._current_frames() from a
+# background thread and folds the stacks into the collapsed format understood by
+# flamegraph.pl / speedscope / inferno:
+#
+#   thread;outer (file.py);inner (file.py) 42
+#
+# Nothing is installed in the interpreter (no settrace/setprofile), so the cost
+# is one frame walk per thread per interval, and only while a profile runs.
+#
+# Configure via env:
+#   AI_LAB_PROFILER_ENABLED=1        expose POST /api/admin/profile
+#   AI_LAB_PROFILER_TOKEN=<secret>   required in the X-Admin-Token header
+#   AI_LAB_PROFILER_MAX_SECONDS=60   upper bound for a single profile
+# -----------------------------------------------------------------------------
+
+MAX_SECONDS = float(os.getenv("AI_LAB_PROFILER_MAX_SECONDS", "60"))
+MIN_INTERVAL_MS = 1.0
+
+_running = threading.Lock()
+
+
+def profiler_enabled() -> bool:
+    return os.getenv("AI_LAB_PROFILER_ENABLED", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def check_token(supplied: Optional[str]) -> bool:
+    expected = os.getenv("AI_LAB_PROFILER_TOKEN", "")
+    # An enabled profiler without a token is treated as locked, never as open.
+    if not expected or not supplied:
+        return False
+    return secrets.compare_digest(expected.encode(), supplied.encode())
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    # Keep labels short but unambiguous: "package/module.py" instead of a full path.
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    short = "/".join(parts[-2:]) if len(parts) > 1 else filename
+    return f"{code.co_name} ({short})"
+
+
+def _collapse(frame, thread_name: str, with_lines: bool) -> str:
+    stack: List[str] = []
+    while frame is not None:
+        label = _frame_label(frame.f_code)
+        if with_lines:
+            label = f"{label[:-1]}:{frame.f_lineno})"
+        stack.append(label)
+        frame = frame.f_back
+    stack.append(thread_name)
+    stack.reverse()
+    return ";".join(stack)
+
+
+def sample(seconds: float, interval_ms: float = 5.0, with_lines: bool = False) -> Dict[str, object]:
+    """
+    Profile the whole process for `seconds`. Blocks the calling thread, which is
+    excluded from the samples. Only one profile may run at a time.
+    """
+    seconds = float(seconds)
+    seconds = max(0.1, min(seconds, MAX_SECONDS)) if math.isfinite(seconds) else MAX_SECONDS
+    # At most one interval per profile: a huge (or inf/nan) interval must not outlive the deadline.
+    interval_ms = float(interval_ms)
+    interval_ms = min(interval_ms, seconds * 1000.0) if math.isfinite(interval_ms) else seconds * 1000.0
+    interval = max(MIN_INTERVAL_MS, interval_ms) / 1000.0
+
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_tick = started
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stacks[_collapse(frame, names.get(ident, f"thread-{ident}"), with_lines)] += 1
+            samples += 1
+
+            next_tick += interval
+            now = time.perf_counter()
+            delay = next_tick - now
+            if delay > 0:
+                time.sleep(min(delay, deadline - now))
+            else:
+                # We fell behind (GIL contention); don't try to catch up in a burst.
+                next_tick = time.perf_counter()
+
+        elapsed = time.perf_counter() - started
+    finally:
+        _running.release()
+
+    return {
+        "seconds": round(elapsed, 3),
+        "intervalMs": interval * 1000.0,
+        "samples": samples,
+        "stacks": stacks,
+    }
+
+
+def sample_in_thread(seconds: float, interval_ms: float = 5.0, with_lines: bool = False) -> "Future[Dict[str, object]]":
+    """Run sample() on a thread of its own; the future fails with ProfilerBusy if one is already running."""
+    future: "Future[Dict[str, object]]" = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(sample(seconds, interval_ms, with_lines))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="ai-lab-profiler", daemon=True).start()
+    return future
+
+
+def to_collapsed(stacks: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass, fields, replace
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# ---------------- Whiteboard referee ----------------
+#
+# The gate rules behind /api/station/whiteboard, in two forms that must agree:
+#
+#   judge()        one request, plain Python (the interactive endpoint)
+#   judge_batch()  arrays of states in one vectorized NumPy pass (what-if sweeps,
+#                  precomputed verdict maps for the HUD)
+#
+# A state fails a gate when it is below a minimum or above a maximum; each
+# failed gate sets one bit of the reason mask (REASON_CODES). No failed gate
+# means SHIP; otherwise risk or regulatory heat at/above the block line means
+# BLOCK, and anything else is REVISE.
+#
+# Thresholds are per scenario. Overrides are layered: built-in defaults, then
+# "*", then the scenario's own entry; batch requests can add a what-if layer.
+#
+# Configure via env:
+#   AI_LAB_REFEREE_THRESHOLDS   JSON of threshold overrides keyed by scenario id
+#                               or "*", e.g.
+#                               {"*": {"maxRisk": 55}, "dayzero-utility-outage": {"minEvalPassRate": 85}}
+#   AI_LAB_REFEREE_MAX_BATCH    max states per batch request (default 100000)
+# -----------------------------------------------------------------------------
+
+REFEREE_MAX_BATCH = int(os.getenv("AI_LAB_REFEREE_MAX_BATCH", "100000"))
+
+VERDICTS = ("SHIP", "REVISE", "BLOCK")
+SHIP, REVISE, BLOCK = 0, 1, 2
+
+R_TALKED_TO = 1
+R_RAG = 2
+R_EVAL = 4
+R_RISK = 8
+R_REG_HEAT = 16
+R_RELIABILITY = 32
+
+REASON_CODES = {
+    "talkedTo": R_TALKED_TO,
+    "ragFailed": R_RAG,
+    "evalPassRate": R_EVAL,
+    "risk": R_RISK,
+    "regHeat": R_REG_HEAT,
+    "reliability": R_RELIABILITY,
+}
+
+# Meter deltas the verdict applies, indexed by verdict code.
+VERDICT_EFFECTS = (
+    {"reliability": 2, "cost": 0, "risk": -1, "regHeat": -1},
+    {"reliability": 0, "cost": 0, "risk": 0, "regHeat": 0},
+    {"reliability": 0, "cost": 0, "risk": 1, "regHeat": 1},
+)
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    minTalkedTo: int = 4
+    minEvalPassRate: int = 80
+    maxRisk: int = 60
+    maxRegHeat: int = 60
+    minReliability: int = 55
+    blockRisk: int = 80
+    blockRegHeat: int = 80
+
+    def override(self, values: Optional[Mapping[str, Any]]) -> "Thresholds":
+        if not values:
+            return self
+        known = {f.name for f in fields(self)}
+        unknown = sorted(set(values) - known)
+        if unknown:
+            raise ValueError(f"unknown referee thresholds {unknown}; expected some of {sorted(known)}")
+        return replace(self, **{k: int(v) for k, v in values.items()})
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class ThresholdBook:
+    def __init__(self, overrides: Optional[Mapping[str, Mapping[str, Any]]] = None) -> None:
+        base = Thresholds().override((overrides or {}).get("*"))
+        self.default = base
+        self._by_scenario = {
+            scenario_id: base.override(values)
+            for scenario_id, values in (overrides or {}).items()
+            if scenario_id != "*"
+        }
+
+    @classmethod
+    def from_env(cls) -> "ThresholdBook":
+        return cls(json.loads(os.getenv("AI_LAB_REFEREE_THRESHOLDS", "") or "{}"))
+
+    def for_scenario(self, scenario_id: str) -> Thresholds:
+        return self._by_scenario.get(scenario_id, self.default)
+
+
+def judge(
+    talked_to: int,
+    rag_passed: bool,
+    eval_pass_rate: int,
+    risk: int,
+    reg_heat: int,
+    reliability: int,
+    t: Thresholds,
+) -> Tuple[int, int]:
+    """(verdict code, reason mask) for one state."""
+    mask = 0
+    if talked_to < t.minTalkedTo:
+        mask |= R_TALKED_TO
+    if not rag_passed:
+        mask |= R_RAG
+    if eval_pass_rate < t.minEvalPassRate:
+        mask |= R_EVAL
+    if risk > t.maxRisk:
+        mask |= R_RISK
+    if reg_heat > t.maxRegHeat:
+        mask |= R_REG_HEAT
+    if reliability < t.minReliability:
+        mask |= R_RELIABILITY
+
+    if not mask:
+        return SHIP, mask
+    if risk >= t.blockRisk or reg_heat >= t.blockRegHeat:
+        return BLOCK, mask
+    return REVISE, mask
+
+
+def reason_lines(
+    mask: int, talked_to: int, eval_pass_rate: int, risk: int, reg_heat: int, reliability: int, t: Thresholds
+) -> List[str]:
+    """Player-facing text for each bit of a reason mask, in gate order."""
+    reasons: List[str] = []
+    if mask & R_TALKED_TO:
+        if t.minTalkedTo == 4:
+            reasons.append("You have not consulted all four council members.")
+        else:
+            reasons.append(f"You have consulted {talked_to} of the {t.minTalkedTo} required council members.")
+    if mask & R_RAG:
+        reasons.append("RAG Test Rig did not pass.")
+    if mask & R_EVAL:
+        reasons.append(f"Eval pass rate too low ({eval_pass_rate}% < {t.minEvalPassRate}%).")
+    if mask & R_RISK:
+        reasons.append(f"Risk too high ({risk} > {t.maxRisk}).")
+    if mask & R_REG_HEAT:
+        reasons.append(f"Regulatory heat too high ({reg_heat} > {t.maxRegHeat}).")
+    if mask & R_RELIABILITY:
+        reasons.append(f"Reliability too low ({reliability} < {t.minReliability}).")
+    return reasons
+
+
+def judge_batch(
+    talked_to: Sequence[int],
+    rag_passed: Sequence[bool],
+    eval_pass_rate: Sequence[int],
+    risk: Sequence[int],
+    reg_heat: Sequence[int],
+    reliability: Sequence[int],
+    t: Thresholds,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Vectorized judge(): (verdict codes, reason masks) as uint8 arrays.
+
+    Columns broadcast against each other, so a column of length 1 applies to
+    every state (e.g. sweep the meters for a fixed eval pass rate).
+    """
+    import numpy as np  # only batch sweeps pay for it
+
+    talked_to, rag_passed, eval_pass_rate, risk, reg_heat, reliability = np.broadcast_arrays(
+        np.asarray(talked_to, dtype=np.int64),
+        np.asarray(rag_passed, dtype=bool),
+        np.asarray(eval_pass_rate, dtype=np.int64),
+        np.asarray(risk, dtype=np.int64),
+        np.asarray(reg_heat, dtype=np.int64),
+        np.asarray(reliability, dtype=np.int64),
+    )
+    mask = np.zeros(risk.shape, dtype=np.uint8)
+    for failed, bit in (
+        (talked_to < t.minTalkedTo, R_TALKED_TO),
+        (~rag_passed, R_RAG),
+        (eval_pass_rate < t.minEvalPassRate, R_EVAL),
+        (risk > t.maxRisk, R_RISK),
+        (reg_heat > t.maxRegHeat, R_REG_HEAT),
+        (reliability < t.minReliability, R_RELIABILITY),
+    ):
+        mask |= failed.astype(np.uint8) * np.uint8(bit)
+
+    blocked = (risk >= t.blockRisk) | (reg_heat >= t.blockRegHeat)
+    verdicts = np.where(mask == 0, SHIP, np.where(blocked, BLOCK, REVISE)).astype(np.uint8)
+    return verdicts, mask
+
+
+def verdict_counts(verdicts: "np.ndarray") -> List[int]:
+    """Number of states per verdict code."""
+    import numpy as np
+
+    return np.bincount(verdicts, minlength=len(VERDICTS)).tolist()
+
+
+thresholds = ThresholdBook.from_env()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from . import db
+
+# ---------------- Storage interfaces ----------------
+#
+# Route handlers talk to these repositories instead of to sqlite3 helpers, so
+# the transactional store and the analytics engine can be swapped
+# independently:
+#
+#   runs        RunsRepository       rag/eval run artifacts        (SQLite)
+#   telemetry   TelemetryRepository  event ingestion + raw reads   (SQLite)
+#   analytics   TelemetryAnalytics   summary/timeseries aggregates (see analytics.py)
+#
+# Every method is blocking; callers run them on db.executor.
+#
+# Configure via env:
+#   AI_LAB_ANALYTICS=sqlite   aggregate in Python over rows read from SQLite (default)
+#   AI_LAB_ANALYTICS=duckdb   aggregate in an embedded DuckDB copy of the telemetry
+#                             (requires `pip install duckdb`)
+# -----------------------------------------------------------------------------
+
+
+class RunsRepository(Protocol):
+    def insert_rag_run(self, **fields: Any) -> str: ...
+    def list_rag_runs(self, limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]: ...
+    def get_rag_run(self, run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]: ...
+    def insert_eval_run(self, **fields: Any) -> str: ...
+    def list_eval_runs(self, limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]: ...
+    def get_eval_run(self, run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]: ...
+    def config_stats(self, scenario_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]: ...
+    def insert_rag_search(self, **fields: Any) -> Tuple[str, str]: ...
+    def get_rag_search(self, search_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]: ...
+    def list_rag_searches(self, limit: int = 20, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]: ...
+
+
+class TelemetryRepository(Protocol):
+    def insert_event(self, **fields: Any) -> str: ...
+    def insert_events(self, events: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]: ...
+    def list_events(
+        self, *, scenario_id: Optional[str] = None, since_iso: Optional[str] = None, limit: int = 2000
+    ) -> List[Dict[str, Any]]: ...
+
+    # Incremental export for analytics copies: raw rows of one DB file by rowid.
+    def generation(self) -> int: ...
+    def shards(self) -> List[str]: ...
+    def max_rowid(self, shard: str) -> int: ...
+    def export_rows(self, shard: str, after_rowid: int, generation: int, limit: int) -> List[Any]: ...
+
+
+class TelemetryAnalytics(Protocol):
+    name: str
+
+    def summary(self, scenario_id: str, since_iso: str) -> Dict[str, Any]: ...
+    def timeseries(self, scenario_id: str, since_iso: str, metric: str, bucket_sec: int) -> List[Tuple[int, float]]: ...
+    def sync(self) -> int: ...
+
+
+class SqliteRunsRepository:
+    def insert_rag_run(self, **fields: Any) -> str:
+        return db.insert_rag_run(**fields)
+
+    def list_rag_runs(self, limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return db.list_rag_runs(limit, scenario_id)
+
+    def get_rag_run(self, run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return db.get_rag_run(run_id, scenario_id)
+
+    def insert_eval_run(self, **fields: Any) -> str:
+        return db.insert_eval_run(**fields)
+
+    def list_eval_runs(self, limit: int = 50, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return db.list_eval_runs(limit, scenario_id)
+
+    def get_eval_run(self, run_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return db.get_eval_run(run_id, scenario_id)
+
+    def config_stats(self, scenario_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        return db.config_stats(scenario_id)
+
+    def insert_rag_search(self, **fields: Any) -> Tuple[str, str]:
+        return db.insert_rag_search(**fields)
+
+    def get_rag_search(self, search_id: str, scenario_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return db.get_rag_search(search_id, scenario_id)
+
+    def list_rag_searches(self, limit: int = 20, scenario_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return db.list_rag_searches(limit, scenario_id)
+
+
+class SqliteTelemetryRepository:
+    def insert_event(self, **fields: Any) -> str:
+        return db.insert_telemetry_event(**fields)
+
+    def insert_events(self, events: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        return db.insert_telemetry_events(events)
+
+    def list_events(
+        self, *, scenario_id: Optional[str] = None, since_iso: Optional[str] = None, limit: int = 2000
+    ) -> List[Dict[str, Any]]:
+        return db.list_telemetry_events(scenario_id=scenario_id, since_iso=since_iso, limit=limit)
+
+    def generation(self) -> int:
+        return db.current_generation()
+
+    def shards(self) -> List[str]:
+        return db.shard_paths()
+
+    def max_rowid(self, shard: str) -> int:
+        return db.telemetry_max_rowid(shard)
+
+    def export_rows(self, shard: str, after_rowid: int, generation: int, limit: int) -> List[Any]:
+        return db.export_telemetry_rows(shard, after_rowid, generation, limit)
+
+
+def make_analytics(kind: str, telemetry: TelemetryRepository) -> TelemetryAnalytics:
+    from . import analytics
+
+    if kind == "duckdb":
+        return analytics.DuckDbAnalytics(telemetry)
+    if kind in ("", "sqlite"):
+        return analytics.ScanAnalytics(telemetry)
+    raise ValueError(f"AI_LAB_ANALYTICS must be 'sqlite' or 'duckdb', got {kind!r}")
+
+
+runs: RunsRepository = SqliteRunsRepository()
+telemetry: TelemetryRepository = SqliteTelemetryRepository()
+analytics: TelemetryAnalytics = make_analytics(os.getenv("AI_LAB_ANALYTICS", "sqlite").strip().lower(), telemetry)
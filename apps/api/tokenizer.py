@@ -0,0 +1,155 @@
+"""
+Tokenizer shared by index builds and queries.
+
+Normalization is the historical `re.sub(r"[^a-z0-9\\s]", " ", s.lower())`:
+keep ASCII letters/digits and whitespace, blank out everything else, then
+split and drop tokens shorter than three characters. For ASCII input the same
+result comes from one C-level `bytes.translate` with a precomputed 256-byte
+table (which also folds case); non-ASCII input falls back to the regex so the
+output is identical for every string.
+
+A corpus can opt into stopword removal and light suffix stemming with a
+`tokenizer.json` next to its docs, e.g.
+
+    {"stopwords": "english", "stem": true, "minLen": 3}
+
+The config is recorded in the index bundle so queries are always tokenized
+the way the index was built.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+_NON_TOKEN_RE = re.compile(r"[^a-z0-9\s]")
+
+# Byte table: A-Z -> a-z, letters/digits/whitespace kept, everything else -> " ".
+# Built from the regex itself so both paths agree by construction (bytes >= 128
+# never occur: only ASCII strings take this path).
+_ASCII_TABLE = bytes(
+    ord(_NON_TOKEN_RE.sub(" ", chr(c).lower())) if c < 128 else 0x20 for c in range(256)
+)
+
+# Bulk tokenization joins texts with a separator that survives normalization.
+_SEP = "\x00"
+_BULK_TABLE = b"\x00" + _ASCII_TABLE[1:]
+
+ENGLISH_STOPWORDS = frozenset(
+    """
+    about above after again against all and any are because been before being below between both
+    but can could did does doing down during each few for from further had has have having her here
+    hers herself him himself his how into its itself just more most myself nor not now off once only
+    other our ours ourselves out over own same she should some such than that the their theirs them
+    themselves then there these they this those through too under until very was were what when where
+    which while who whom why will with would you your yours yourself yourselves
+    """.split()
+)
+
+_STOPWORD_SETS = {"english": ENGLISH_STOPWORDS}
+
+
+def _normalize(s: str) -> str:
+    if s.isascii():
+        return s.encode("ascii").translate(_ASCII_TABLE).decode("ascii")
+    return _NON_TOKEN_RE.sub(" ", s.lower())
+
+
+def tokenize(s: str) -> set[str]:
+    """Default tokenization (no stopwords, no stemming)."""
+    return {t for t in _normalize(s).split() if len(t) > 2}
+
+
+def light_stem(t: str) -> str:
+    """
+    Conservative suffix stripping ("restarts"/"restarted"/"restarting" ->
+    "restart"). Deliberately much weaker than Porter: it only has to make
+    paraphrases overlap, and never shortens a token below three characters.
+    """
+    n = len(t)
+    if n > 5 and t.endswith("ing"):
+        return t[:-3]
+    if n > 4 and t.endswith("ies"):
+        return t[:-3] + "y"
+    if n > 4 and t.endswith("ed"):
+        return t[:-2]
+    if n > 4 and t.endswith("es") and t[-3] in "sxz":
+        return t[:-2]
+    if n > 3 and t.endswith("s") and not t.endswith("ss"):
+        return t[:-1]
+    return t
+
+
+@dataclass(frozen=True)
+class TokenizerConfig:
+    min_len: int = 3
+    stopwords: FrozenSet[str] = field(default_factory=frozenset)
+    stem: bool = False
+
+    @classmethod
+    def from_dict(cls, raw: Optional[Dict[str, Any]]) -> "TokenizerConfig":
+        raw = raw or {}
+        sw = raw.get("stopwords") or ()
+        if isinstance(sw, str):
+            sw = _STOPWORD_SETS[sw]
+        return cls(min_len=int(raw.get("minLen", 3)), stopwords=frozenset(sw), stem=bool(raw.get("stem", False)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        return {"minLen": d["min_len"], "stopwords": sorted(d["stopwords"]), "stem": d["stem"]}
+
+    @property
+    def is_default(self) -> bool:
+        return self.min_len == 3 and not self.stopwords and not self.stem
+
+
+def load_config(docs_dir: Path) -> TokenizerConfig:
+    p = docs_dir / "tokenizer.json"
+    if not p.exists():
+        return TokenizerConfig()
+    return TokenizerConfig.from_dict(json.loads(p.read_text()))
+
+
+class Tokenizer:
+    """Tokenizer for one corpus config, with a memo cache for repeated queries."""
+
+    def __init__(self, config: TokenizerConfig = TokenizerConfig(), query_cache_size: int = 4096) -> None:
+        self.config = config
+        self.query = lru_cache(maxsize=query_cache_size)(self._query)
+
+    def _finish(self, raw_tokens: Iterable[str]) -> set[str]:
+        cfg = self.config
+        min_len = cfg.min_len
+        toks = {t for t in raw_tokens if len(t) >= min_len}
+        if cfg.stopwords:
+            toks -= cfg.stopwords
+        if cfg.stem:
+            toks = {light_stem(t) for t in toks}
+        return toks
+
+    def tokenize(self, s: str) -> set[str]:
+        if self.config.is_default:
+            return tokenize(s)
+        return self._finish(_normalize(s).split())
+
+    def _query(self, s: str) -> FrozenSet[str]:
+        return frozenset(self.tokenize(s))
+
+    def tokenize_many(self, texts: List[str]) -> List[set[str]]:
+        """
+        Tokenize a batch in one normalization pass. ASCII batches are joined,
+        translated and split once, which removes the per-call overhead that
+        dominates on short chunks.
+        """
+        if not texts:
+            return []
+        joined = _SEP.join(texts)
+        if not joined.isascii() or joined.count(_SEP) != len(texts) - 1:
+            return [self.tokenize(t) for t in texts]
+        parts = joined.encode("ascii").translate(_BULK_TABLE).decode("ascii").split(_SEP)
+        if self.config.is_default:
+            return [{t for t in p.split() if len(t) > 2} for p in parts]
+        return [self._finish(p.split()) for p in parts]
@@ -0,0 +1,2 @@
+# Benchmark + load-test tooling for the FastAPI backend (apps/api).
+# Nothing in here is imported by the app itself.
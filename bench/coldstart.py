@@ -0,0 +1,181 @@
+"""
+Cold-start benchmark for the serverless entrypoints.
+
+    python -m bench.coldstart --entry api.index --runs 20
+    python -m bench.coldstart --entry api.backend --index build --importtime 25
+
+Every run is a fresh interpreter with its own empty temp DB and index dir, like
+a new function instance. It imports the entrypoint and then sends the first
+requests a player's session makes (NPC script, RAG run, artifact list)
+straight to the ASGI app, without lifespan events. Reported per phase
+(p50/p95/max ms):
+
+    process        interpreter spawn -> first responses done
+    import         importing the entrypoint module
+    firstResponse  import + the first request
+    <request>      each first request on its own
+
+--index picks where the retrieval index comes from:
+    snapshot   a deploy-time snapshot (`python -m apps.api.index snapshot`), built once (default)
+    build      none: the first RAG request builds it
+    warm       a shared index dir built before the runs (a long-lived host)
+
+--importtime N adds one run under `python -X importtime` and lists the N
+modules with the largest self time.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+FIRST_REQUESTS = [
+    ("agent", "GET", "/api/agent/mlengineer", None),
+    ("rag_run", "POST", "/api/rag/run", {
+        "config": {"chunkSize": "small", "topK": 3, "requireCitations": True},
+        "question": "Should we auto restart the relay after an outage?",
+    }),
+    ("artifacts", "GET", "/api/artifacts/rag?limit=5", None),
+]
+
+PREFIXES = {"api.backend": "/api/backend"}
+
+
+# ---------------- Child (one cold start) ----------------
+
+def _child(entry: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    app = importlib.import_module(entry).app
+    out: Dict[str, Any] = {"import": (time.perf_counter() - t0) * 1000}
+
+    from bench.loadtest import InProcessTransport
+
+    transport = InProcessTransport(app)
+    prefix = PREFIXES.get(entry, "")
+
+    async def first_requests() -> None:
+        for name, method, path, payload in FIRST_REQUESTS:
+            t = time.perf_counter()
+            resp = await transport.request(method, prefix + path, payload)
+            out[name] = (time.perf_counter() - t) * 1000
+            if resp.status >= 400:
+                raise SystemExit(f"{name}: HTTP {resp.status} {resp.body[:200]!r}")
+
+    asyncio.run(first_requests())
+    out["firstResponse"] = out["import"] + out[FIRST_REQUESTS[0][0]]
+    return out
+
+
+# ---------------- Parent ----------------
+
+def _env(run_dir: str, index_dir: Optional[str], snapshot_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    env["AI_LAB_DB_PATH"] = os.path.join(run_dir, "ai_lab.db")
+    env["AI_LAB_INDEX_DIR"] = index_dir or os.path.join(run_dir, ".index")
+    env["AI_LAB_INDEX_SNAPSHOT"] = snapshot_dir
+    return env
+
+
+def _run_once(entry: str, env: Dict[str, str], extra_flags: List[str] = ()) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *extra_flags, "-m", "bench.coldstart", "--child", "--entry", entry],
+        env=env, cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    wall = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise SystemExit(f"cold start failed:\n{proc.stderr[-2000:]}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["process"] = wall
+    out["_stderr"] = proc.stderr
+    return out
+
+
+def _top_imports(stderr: str, n: int) -> List[Dict[str, Any]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append({"module": module.strip(), "selfMs": int(self_us) / 1000, "cumulativeMs": int(cumulative_us) / 1000})
+    rows.sort(key=lambda r: r["selfMs"], reverse=True)
+    return rows[:n]
+
+
+def run_coldstart(args: argparse.Namespace) -> Dict[str, Any]:
+    work = tempfile.mkdtemp(prefix="ai-lab-coldstart-")
+    index_dir: Optional[str] = None
+    snapshot_dir = ""
+    if args.index in ("snapshot", "warm"):
+        target = os.path.join(work, "snapshot" if args.index == "snapshot" else "index")
+        subprocess.run(
+            [sys.executable, "-m", "apps.api.index", "snapshot", "--out", target],
+            env=_env(work, None, ""), cwd=REPO_ROOT, check=True, capture_output=True,
+        )
+        if args.index == "snapshot":
+            snapshot_dir = target
+        else:
+            index_dir = target
+
+    runs = []
+    for i in range(args.runs):
+        run_dir = tempfile.mkdtemp(prefix=f"run{i}-", dir=work)
+        runs.append(_run_once(args.entry, _env(run_dir, index_dir, snapshot_dir)))
+
+    def pct(vals: List[float], p: float) -> float:
+        return round(vals[min(len(vals) - 1, int(round(p / 100.0 * (len(vals) - 1))))], 1)
+
+    phases = ["process", "import", "firstResponse", *(name for name, *_ in FIRST_REQUESTS)]
+    report: Dict[str, Any] = {"entry": args.entry, "index": args.index, "runs": args.runs, "phases": {}}
+    for phase in phases:
+        v = sorted(r[phase] for r in runs)
+        report["phases"][phase] = {"p50Ms": pct(v, 50), "p95Ms": pct(v, 95), "maxMs": round(v[-1], 1)}
+
+    if args.importtime:
+        run_dir = tempfile.mkdtemp(prefix="importtime-", dir=work)
+        traced = _run_once(args.entry, _env(run_dir, index_dir, snapshot_dir), ["-X", "importtime"])
+        report["topImports"] = _top_imports(traced["_stderr"], args.importtime)
+    return report
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--entry", default="api.index", help="module exposing the ASGI `app` (api.index, api.backend, ...)")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--index", choices=("snapshot", "build", "warm"), default="snapshot")
+    ap.add_argument("--importtime", type=int, default=0, metavar="N", help="list the N slowest imports")
+    ap.add_argument("--out", help="write the JSON report here as well")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_child(args.entry)))
+        return 0
+
+    report = run_coldstart(args)
+    print(f"{report['entry']} ({report['index']} index), {report['runs']} cold starts:", file=sys.stderr)
+    for phase, e in report["phases"].items():
+        print(f"  {phase:<14} p50={e['p50Ms']:>8.1f} p95={e['p95Ms']:>8.1f} max={e['maxMs']:>8.1f} ms", file=sys.stderr)
+    for row in report.get("topImports", []):
+        print(f"  {row['selfMs']:>8.1f} ms self {row['cumulativeMs']:>8.1f} ms cum  {row['module']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
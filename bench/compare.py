@@ -0,0 +1,55 @@
+"""
+Compare two bench.run result files.
+
+    python -m bench.compare base.json head.json [--metric p50Ms] [--threshold 10]
+
+Exits 1 if any case present in both files got slower than --threshold percent.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+Key = Tuple[str, str, int]
+
+
+def _load(path: str) -> Tuple[Dict[str, Any], Dict[Key, Dict[str, Any]]]:
+    doc = json.loads(Path(path).read_text())
+    return doc.get("meta", {}), {(r["bench"], r["scaleKind"], int(r["scale"])): r for r in doc["results"]}
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("base")
+    ap.add_argument("head")
+    ap.add_argument("--metric", default="p50Ms", choices=("meanMs", "p50Ms", "p95Ms", "minMs"))
+    ap.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = ap.parse_args(argv)
+
+    base_meta, base = _load(args.base)
+    head_meta, head = _load(args.head)
+    print(f"base {base_meta.get('commit')}  ->  head {head_meta.get('commit')}   ({args.metric})")
+    print(f"{'bench':<36} {'scale':>18} {'base':>12} {'head':>12} {'delta':>9}")
+
+    regressions = 0
+    for key in sorted(set(base) & set(head), key=lambda k: (k[1], k[0], k[2])):
+        b = float(base[key][args.metric])
+        h = float(head[key][args.metric])
+        delta = ((h - b) / b * 100.0) if b else 0.0
+        flag = ""
+        if delta > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        scale = f"{key[1]}={key[2]}"
+        print(f"{key[0]:<36} {scale:>18} {b:>10.3f}ms {h:>10.3f}ms {delta:>+8.1f}%{flag}")
+
+    only = sorted(set(base) ^ set(head))
+    if only:
+        print(f"\n{len(only)} case(s) present in only one file were skipped")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
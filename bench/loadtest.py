@@ -0,0 +1,399 @@
+"""
+Load generator that replays realistic game sessions against the API.
+
+    # in-process (no server needed; uses a temp DB)
+    python -m bench.loadtest --players 50 --duration 60
+
+    # against a running worker
+    uvicorn apps.api.main:app --port 8000
+    python -m bench.loadtest --target http://127.0.0.1:8000 --players 50 --duration 60
+
+Each simulated player loops over the same flow the frontend drives: talk to all
+four agents, a few RAG runs, an eval run, the whiteboard referee, the artifact
+console, then the telemetry dashboard (summary + 4 timeseries every 6s, plus the
+"simulated traffic" POST every 1.6s). Think times are drawn uniformly from
+--think-ms and every sleep is multiplied by --time-scale, so 0.1 replays a
+session ten times faster than a human would.
+
+The report has throughput, per-endpoint latency percentiles, HTTP errors and
+SQLite "database is locked" failures, which is the number that tells you where
+one worker stops scaling.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+AGENTS = ("mlengineer", "aiproductengineer", "infraengineer", "securityadvisor")
+DASHBOARD_METRICS = ("latency_p95", "error_rate", "citation_coverage", "eval_pass_rate")
+LOCK_MARKERS = ("database is locked", "database table is locked", "SQLITE_BUSY")
+
+QUESTIONS = [
+    "Should we auto restart the relay after an outage?",
+    "What context is required before authorizing a restart?",
+    "How do we handle prompt injection in operator messages?",
+    "What pass rate does the eval policy require before release?",
+]
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+
+
+# ---------------- Transports ----------------
+
+class InProcessTransport:
+    """Drives the ASGI app directly in this event loop (sync handlers still use the threadpool)."""
+
+    def __init__(self, app: Any = None) -> None:
+        if app is None:
+            tmp = tempfile.mkdtemp(prefix="ai-lab-load-")
+            os.environ.setdefault("AI_LAB_DB_PATH", os.path.join(tmp, "load.db"))
+            sys.path.insert(0, str(REPO_ROOT))
+            from apps.api.main import app
+
+        self.app = app
+
+    async def start(self) -> None:
+        await self.app.router.startup()
+
+    async def close(self) -> None:
+        await self.app.router.shutdown()
+
+    async def request(self, method: str, path: str, payload: Any = None) -> Response:
+        body = b"" if payload is None else json.dumps(payload).encode()
+        path_only, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path_only,
+            "raw_path": path_only.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("loadtest", 80),
+        }
+        sent = False
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # never disconnects
+            return {"type": "http.disconnect"}
+
+        status = 500
+        chunks: List[bytes] = []
+
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception as e:  # unhandled errors re-raise through ServerErrorMiddleware
+            return Response(500, f"{type(e).__name__}: {e}".encode())
+        return Response(status, b"".join(chunks))
+
+
+class HttpTransport:
+    """Keep-alive http.client connections (pooled, one per in-flight request) on a sized thread pool."""
+
+    def __init__(self, base_url: str, players: int) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        self.pool = ThreadPoolExecutor(max_workers=max(4, players * 4), thread_name_prefix="loadtest")
+        self.idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.pool.shutdown(wait=False)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return cls(self.host, self.port, timeout=60)
+
+    def _do(self, method: str, path: str, payload: Any) -> Response:
+        body = None if payload is None else json.dumps(payload)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn = self._connection()
+        try:
+            conn.request(method, self.prefix + path, body=body, headers=headers)
+            res = conn.getresponse()
+            out = Response(res.status, res.read())
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            return Response(599, f"{type(e).__name__}: {e}".encode())
+        self.idle.put(conn)
+        return out
+
+    async def request(self, method: str, path: str, payload: Any = None) -> Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._do, method, path, payload)
+
+
+# ---------------- Stats ----------------
+
+@dataclass
+class Stats:
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    statuses: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    lock_errors: int = 0
+    sessions: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+
+    def record(self, name: str, ms: float, res: Response) -> None:
+        self.latencies.setdefault(name, []).append(ms)
+        by_status = self.statuses.setdefault(name, {})
+        by_status[res.status] = by_status.get(res.status, 0) + 1
+        if res.status >= 500 and any(m.encode() in res.body for m in LOCK_MARKERS):
+            self.lock_errors += 1
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = max(1e-9, self.finished - self.started)
+        total = sum(len(v) for v in self.latencies.values())
+        errors = sum(n for s in self.statuses.values() for code, n in s.items() if code >= 400)
+        throttled = sum(s.get(429, 0) for s in self.statuses.values())
+
+        def pct(vals: List[float], p: float) -> float:
+            return round(vals[min(len(vals) - 1, int(round(p / 100.0 * (len(vals) - 1))))], 2)
+
+        endpoints = {}
+        for name, vals in sorted(self.latencies.items()):
+            v = sorted(vals)
+            endpoints[name] = {
+                "requests": len(v),
+                "rps": round(len(v) / elapsed, 2),
+                "p50Ms": pct(v, 50),
+                "p95Ms": pct(v, 95),
+                "p99Ms": pct(v, 99),
+                "maxMs": round(v[-1], 2),
+                "statuses": {str(k): n for k, n in sorted(self.statuses[name].items())},
+            }
+        return {
+            "elapsedS": round(elapsed, 2),
+            "requests": total,
+            "throughputRps": round(total / elapsed, 2),
+            "sessionsCompleted": self.sessions,
+            "errors": errors,
+            "errorRate": round(errors / total, 4) if total else 0.0,
+            "sqliteLockErrors": self.lock_errors,
+            "throttled": throttled,
+            "endpoints": endpoints,
+        }
+
+
+# ---------------- Player ----------------
+
+class Player:
+    def __init__(self, idx: int, transport: Any, stats: Stats, args: argparse.Namespace) -> None:
+        self.idx = idx
+        self.t = transport
+        self.stats = stats
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + idx)
+
+    async def call(self, name: str, method: str, path: str, payload: Any = None) -> Optional[Any]:
+        t0 = time.perf_counter()
+        res = await self.t.request(method, path, payload)
+        self.stats.record(name, (time.perf_counter() - t0) * 1000, res)
+        if res.status != 200:
+            return None
+        try:
+            return json.loads(res.body)
+        except ValueError:
+            return None
+
+    async def think(self, lo: Optional[float] = None, hi: Optional[float] = None) -> None:
+        lo = self.args.think_min_ms if lo is None else lo
+        hi = self.args.think_max_ms if hi is None else hi
+        await asyncio.sleep(self.rng.uniform(lo, hi) / 1000.0 * self.args.time_scale)
+
+    async def dashboard(self, meters: Dict[str, int], rag: Optional[dict], ev: Optional[dict]) -> None:
+        """Dashboard open for --dashboard-s: poll every 6s, sim traffic every 1.6s."""
+        end = time.perf_counter() + self.args.dashboard_s * self.args.time_scale
+        next_poll = 0.0
+        next_sim = 0.0
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                return
+            if now >= next_poll:
+                next_poll = now + 6.0 * self.args.time_scale
+                await self.call("GET /api/telemetry/summary", "GET", "/api/telemetry/summary?window=24h")
+                await asyncio.gather(*(
+                    self.call(f"GET /api/telemetry/timeseries[{m}]", "GET", f"/api/telemetry/timeseries?metric={m}&window=24h")
+                    for m in DASHBOARD_METRICS
+                ))
+            if self.args.sim_traffic and now >= next_sim:
+                next_sim = now + 1.6 * self.args.time_scale
+                await self.call("POST /api/telemetry/event", "POST", "/api/telemetry/event", {
+                    "eventId": f"{id(self):x}-{self.rng.getrandbits(64):016x}",
+                    "scenarioId": "dayzero-utility-outage",
+                    "agentId": "sim",
+                    "eventType": "response",
+                    "latencyMs": int(self.rng.uniform(120, 1400)),
+                    "success": self.rng.random() > 0.03,
+                    "metadata": {
+                        "citations": len((rag or {}).get("citations", [])),
+                        "escalated": self.rng.random() < 0.05,
+                        "evalPassRate": (ev or {}).get("passRate"),
+                    },
+                })
+            wake = min(end, next_poll, next_sim) if self.args.sim_traffic else min(end, next_poll)
+            await asyncio.sleep(max(0.0, wake - time.perf_counter()))
+
+    async def session(self) -> None:
+        meters = {"reliability": 50, "cost": 30, "risk": 40, "regHeat": 40}
+
+        for agent in AGENTS:
+            await self.call("GET /api/agent/{id}", "GET", f"/api/agent/{agent}")
+            await self.think()
+
+        rag = None
+        rag_run_id = None
+        for _ in range(self.args.rag_runs):
+            body = await self.call("POST /api/rag/run", "POST", "/api/rag/run", {
+                "config": {
+                    "chunkSize": self.rng.choice(("small", "medium", "large")),
+                    "topK": self.rng.randint(1, 6),
+                    "requireCitations": self.rng.random() < 0.7,
+                },
+                "question": self.rng.choice(QUESTIONS),
+            })
+            if body:
+                rag = body["rag"]
+                rag_run_id = body.get("runId")
+            await self.think()
+
+        ev_body = await self.call("POST /api/eval/run", "POST", "/api/eval/run", {
+            "ragScore": (rag or {}).get("score", 0),
+            "ragPassed": (rag or {}).get("passed", False),
+            "ragRunId": rag_run_id,
+        })
+        ev = (ev_body or {}).get("eval")
+        await self.think()
+
+        await self.call("POST /api/station/whiteboard", "POST", "/api/station/whiteboard", {
+            "talkedToCount": 4,
+            "ragPassed": bool((rag or {}).get("passed")),
+            "evalPassRate": (ev or {}).get("passRate", 0),
+            "meters": meters,
+        })
+        await self.think()
+
+        rag_list, _ = await asyncio.gather(
+            self.call("GET /api/artifacts/rag", "GET", "/api/artifacts/rag?limit=50"),
+            self.call("GET /api/artifacts/eval", "GET", "/api/artifacts/eval?limit=50"),
+        )
+        for item in (rag_list or [])[: self.args.artifact_opens]:
+            await self.think()
+            await self.call("GET /api/artifacts/rag/{run_id}", "GET", f"/api/artifacts/rag/{item['id']}")
+
+        if self.args.dashboard_s > 0:
+            await self.dashboard(meters, rag, ev)
+
+    async def run(self, deadline: float) -> None:
+        # Stagger arrivals over the ramp so players don't start in lock-step.
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp_s))
+        while time.perf_counter() < deadline:
+            await self.session()
+            self.stats.sessions += 1
+            await self.think()
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    transport: Any = InProcessTransport() if args.target == "inproc" else HttpTransport(args.target, args.players)
+    await transport.start()
+    stats = Stats()
+    try:
+        stats.started = time.perf_counter()
+        deadline = stats.started + args.duration
+        players = [Player(i, transport, stats, args) for i in range(args.players)]
+        # Sessions that are mid-flight at the deadline are allowed to finish.
+        await asyncio.gather(*(p.run(deadline) for p in players))
+        stats.finished = time.perf_counter()
+    finally:
+        await transport.close()
+    report = stats.report()
+    report["config"] = {
+        "target": args.target,
+        "players": args.players,
+        "duration": args.duration,
+        "thinkMs": [args.think_min_ms, args.think_max_ms],
+        "timeScale": args.time_scale,
+    }
+    return report
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", default="inproc", help='"inproc" or a base URL like http://127.0.0.1:8000')
+    ap.add_argument("--players", type=int, default=20)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds before players stop starting sessions")
+    ap.add_argument("--ramp-s", type=float, default=5.0)
+    ap.add_argument("--think-min-ms", type=float, default=300.0)
+    ap.add_argument("--think-max-ms", type=float, default=1500.0)
+    ap.add_argument("--time-scale", type=float, default=1.0, help="multiplier for all think/poll times")
+    ap.add_argument("--rag-runs", type=int, default=3)
+    ap.add_argument("--artifact-opens", type=int, default=2)
+    ap.add_argument("--dashboard-s", type=float, default=12.0, help="seconds the telemetry dashboard stays open")
+    ap.add_argument("--no-sim-traffic", dest="sim_traffic", action="store_false")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", help="write the JSON report here as well")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(run_load(args))
+
+    print(f"{report['requests']} requests in {report['elapsedS']}s -> {report['throughputRps']} req/s, "
+          f"{report['sessionsCompleted']} sessions, errors={report['errors']} "
+          f"({report['errorRate']:.2%}), sqlite locks={report['sqliteLockErrors']}, "
+          f"throttled={report['throttled']}", file=sys.stderr)
+    for name, e in report["endpoints"].items():
+        print(f"  {name:<48} n={e['requests']:<6} p50={e['p50Ms']:>8.1f} p95={e['p95Ms']:>8.1f} "
+              f"p99={e['p99Ms']:>8.1f} ms  {e['statuses']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -0,0 +1,286 @@
+"""
+Reproducible backend benchmarks.
+
+    python -m bench.run --preset quick --out bench_results.json
+    python -m bench.run --docs 10,1000 --events 1000,100000 --artifacts 1000
+    python -m bench.compare base.json head.json
+
+Each scale gets a fresh SQLite file in a temp dir (the repo DB is never
+touched). Handlers are called in-process, so numbers cover handler work
+(retrieval, SQLite, telemetry) without HTTP/JSON framing; use bench.loadtest for
+end-to-end numbers.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Must happen before apps.api.db is imported: it reads the path at import time.
+_TMP = tempfile.mkdtemp(prefix="ai-lab-bench-")
+os.environ.setdefault("AI_LAB_DB_PATH", os.path.join(_TMP, "bench.db"))
+sys.path.insert(0, str(REPO_ROOT))
+
+from apps.api import db  # noqa: E402
+from apps.api import httpcache  # noqa: E402
+from apps.api import index  # noqa: E402
+from apps.api import tokenizer  # noqa: E402
+from apps.api import main  # noqa: E402
+
+from bench import synth  # noqa: E402
+
+PRESETS: Dict[str, Dict[str, List[int]]] = {
+    "quick": {"docs": [10, 1_000], "events": [1_000, 10_000], "artifacts": [100, 1_000], "texts": [1_000]},
+    "default": {
+        "texts": [1_000, 10_000, 100_000],
+        "docs": [10, 100, 1_000, 10_000],
+        "events": [1_000, 10_000, 100_000, 1_000_000],
+        "artifacts": [100, 1_000, 10_000],
+    },
+    "full": {
+        "texts": [1_000, 10_000, 100_000],
+        "docs": [10, 100, 1_000, 10_000, 100_000],
+        "events": [1_000, 10_000, 100_000, 1_000_000, 10_000_000],
+        "artifacts": [100, 1_000, 10_000, 100_000],
+    },
+}
+
+_loop = asyncio.new_event_loop()
+
+
+def _invoke(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Call a route handler whether it is a plain `def` or an `async def`."""
+    out = fn(*args, **kwargs)
+    if inspect.isawaitable(out):
+        out = _loop.run_until_complete(out)
+    return out
+
+
+def _fresh_db(tag: str):
+    path = os.path.join(_TMP, f"{tag}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+    db.DB_PATH = path
+    return db.connect()
+
+
+def _git_rev() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except Exception:
+        return {"commit": None, "dirty": None}
+
+
+def measure(fn: Callable[[int], Any], repeat: int, warmup: int, max_seconds: float) -> List[float]:
+    """Run fn(i) `warmup` + up to `repeat` times; stop early once max_seconds is spent (min 3 samples)."""
+    for i in range(warmup):
+        fn(i)
+    samples: List[float] = []
+    budget_end = time.perf_counter() + max_seconds
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+        if len(samples) >= 3 and time.perf_counter() > budget_end:
+            break
+    return samples
+
+
+def _result(bench: str, scale_kind: str, scale: int, samples: List[float]) -> Dict[str, Any]:
+    s = sorted(samples)
+    return {
+        "bench": bench,
+        "scaleKind": scale_kind,
+        "scale": scale,
+        "n": len(s),
+        "meanMs": round(statistics.fmean(s), 4),
+        "p50Ms": round(s[len(s) // 2], 4),
+        "p95Ms": round(s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))], 4),
+        "minMs": round(s[0], 4),
+        "maxMs": round(s[-1], 4),
+    }
+
+
+# ---------------- Cases ----------------
+
+def bench_corpus(n_docs: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    _fresh_db(f"docs-{n_docs}").close()
+    docs = synth.make_corpus(n_docs, seed=args.seed)
+    main.index_store = index.IndexStore(
+        os.path.join(_TMP, f"index-{n_docs}"),
+        source=lambda: docs,
+        fingerprint=lambda: f"synth-{n_docs}-{args.seed}",
+    )
+    main.index_store.publish()
+
+    out = []
+    for chunk_size, mode in (("small", "lexical"), ("large", "lexical"), ("small", "dense"), ("small", "hybrid")):
+        def run(i: int, chunk_size: str = chunk_size, mode: str = mode) -> None:
+            _invoke(main.rag_run, main.RagRunRequest(
+                config=main.RagConfig(chunkSize=chunk_size, topK=4, requireCitations=True, retrieval=mode),
+                question=synth.QUESTIONS[i % len(synth.QUESTIONS)],
+            ))
+        name = f"rag_run[{chunk_size}]" if mode == "lexical" else f"rag_run[{chunk_size},{mode}]"
+        out.append(_result(name, "docs", n_docs, measure(run, args.repeat, args.warmup, args.max_seconds)))
+    return out
+
+
+def bench_telemetry(n_events: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    conn = _fresh_db(f"events-{n_events}")
+    synth.fill_telemetry(conn, n_events, seed=args.seed)
+    conn.close()
+
+    out = [
+        _result("telemetry_summary", "events", n_events, measure(
+            lambda i: _invoke(main.telemetry_summary, scenarioId=main.DEFAULT_SCENARIO_ID, window="24h"),
+            args.repeat, args.warmup, args.max_seconds,
+        ))
+    ]
+    for metric in ("latency_p95", "error_rate"):
+        out.append(_result(f"telemetry_timeseries[{metric}]", "events", n_events, measure(
+            lambda i, metric=metric: _invoke(main.telemetry_timeseries, metric=metric, scenarioId=main.DEFAULT_SCENARIO_ID, window="24h"),
+            args.repeat, args.warmup, args.max_seconds,
+        )))
+    return out
+
+
+def bench_artifacts(n_runs: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    conn = _fresh_db(f"artifacts-{n_runs}")
+    synth.fill_artifacts(conn, n_runs, seed=args.seed)
+    some_id = conn.execute("SELECT id FROM rag_runs LIMIT 1").fetchone()[0]
+    conn.close()
+
+    return [
+        _result("artifacts_rag[list]", "artifacts", n_runs, measure(
+            lambda i: _invoke(main.artifacts_rag, limit=50), args.repeat, args.warmup, args.max_seconds)),
+        _result("artifacts_eval[list]", "artifacts", n_runs, measure(
+            lambda i: _invoke(main.artifacts_eval, limit=50), args.repeat, args.warmup, args.max_seconds)),
+        _result("artifacts_stats", "artifacts", n_runs, measure(
+            lambda i: _invoke(main.artifacts_stats), args.repeat, args.warmup, args.max_seconds)),
+        # The route minus HTTP: lookup + encoding, then the response cache it fills.
+        _result("artifact_rag[get,uncached]", "artifacts", n_runs, measure(
+            lambda i: (httpcache.cache.clear(), _invoke(main.rag_artifact_entry, some_id)),
+            args.repeat, args.warmup, args.max_seconds)),
+        _result("artifact_rag[get]", "artifacts", n_runs, measure(
+            lambda i: _invoke(main.rag_artifact_entry, some_id), args.repeat, args.warmup, args.max_seconds)),
+        _result("eval_run", "artifacts", n_runs, measure(
+            lambda i: _invoke(main.eval_run, main.EvalRunRequest(ragScore=60, ragPassed=True, ragRunId=some_id)),
+            args.repeat, args.warmup, args.max_seconds)),
+    ]
+
+
+_LEGACY_RE = r"[^a-z0-9\s]"
+
+
+def legacy_tokenize(s: str) -> set[str]:
+    """The original tokenize() from apps/api/main.py, kept as the comparison baseline."""
+    s = re.sub(_LEGACY_RE, " ", s.lower())
+    return {t for t in s.split() if len(t) > 2}
+
+
+def bench_tokenizer(n_texts: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    texts: List[str] = []
+    for d in synth.make_corpus(max(1, n_texts // 4), seed=args.seed):
+        texts.extend(p for p in d["text"].split("\n\n") if p.strip())
+    texts = (texts * (n_texts // max(1, len(texts)) + 1))[:n_texts]
+    tok = tokenizer.Tokenizer()
+    assert [legacy_tokenize(t) for t in texts[:200]] == tok.tokenize_many(texts[:200])
+
+    return [
+        _result("tokenize[legacy]", "texts", n_texts, measure(
+            lambda i: [legacy_tokenize(t) for t in texts], args.repeat, args.warmup, args.max_seconds)),
+        _result("tokenize[translate]", "texts", n_texts, measure(
+            lambda i: [tok.tokenize(t) for t in texts], args.repeat, args.warmup, args.max_seconds)),
+        _result("tokenize[bulk]", "texts", n_texts, measure(
+            lambda i: tok.tokenize_many(texts), args.repeat, args.warmup, args.max_seconds)),
+    ]
+
+
+# ---------------- CLI ----------------
+
+def _ints(s: Optional[str]) -> Optional[List[int]]:
+    if s is None:
+        return None
+    return [int(x.replace("_", "")) for x in s.split(",") if x.strip()]
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    ap.add_argument("--docs", help="comma-separated corpus sizes (overrides preset)")
+    ap.add_argument("--events", help="comma-separated telemetry table sizes (overrides preset)")
+    ap.add_argument("--artifacts", help="comma-separated artifact history sizes (overrides preset)")
+    ap.add_argument("--texts", help="comma-separated tokenizer batch sizes (overrides preset)")
+    ap.add_argument("--only", choices=("texts", "docs", "events", "artifacts"), action="append",
+                    help="run only these scale families (repeatable)")
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--max-seconds", type=float, default=10.0, help="time budget per case")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", help="write JSON results here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    preset = PRESETS[args.preset]
+    scales = {
+        "texts": _ints(args.texts) or preset["texts"],
+        "docs": _ints(args.docs) or preset["docs"],
+        "events": _ints(args.events) or preset["events"],
+        "artifacts": _ints(args.artifacts) or preset["artifacts"],
+    }
+    families = {"texts": bench_tokenizer, "docs": bench_corpus, "events": bench_telemetry, "artifacts": bench_artifacts}
+
+    results: List[Dict[str, Any]] = []
+    for kind, fn in families.items():
+        if args.only and kind not in args.only:
+            continue
+        for n in scales[kind]:
+            t0 = time.perf_counter()
+            rows = fn(n, args)
+            results.extend(rows)
+            for r in rows:
+                print(f"{r['bench']:<36} {f'{kind}={n}':<18} p50={r['p50Ms']:>10.3f}ms p95={r['p95Ms']:>10.3f}ms n={r['n']}", file=sys.stderr)
+            print(f"  ({kind}={n} done in {time.perf_counter() - t0:.1f}s)", file=sys.stderr)
+
+    doc = {
+        "meta": {
+            **_git_rev(),
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "preset": args.preset,
+            "scales": scales,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
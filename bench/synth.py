@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+from apps.api import db
+
+# ---------------- Synthetic data ----------------
+#
+# Deterministic (seeded) generators for benchmark fixtures. The corpus mixes the
+# words the real lab docs and questions use with a long tail of filler tokens,
+# so overlap scores behave like the real thing at any size.
+# -----------------------------------------------------------------------------
+
+DOMAIN_WORDS = (
+    "outage relay restart circuit location operator authorization escalate escalation "
+    "runbook breaker feeder substation verify confirm context missing safety policy "
+    "injection prompt citation evidence eval gate release reliability latency incident "
+    "telemetry retrieval grounding threshold isolation lockout crew dispatch voltage"
+).split()
+
+QUESTIONS = [
+    "Should we auto restart the relay after an outage?",
+    "What context is required before authorizing a restart?",
+    "How do we handle prompt injection in operator messages?",
+    "What pass rate does the eval policy require before release?",
+    "When must the agent escalate instead of answering?",
+]
+
+EVENT_TYPES = ("response", "rag_run", "eval_run", "escalation", "tool_call")
+
+
+def _vocab(rng: random.Random, size: int = 5000) -> List[str]:
+    filler = [f"tok{i:04d}" for i in range(size)]
+    rng.shuffle(filler)
+    return filler
+
+
+def make_corpus(n_docs: int, seed: int = 7) -> List[Dict[str, str]]:
+    """`n_docs` markdown docs shaped like data/lab_docs: '# Title' line + paragraphs."""
+    rng = random.Random(seed)
+    filler = _vocab(rng)
+    docs: List[Dict[str, str]] = []
+    for i in range(n_docs):
+        title = f"Synthetic Doc {i}: {' '.join(rng.sample(DOMAIN_WORDS, 3))}"
+        paras = []
+        for _ in range(rng.randint(3, 8)):
+            words = []
+            for _ in range(rng.randint(20, 60)):
+                # ~25% domain vocabulary, the rest long-tail filler
+                words.append(rng.choice(DOMAIN_WORDS) if rng.random() < 0.25 else rng.choice(filler))
+            paras.append(" ".join(words).capitalize() + ".")
+        text = f"# {title}\n\n" + "\n\n".join(paras) + "\n"
+        docs.append({"id": f"synth_{i:06d}", "title": title, "text": text})
+    return docs
+
+
+def _spread_timestamps(rng: random.Random, n: int, span: timedelta) -> Iterator[str]:
+    now = datetime.now(timezone.utc)
+    span_s = span.total_seconds()
+    for _ in range(n):
+        yield (now - timedelta(seconds=rng.random() * span_s)).isoformat()
+
+
+def _telemetry_rows(n: int, scenario_ids: Tuple[str, ...], seed: int) -> Iterator[Tuple[Any, ...]]:
+    rng = random.Random(seed)
+    for created_at in _spread_timestamps(rng, n, timedelta(hours=24)):
+        event_type = rng.choice(EVENT_TYPES)
+        md: Dict[str, Any] = {}
+        if event_type in ("response", "rag_run"):
+            md["citations"] = rng.randint(0, 3)
+        if event_type == "eval_run":
+            md["passRate"] = rng.randint(40, 100)
+        if event_type == "response" and rng.random() < 0.05:
+            md["escalated"] = True
+        yield (
+            uuid.uuid4().hex[:16],
+            created_at,
+            rng.choice(scenario_ids),
+            None,
+            rng.choice(("mlengineer", "infraengineer", "rag", "eval")),
+            event_type,
+            int(rng.lognormvariate(4.0, 0.6)),
+            0 if rng.random() < 0.03 else 1,
+            json.dumps(md),
+        )
+
+
+def fill_telemetry(
+    conn: sqlite3.Connection,
+    n_events: int,
+    scenario_ids: Tuple[str, ...] = ("dayzero-utility-outage",),
+    seed: int = 11,
+    batch: int = 50_000,
+) -> None:
+    """Bulk-load `n_events` rows straight into telemetry_events (bypasses the API)."""
+    rows = _telemetry_rows(n_events, scenario_ids, seed)
+    sql = (
+        "INSERT INTO telemetry_events (id, created_at, scenario_id, run_id, agent_id, event_type, latency_ms, success, metadata_json) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    while True:
+        chunk = [r for _, r in zip(range(batch), rows)]
+        if not chunk:
+            break
+        conn.executemany(sql, chunk)
+        conn.commit()
+
+
+def fill_artifacts(conn: sqlite3.Connection, n_runs: int, seed: int = 13) -> None:
+    """`n_runs` rag_runs plus one linked eval_run each, with realistic payload sizes."""
+    rng = random.Random(seed)
+    rag_rows = []
+    eval_rows = []
+    for created_at in _spread_timestamps(rng, n_runs, timedelta(days=30)):
+        rag_id = uuid.uuid4().hex[:12]
+        score = rng.randint(0, 100)
+        passed = score >= 55
+        config = {
+            "chunkSize": rng.choice(("small", "medium", "large")),
+            "topK": rng.randint(1, 8),
+            "requireCitations": rng.random() < 0.5,
+        }
+        retrieved = [
+            {"id": f"doc_{rng.randint(0, 99)}:{k}", "title": "Synthetic", "snippet": "lorem " * 36}
+            for k in range(config["topK"])
+        ]
+        rag_rows.append((
+            rag_id, created_at, int(passed), score, json.dumps(config),
+            "Do not authorize automatic restart by default. " * 3,
+            json.dumps([r["id"] for r in retrieved]), json.dumps(retrieved),
+        ))
+        pass_rate = min(100, 55 + (20 if passed else 0) + (score - 55) // 2)
+        failures = [] if pass_rate >= 80 else [{"id": "E-01", "reason": "Insufficient grounding"}]
+        eval_rows.append((
+            uuid.uuid4().hex[:12], created_at, pass_rate, json.dumps(failures), rag_id, score, int(passed),
+        ))
+
+    conn.executemany(
+        "INSERT INTO rag_runs (id, created_at, passed, score, config_json, answer, citations_json, retrieved_json) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rag_rows,
+    )
+    conn.executemany(
+        "INSERT INTO eval_runs (id, created_at, pass_rate, failures_json, rag_run_id, rag_score, rag_passed) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        eval_rows,
+    )
+    # Artifact lists read the materialized summaries, which inserts made through
+    # db.py keep up to date; rebuild them for the rows bulk-inserted above.
+    db._backfill_summaries(conn)
+    conn.commit()
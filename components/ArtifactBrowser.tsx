@@ -42,6 +42,16 @@ type EvalFull = {
   ragPassed: boolean;
 };
 
+type ConfigStat = {
+  config: any | null;
+  runs: number;
+  passRate: number;
+  meanScore: number;
+  lastRunAt: string;
+};
+
+type ConfigStats = { rag: ConfigStat[]; eval: ConfigStat[] };
+
 const mono =
   "ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, 'Liberation Mono', 'Courier New', monospace";
 
@@ -63,9 +73,10 @@ export default function ArtifactBrowser() {
   const setShowRagResults = useGameStore((s) => s.setShowRagResults);
   const setShowEvalResults = useGameStore((s) => s.setShowEvalResults);
 
-  const [tab, setTab] = useState<"rag" | "eval">("rag");
+  const [tab, setTab] = useState<"rag" | "eval" | "stats">("rag");
   const [ragList, setRagList] = useState<RagSummary[]>([]);
   const [evalList, setEvalList] = useState<EvalSummary[]>([]);
+  const [stats, setStats] = useState<ConfigStats>({ rag: [], eval: [] });
   const [busy, setBusy] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
@@ -73,12 +84,14 @@ export default function ArtifactBrowser() {
     setBusy(true);
     setError(null);
     try {
-      const [rags, evals] = await Promise.all([
+      const [rags, evals, perConfig] = await Promise.all([
         apiGet<RagSummary[]>("/api/artifacts/rag?limit=50"),
         apiGet<EvalSummary[]>("/api/artifacts/eval?limit=50"),
+        apiGet<ConfigStats>("/api/artifacts/stats"),
       ]);
       setRagList(rags);
       setEvalList(evals);
+      setStats(perConfig);
     } catch (e: any) {
       setError(e?.message ?? String(e));
     } finally {
@@ -247,6 +260,22 @@ export default function ArtifactBrowser() {
           >
             Eval Runs
           </button>
+          <button
+            onClick={() => setTab("stats")}
+            disabled={busy}
+            style={{
+              border: "1px solid rgba(253,230,138,0.35)",
+              background: tab === "stats" ? "rgba(253,230,138,0.16)" : "rgba(255,255,255,0.06)",
+              color: "#e5e7eb",
+              borderRadius: 10,
+              padding: "8px 10px",
+              cursor: "pointer",
+              fontWeight: 900,
+              fontSize: 12,
+            }}
+          >
+            By Config
+          </button>
         </div>
 
         {error ? (
@@ -268,7 +297,42 @@ export default function ArtifactBrowser() {
         ) : null}
 
         <div style={{ marginTop: 12, display: "grid", gap: 10 }}>
-          {tab === "rag" ? (
+          {tab === "stats" ? (
+            stats.rag.length || stats.eval.length ? (
+              ([["RAG", stats.rag], ["Eval", stats.eval]] as const).map(([label, rows]) =>
+                rows.map((s, i) => (
+                  <div
+                    key={`${label}-${i}`}
+                    style={{
+                      padding: 12,
+                      borderRadius: 12,
+                      border: "1px solid rgba(255,255,255,0.10)",
+                      background: "rgba(255,255,255,0.04)",
+                    }}
+                  >
+                    <div style={{ display: "flex", justifyContent: "space-between", gap: 10 }}>
+                      <div style={{ fontWeight: 900, color: s.passRate >= 0.5 ? "#86efac" : "#fca5a5" }}>
+                        {label} · {s.runs} runs · {Math.round(s.passRate * 100)}% pass · mean {s.meanScore}
+                      </div>
+                      <div style={{ fontSize: 12, opacity: 0.75 }}>last {fmt(s.lastRunAt)}</div>
+                    </div>
+                    <div style={{ marginTop: 6, fontSize: 12, opacity: 0.9 }}>
+                      {s.config ? (
+                        <>
+                          chunkSize=<b>{s.config.chunkSize}</b> · topK=<b>{s.config.topK}</b> · citations=
+                          <b>{s.config.requireCitations ? "ON" : "OFF"}</b>
+                        </>
+                      ) : (
+                        "config unknown (not tied to a RAG run)"
+                      )}
+                    </div>
+                  </div>
+                ))
+              )
+            ) : (
+              <div style={{ fontSize: 12, opacity: 0.8 }}>No runs yet — per-config stats appear after the first run.</div>
+            )
+          ) : tab === "rag" ? (
             ragList.length ? (
               ragList.map((r) => (
                 <button
@@ -1,40 +1,127 @@
-
 "use client";
 
-import { useMemo, useState } from "react";
+import { useEffect, useState, type ReactNode } from "react";
 import { useGameStore } from "../lib/store";
-import booksData from "../data/books/books.json";
+import { apiGet } from "../lib/api";
 
+// The library is served by the API (apps/api/library.py): the viewer only downloads
+// the table of contents and the page, glossary or search hits it is showing.
 type Book = {
   id: string;
   title: string;
   subtitle?: string;
-  pages: { title: string; body: string[] }[];
-  glossary?: { term: string; def: string }[];
+  pages: string[];
+  glossaryTerms: number;
+};
+
+type Page = { number: number; title: string; body: string[] };
+type GlossaryEntry = { bookId: string; term: string; def: string };
+type SearchHit = {
+  bookId: string;
+  page: number;
+  title: string;
+  score: number;
+  snippet: string;
+  highlights: [number, number][];
 };
 
 const mono =
   "ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, 'Liberation Mono', 'Courier New', monospace";
 
+function Highlighted({ text, spans }: { text: string; spans: [number, number][] }) {
+  const parts: ReactNode[] = [];
+  let at = 0;
+  spans.forEach(([s, e], i) => {
+    if (s > at) parts.push(<span key={`t${i}`}>{text.slice(at, s)}</span>);
+    parts.push(
+      <mark key={`m${i}`} style={{ background: "rgba(253,230,138,0.25)", color: "#fde68a", borderRadius: 3 }}>
+        {text.slice(s, e)}
+      </mark>
+    );
+    at = e;
+  });
+  if (at < text.length) parts.push(<span key="rest">{text.slice(at)}</span>);
+  return <>{parts}</>;
+}
+
 export default function BookViewer() {
   const open = useGameStore((s) => s.showBookViewer);
   const setOpen = useGameStore((s) => s.setShowBookViewer);
 
-  const [selectedId, setSelectedId] = useState<string>((booksData as any).books?.[0]?.id ?? "");
+  const [books, setBooks] = useState<Book[]>([]);
+  const [selectedId, setSelectedId] = useState<string>("");
   const [page, setPage] = useState(0);
   const [tab, setTab] = useState<"pages" | "glossary">("pages");
+  const [pageData, setPageData] = useState<Page | null>(null);
+  const [glossary, setGlossary] = useState<GlossaryEntry[]>([]);
+  const [query, setQuery] = useState("");
+  const [hits, setHits] = useState<SearchHit[] | null>(null);
+  const [error, setError] = useState<string | null>(null);
 
-  const books: Book[] = (booksData as any).books ?? [];
-
-  const book = useMemo(() => books.find((b) => b.id === selectedId) ?? books[0], [books, selectedId]);
+  const book = books.find((b) => b.id === selectedId) ?? books[0];
   const maxPage = (book?.pages?.length ?? 1) - 1;
 
+  useEffect(() => {
+    if (!open || books.length) return;
+    apiGet<{ books: Book[] }>("/api/library")
+      .then((r) => {
+        setBooks(r.books);
+        setSelectedId((id) => id || r.books[0]?.id || "");
+      })
+      .catch((e: any) => setError(e?.message ?? String(e)));
+  }, [open, books.length]);
+
+  useEffect(() => {
+    if (!open || !book || tab !== "pages") return;
+    let stale = false;
+    setPageData(null);
+    apiGet<{ pages: Page[] }>(`/api/library/${encodeURIComponent(book.id)}/pages?offset=${page}&limit=1`)
+      .then((r) => !stale && setPageData(r.pages[0] ?? null))
+      .catch((e: any) => !stale && setError(e?.message ?? String(e)));
+    return () => {
+      stale = true;
+    };
+  }, [open, book?.id, page, tab]);
+
+  useEffect(() => {
+    if (!open || !book || tab !== "glossary") return;
+    let stale = false;
+    setGlossary([]);
+    apiGet<{ entries: GlossaryEntry[] }>(`/api/library/glossary?bookId=${encodeURIComponent(book.id)}`)
+      .then((r) => !stale && setGlossary(r.entries))
+      .catch((e: any) => !stale && setError(e?.message ?? String(e)));
+    return () => {
+      stale = true;
+    };
+  }, [open, book?.id, tab]);
+
+  async function search() {
+    const q = query.trim();
+    if (!q) {
+      setHits(null);
+      return;
+    }
+    setError(null);
+    try {
+      const r = await apiGet<{ hits: SearchHit[] }>(`/api/library/search?q=${encodeURIComponent(q)}&limit=8`);
+      setHits(r.hits);
+    } catch (e: any) {
+      setError(e?.message ?? String(e));
+    }
+  }
+
   function selectBook(id: string) {
     setSelectedId(id);
     setPage(0);
     setTab("pages");
   }
 
+  function openHit(h: SearchHit) {
+    setSelectedId(h.bookId);
+    setPage(h.page - 1);
+    setTab("pages");
+  }
+
   function close() {
     setOpen(false);
   }
@@ -115,13 +202,63 @@ export default function BookViewer() {
                   <div style={{ fontWeight: 900, color: active ? "#67e8f9" : "#a5b4fc" }}>{b.title}</div>
                   {b.subtitle ? <div style={{ fontSize: 12, opacity: 0.85, marginTop: 4 }}>{b.subtitle}</div> : null}
                   <div style={{ fontSize: 12, opacity: 0.7, marginTop: 6 }}>
-                    {b.pages.length} pages · {b.glossary?.length ?? 0} glossary terms
+                    {b.pages.length} pages · {b.glossaryTerms} glossary terms
                   </div>
                 </button>
               );
             })}
           </div>
 
+          <div style={{ marginTop: 14 }}>
+            <input
+              value={query}
+              onChange={(e) => setQuery(e.target.value)}
+              onKeyDown={(e) => {
+                if (e.key === "Enter") search();
+              }}
+              placeholder="Search the library…"
+              style={{
+                width: "100%",
+                boxSizing: "border-box",
+                border: "1px solid rgba(255,255,255,0.15)",
+                background: "rgba(255,255,255,0.06)",
+                color: "#e5e7eb",
+                borderRadius: 10,
+                padding: "8px 10px",
+                fontFamily: mono,
+                fontSize: 12
+              }}
+            />
+            {hits ? (
+              <div style={{ marginTop: 10, display: "grid", gap: 8 }}>
+                {hits.map((h) => (
+                  <button
+                    key={`${h.bookId}/${h.page}`}
+                    onClick={() => openHit(h)}
+                    style={{
+                      textAlign: "left",
+                      padding: 10,
+                      borderRadius: 10,
+                      border: "1px solid rgba(255,255,255,0.10)",
+                      background: "rgba(255,255,255,0.04)",
+                      color: "#e5e7eb",
+                      cursor: "pointer",
+                      fontFamily: mono
+                    }}
+                  >
+                    <div style={{ fontWeight: 900, fontSize: 12, color: "#a5b4fc" }}>{h.title}</div>
+                    <div style={{ marginTop: 4, fontSize: 11, opacity: 0.9, lineHeight: 1.45, whiteSpace: "pre-wrap" }}>
+                      <Highlighted text={h.snippet} spans={h.highlights} />
+                    </div>
+                  </button>
+                ))}
+                {!hits.length ? <div style={{ fontSize: 12, opacity: 0.8 }}>No matches.</div> : null}
+              </div>
+            ) : null}
+          </div>
+
+          {error ? <div style={{ marginTop: 10, fontSize: 12, color: "#fca5a5" }}>{error}</div> : null}
+
           <div style={{ marginTop: 14, fontSize: 12, opacity: 0.7, lineHeight: 1.4 }}>
             Tip: Use this like a real engineer—read, test in the lab, then inspect artifacts.
           </div>
@@ -181,10 +318,10 @@ export default function BookViewer() {
                     }}
                   >
                     <div style={{ fontWeight: 900, color: "#67e8f9" }}>
-                      {book.pages[page]?.title ?? "Page"}
+                      {book.pages[page] ?? "Page"}
                     </div>
                     <div style={{ marginTop: 10, fontSize: 13, lineHeight: 1.65, whiteSpace: "pre-wrap", opacity: 0.96 }}>
-                      {(book.pages[page]?.body ?? []).join("\n")}
+                      {(pageData?.body ?? []).join("\n")}
                     </div>
                   </div>
 
@@ -232,7 +369,7 @@ export default function BookViewer() {
                 <div style={{ marginTop: 14 }}>
                   <div style={{ fontWeight: 900, color: "#a5b4fc" }}>Glossary</div>
                   <div style={{ marginTop: 10, display: "grid", gap: 10 }}>
-                    {(book.glossary ?? []).map((g) => (
+                    {glossary.map((g) => (
                       <div
                         key={g.term}
                         style={{
@@ -246,7 +383,7 @@ export default function BookViewer() {
                         <div style={{ marginTop: 6, fontSize: 12, opacity: 0.95, lineHeight: 1.5 }}>{g.def}</div>
                       </div>
                     ))}
-                    {!(book.glossary?.length) ? <div style={{ fontSize: 12, opacity: 0.8 }}>No glossary for this book.</div> : null}
+                    {!glossary.length ? <div style={{ fontSize: 12, opacity: 0.8 }}>No glossary for this book.</div> : null}
                   </div>
                 </div>
               )}
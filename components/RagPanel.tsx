@@ -2,16 +2,23 @@
 "use client";
 
 import { useMemo, useState } from "react";
-import { apiPost } from "../lib/api";
+import { apiStream } from "../lib/api";
 import { RagConfig, RagResult, useGameStore } from "../lib/store";
 
-type RagRunResponse = {
-  lines: string[];
-  effects?: { reliability?: number; cost?: number; risk?: number; regHeat?: number };
-  rag: RagResult;
-  runId: string;
-  createdAt: string;
-};
+// Frames of /api/rag/run/stream, in order.
+type RagStreamFrame =
+  | { type: "retrieved"; citations: string[]; retrieved: RagResult["retrieved"] }
+  | {
+      type: "answer";
+      lines: string[];
+      effects?: { reliability?: number; cost?: number; risk?: number; regHeat?: number };
+      passed: boolean;
+      score: number;
+      answer: string;
+      config: RagConfig;
+    }
+  | { type: "done"; runId: string; createdAt: string }
+  | { type: "error"; status: number; detail: string };
 
 const mono =
   "ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, 'Liberation Mono', 'Courier New', monospace";
@@ -42,11 +49,31 @@ export default function RagPanel() {
         question:
           "During an outage, the operator asks: 'Can I restart the feeder automatically?'. What do we do?"
       };
-      const res = await apiPost<RagRunResponse>("/api/rag/run", payload);
-      setRag({ ...res.rag, id: res.runId, createdAt: res.createdAt });
-      applyEffects(res.effects);
-      setDialogue({ title: "RAG Test Rig Result", lines: res.lines });
-      setShowRagResults(true);
+      // Show the evidence as soon as it is scored; the verdict and the artifact id follow.
+      let current: RagResult | null = null;
+      let result: Extract<RagStreamFrame, { type: "answer" }> | null = null;
+      await apiStream<RagStreamFrame>("/api/rag/run/stream", payload, (frame) => {
+        if (frame.type === "retrieved") {
+          const { citations, retrieved } = frame;
+          current = { passed: false, score: 0, answer: "", citations, retrieved, config, pending: "scoring" };
+          setShowRagResults(true);
+        } else if (frame.type === "answer" && current) {
+          result = frame;
+          const { passed, score, answer } = frame;
+          current = { ...current, passed, score, answer, config: frame.config, pending: "saving" };
+        } else if (frame.type === "done" && current) {
+          current = { ...current, id: frame.runId, createdAt: frame.createdAt, pending: undefined };
+        } else if (frame.type === "error") {
+          // Scored but not stored: keep the evidence on screen without an artifact id.
+          setRag(current && { ...current, pending: undefined });
+          throw new Error(`API ${frame.status}: ${frame.detail}`);
+        }
+        setRag(current);
+      });
+      if (!result) throw new Error("RAG stream ended early");
+      const { effects, lines } = result as Extract<RagStreamFrame, { type: "answer" }>;
+      applyEffects(effects);
+      setDialogue({ title: "RAG Test Rig Result", lines });
     } catch (e: any) {
       setDialogue({
         title: "RAG Test Rig error",
@@ -14,6 +14,7 @@ export default function RagResultsViewer() {
 
   const status = useMemo(() => {
     if (!rag) return { label: "—", color: "#fde68a" };
+    if (rag.pending === "scoring") return { label: "SCORING…", color: "#fde68a" };
     return rag.passed ? { label: `PASS (${rag.score})`, color: "#86efac" } : { label: `FAIL (${rag.score})`, color: "#fca5a5" };
   }, [rag]);
 
@@ -35,3 +35,36 @@ export async function apiPost<T>(path: string, payload?: unknown): Promise<T> {
   }
   return (await res.json()) as T;
 }
+
+/**
+ * POST to an NDJSON streaming endpoint and hand each frame to `onFrame` as it
+ * arrives (e.g. /api/rag/run/stream: evidence first, the stored run id last).
+ */
+export async function apiStream<F>(path: string, payload: unknown, onFrame: (frame: F) => void): Promise<void> {
+  const res = await fetch(joinUrl(API_BASE, path), {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "application/x-ndjson" },
+    body: JSON.stringify(payload),
+    cache: "no-store",
+  });
+
+  if (!res.ok || !res.body) {
+    const text = await res.text().catch(() => "");
+    throw new Error(`API ${res.status}: ${text || res.statusText}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (line.trim()) onFrame(JSON.parse(line) as F);
+    }
+    if (done) break;
+  }
+  if (buffered.trim()) onFrame(JSON.parse(buffered) as F);
+}
@@ -34,6 +34,8 @@ export type RagResult = {
   citations: string[];
   retrieved: { id: string; title: string; snippet: string }[];
   config: RagConfig;
+  // Streaming: "scoring" until the answer frame, "saving" until the run is stored.
+  pending?: "scoring" | "saving";
 };
 
 export type EvalResult = {
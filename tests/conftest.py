@@ -0,0 +1,44 @@
+"""
+Fixtures for the storage tests: every test gets its own SQLite file (and
+shard directory) under pytest's tmp_path; the repo DB is never touched.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Must happen before apps.api.db is imported: it reads the path at import time,
+# and code running outside the fixtures below must not reach the repo DB either.
+os.environ["AI_LAB_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="ai-lab-tests-"), "ai_lab.db")
+
+from apps.api import db  # noqa: E402
+
+
+def _forget_shards() -> None:
+    db._shard_cache.update(map_path=None, mtime=None, map={}, checked=0.0)
+
+
+@pytest.fixture
+def lab_db(tmp_path, monkeypatch):
+    """apps.api.db on a fresh, initialized DB file (sharding off)."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "ai_lab.db"))
+    monkeypatch.setattr(db, "DB_SHARDING", False)
+    _forget_shards()
+    db.close_connections()
+    db.init_db()
+    yield db
+    db.close_connections()
+    _forget_shards()
+
+
+@pytest.fixture
+def sharded_db(lab_db, monkeypatch):
+    """lab_db with AI_LAB_DB_SHARDING=1."""
+    monkeypatch.setattr(db, "DB_SHARDING", True)
+    yield lab_db
@@ -0,0 +1,67 @@
+"""
+Logical resets: bumping the generation hides earlier rows at once, and GC
+later deletes exactly those rows, in every shard, leaving live ones alone.
+"""
+from __future__ import annotations
+
+SCENARIO = "dayzero-utility-outage"
+
+
+def _event(client_event_id=None, scenario_id=SCENARIO):
+    return {"scenario_id": scenario_id, "event_type": "response", "success": True, "client_event_id": client_event_id}
+
+
+def _count(db, table, path=None, where="1 = 1", params=()):
+    return db._conn(path).execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+
+
+def _rag_run(db):
+    return db.insert_rag_run(
+        passed=True, score=60, config={"chunkSize": "small", "topK": 2}, answer="a",
+        citations=["d:0"], retrieved=[{"id": "d:0"}], scenario_id=SCENARIO,
+    )
+
+
+def test_reset_hides_old_rows_and_gc_deletes_only_them(lab_db):
+    lab_db.insert_telemetry_events([_event(f"old-{i}") for i in range(7)])
+    old_run = _rag_run(lab_db)
+    generation = lab_db.bump_generation()
+    assert lab_db.current_generation() == generation
+    assert lab_db.list_telemetry_events(scenario_id=SCENARIO) == []
+    assert lab_db.get_rag_run(old_run) is None
+
+    lab_db.insert_telemetry_events([_event(f"new-{i}") for i in range(3)])
+    live_run = _rag_run(lab_db)
+
+    # Small batches, as the background collector runs them.
+    while lab_db.gc_batch(lab_db.DB_PATH, generation, limit=2):
+        pass
+    for table in lab_db._GENERATION_TABLES:
+        assert _count(lab_db, table, where="generation < ?", params=(generation,)) == 0
+    assert _count(lab_db, "telemetry_events") == 3
+    assert len(lab_db.list_telemetry_events(scenario_id=SCENARIO)) == 3
+    assert lab_db.get_rag_run(live_run)["id"] == live_run
+    assert [r["id"] for r in lab_db.list_rag_runs()] == [live_run]
+
+
+def test_event_id_counts_again_after_reset(lab_db):
+    lab_db.insert_telemetry_events([_event("evt-1")])
+    lab_db.bump_generation()
+    _, dups = lab_db.insert_telemetry_events([_event("evt-1")])
+    assert dups == []
+    assert len(lab_db.list_telemetry_events(scenario_id=SCENARIO)) == 1
+
+
+def test_gc_sweeps_every_shard(sharded_db):
+    sharded_db.insert_telemetry_events([_event("a", "storm-b"), _event("b")])
+    generation = sharded_db.bump_generation()
+    sharded_db.insert_telemetry_events([_event("c", "storm-b")])
+
+    executor = sharded_db.DbExecutor(readers=1, writers=2)
+    try:
+        sharded_db.GarbageCollector(executor, batch=1, pause_s=0).sweep()
+    finally:
+        executor.shutdown()
+    for path in sharded_db.shard_paths():
+        assert _count(sharded_db, "telemetry_events", path, "generation < ?", (generation,)) == 0
+    assert [e["scenario_id"] for e in sharded_db.list_telemetry_events()] == ["storm-b"]
@@ -0,0 +1,69 @@
+"""
+Per-scenario shards: a scenario keeps routing to the same file across
+restarts, reads never allocate a shard, and allocation is capped.
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+SCENARIO = "dayzero-utility-outage"
+
+
+def _event(client_event_id, scenario_id):
+    return {"scenario_id": scenario_id, "event_type": "response", "success": True, "client_event_id": client_event_id}
+
+
+def _rag_run(db, scenario_id):
+    return db.insert_rag_run(
+        passed=True, score=60, config={"chunkSize": "small", "topK": 2}, answer="a",
+        citations=["d:0"], retrieved=[{"id": "d:0"}], scenario_id=scenario_id,
+    )
+
+
+def _shard_path_in_fresh_process(db_path: str, scenario_id: str) -> str:
+    code = "import sys; from apps.api import db; print(db.shard_path(sys.argv[1], allocate=False))"
+    env = dict(os.environ, AI_LAB_DB_PATH=db_path, AI_LAB_DB_SHARDING="1", PYTHONPATH=str(REPO_ROOT))
+    out = subprocess.run([sys.executable, "-c", code, scenario_id], env=env, cwd=REPO_ROOT,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+def test_shard_routing_is_stable_across_restarts(sharded_db):
+    path = sharded_db.shard_path("storm-b")
+    assert path != sharded_db.DB_PATH
+    run_id = _rag_run(sharded_db, "storm-b")
+    sharded_db.insert_telemetry_events([_event("evt-1", "storm-b")])
+
+    assert _shard_path_in_fresh_process(sharded_db.DB_PATH, "storm-b") == path
+    assert _shard_path_in_fresh_process(sharded_db.DB_PATH, SCENARIO) == sharded_db.DB_PATH
+    # Same process, map re-read from disk: the data is found where it was written.
+    sharded_db.close_connections()
+    sharded_db._shard_cache.update(map_path=None, mtime=None, map={}, checked=0.0)
+    assert sharded_db.shard_path("storm-b") == path
+    assert sharded_db.get_rag_run(run_id, "storm-b")["id"] == run_id
+    _, dups = sharded_db.insert_telemetry_events([_event("evt-1", "storm-b")])
+    assert dups == ["evt-1"]
+
+
+def test_reads_never_allocate_shards(sharded_db):
+    shard_dir = Path(sharded_db._shard_dir())
+    for i in range(5):
+        assert sharded_db.list_rag_runs(scenario_id=f"probe-{i}") == []
+        assert sharded_db.list_telemetry_events(scenario_id=f"probe-{i}") == []
+        assert sharded_db.get_rag_run("nope", f"probe-{i}") is None
+    assert not shard_dir.exists() or not any(shard_dir.glob("*.db"))
+
+
+def test_shard_count_is_capped(sharded_db, monkeypatch):
+    monkeypatch.setattr(sharded_db, "DB_MAX_SHARDS", 2)
+    paths = [sharded_db.shard_path(f"s{i}") for i in range(4)]
+    assert len(set(paths[:2])) == 2 and sharded_db.DB_PATH not in paths[:2]
+    assert paths[2:] == [sharded_db.DB_PATH] * 2
+    assert sharded_db.shard_path("not a/valid id") == sharded_db.DB_PATH
+    with open(sharded_db._shard_map_path()) as f:
+        assert set(json.load(f)["shards"]) == {SCENARIO, "s0", "s1"}
@@ -0,0 +1,70 @@
+"""
+Idempotent telemetry ingestion: an event sent again with the same `eventId`
+(or in a batch retried with the same `Idempotency-Key`) is stored once.
+"""
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+SCENARIO = "dayzero-utility-outage"
+
+
+def _event(client_event_id=None, **fields):
+    return {"scenario_id": SCENARIO, "event_type": "response", "success": True,
+            "client_event_id": client_event_id, **fields}
+
+
+def _stored(db):
+    return len(db.list_telemetry_events(scenario_id=SCENARIO))
+
+
+def test_retried_client_event_id_is_stored_once(lab_db):
+    ids, dups = lab_db.insert_telemetry_events([_event("evt-1", latency_ms=10)])
+    assert dups == []
+    retry_ids, retry_dups = lab_db.insert_telemetry_events([_event("evt-1", latency_ms=10)])
+    assert retry_dups == ["evt-1"]
+    assert retry_ids == ids  # the retry answers with the original id
+    assert _stored(lab_db) == 1
+
+
+def test_duplicates_within_a_batch_count_once(lab_db):
+    ids, dups = lab_db.insert_telemetry_events([_event("evt-1"), _event("evt-2"), _event("evt-1")])
+    assert dups == ["evt-1"]
+    assert ids[0] == ids[2] != ids[1]
+    assert _stored(lab_db) == 2
+
+
+def test_events_without_client_id_are_never_deduplicated(lab_db):
+    lab_db.insert_telemetry_events([_event(), _event()])
+    lab_db.insert_telemetry_events([_event()])
+    assert _stored(lab_db) == 3
+
+
+@pytest.fixture
+def client(lab_db):
+    from apps.api.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+def _post(client, payload, **headers):
+    r = client.post("/api/telemetry/event", json=payload, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_resent_event_id_is_reported_as_duplicate(client, lab_db):
+    event = {"scenarioId": SCENARIO, "eventType": "response", "latencyMs": 12, "eventId": "evt-1"}
+    first = _post(client, event)
+    assert first["duplicates"] == []
+    assert _post(client, event)["duplicates"] == ["evt-1"]
+    assert _stored(lab_db) == 1
+
+
+def test_batch_retried_with_idempotency_key_is_stored_once(client, lab_db):
+    batch = [{"scenarioId": SCENARIO, "eventType": "response"}, {"scenarioId": SCENARIO, "eventType": "error"}]
+    assert _post(client, batch, **{"Idempotency-Key": "batch-7"})["duplicates"] == []
+    assert sorted(_post(client, batch, **{"Idempotency-Key": "batch-7"})["duplicates"]) == ["batch-7:0", "batch-7:1"]
+    assert _stored(lab_db) == 2
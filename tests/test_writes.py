@@ -0,0 +1,57 @@
+"""
+Write helpers run on long-lived per-thread connections: a write that fails
+halfway must roll back, or the next write on that thread would commit its
+partial rows (and the file's write lock would stay taken until then).
+"""
+from __future__ import annotations
+
+import pytest
+
+SCENARIO = "dayzero-utility-outage"
+
+
+def _count(db, table):
+    return db._conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _insert_rag_run(db):
+    return db.insert_rag_run(
+        passed=True, score=60, config={"chunkSize": "small", "topK": 2}, answer="a",
+        citations=["d:0"], retrieved=[{"id": "d:0"}], scenario_id=SCENARIO,
+    )
+
+
+def _broken_summary(conn, row):
+    raise RuntimeError("summary failed")
+
+
+def test_failed_rag_run_insert_is_rolled_back(lab_db, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(lab_db, "_record_summary", _broken_summary)
+        with pytest.raises(RuntimeError):
+            _insert_rag_run(lab_db)
+    assert not lab_db._conn().in_transaction
+
+    run_id = _insert_rag_run(lab_db)  # the next write on this thread commits only its own rows
+    assert _count(lab_db, "rag_runs") == _count(lab_db, "run_summaries") == 1
+    assert [r["id"] for r in lab_db.list_rag_runs()] == [run_id]
+
+
+def test_failed_eval_run_insert_is_rolled_back(lab_db, monkeypatch):
+    monkeypatch.setattr(lab_db, "_record_summary", _broken_summary)
+    with pytest.raises(RuntimeError):
+        lab_db.insert_eval_run(pass_rate=90, failures=[], rag_run_id=None, rag_score=60, rag_passed=True)
+    assert not lab_db._conn().in_transaction
+    assert _count(lab_db, "eval_runs") == 0
+
+
+def test_failed_search_insert_stores_none_of_its_runs(lab_db):
+    run = {"passed": True, "score": 60, "config": {"chunkSize": "small", "topK": 1}, "answer": "a",
+           "citations": [], "retrieved": []}
+    with pytest.raises(TypeError):
+        lab_db.insert_rag_search(
+            request={}, leaderboard=[{"rank": 1}], best=None, stats={"unencodable": object()},
+            runs=[[run, run]], scenario_id=SCENARIO,
+        )
+    assert not lab_db._conn().in_transaction
+    assert _count(lab_db, "rag_runs") == _count(lab_db, "rag_searches") == 0